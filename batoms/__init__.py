@@ -19,6 +19,7 @@ from .install import pip_dependencies  # noqa: E402
 pip_dependencies.install()
 
 from batoms.batoms import Batoms  # noqa: E402
+from batoms.base.object import register_handler, unregister_handler  # noqa: E402
 
 
 __all__ = ["Batoms"]
@@ -76,6 +77,7 @@ def register():
     gui.register_keymap()
     # hook
     console.register_hook()
+    register_handler()
     # modules
     enable_module()
     # plugins
@@ -100,6 +102,7 @@ def unregister():
     gui.unregister_keymap()
     # hook
     console.unregister_hook()
+    unregister_handler()
     disable_module()
     plugins.disable_plugin()
     preferences.unregister_class()
@@ -1,9 +1,12 @@
 import bpy
+from bpy.app.handlers import persistent
+from contextlib import contextmanager
 import numpy as np
 from batoms.utils.butils import (
     get_node_by_name,
     object_mode,
     set_look_at,
+    set_mesh_positions,
     update_object,
 )
 
@@ -18,6 +21,298 @@ default_object_attributes = []
 
 default_object_datas = {}
 
+# attributes and positions read from the meshes, keyed on the mesh,
+# only filled inside ObjectGN.cache_attributes
+attribute_caches = {}
+
+
+def get_attribute_cache(mesh):
+    """Get the attribute cache of the mesh, None if not caching."""
+    return attribute_caches.get(mesh.as_pointer())
+
+
+def invalidate_attribute_cache(mesh, keys=None):
+    """Invalidate the attribute cache of the mesh.
+
+    Args:
+        mesh (bpy.types.Mesh): mesh
+        keys (list): names of the attributes, default all attributes.
+    """
+    cache = attribute_caches.get(mesh.as_pointer())
+    if cache is None:
+        return
+    cache["counter"] += 1
+    if keys is None:
+        cache["datas"].clear()
+    else:
+        for key in keys:
+            cache["datas"].pop(key, None)
+
+
+@persistent
+def depsgraph_update_handler(scene, depsgraph):
+    """Invalidate the attribute cache of the meshes changed in blender."""
+    if len(attribute_caches) == 0:
+        return
+    for update in depsgraph.updates:
+        if not update.is_updated_geometry:
+            continue
+        data = update.id.original
+        if isinstance(data, bpy.types.Object):
+            data = data.data
+        if isinstance(data, bpy.types.Mesh):
+            invalidate_attribute_cache(data)
+
+
+# trajectories opened as memmap, keyed on the absolute path of the file
+trajectory_files = {}
+
+
+def get_trajectory_path(obj):
+    """Path of the .npy file to save the trajectory of the object.
+
+    The file is saved in the folder "batoms_trajectory" next to the
+    .blend file, or in the temporary folder if the .blend file is not saved.
+    The name includes the name of the .blend file and a UUID saved on the
+    object, thus the .blend files in the same folder, or the unsaved
+    sessions, do not overwrite the files of each other.
+    """
+    import os
+    import tempfile
+    import uuid
+
+    if not obj.batoms.trajectory_uuid:
+        obj.batoms.trajectory_uuid = uuid.uuid4().hex
+    if bpy.data.filepath:
+        directory = bpy.path.abspath("//batoms_trajectory")
+        stem = os.path.splitext(os.path.basename(bpy.data.filepath))[0]
+    else:
+        directory = os.path.join(tempfile.gettempdir(), "batoms_trajectory")
+        stem = "untitled"
+    os.makedirs(directory, exist_ok=True)
+    name = "%s_%s_%s.npy" % (
+        bpy.path.clean_name(stem),
+        bpy.path.clean_name(obj.name),
+        obj.batoms.trajectory_uuid,
+    )
+    return os.path.join(directory, name)
+
+
+def load_trajectory_file(path):
+    """Open the trajectory file as a read-only memmap."""
+    path = bpy.path.abspath(path)
+    if path not in trajectory_files:
+        trajectory_files[path] = np.load(path, mmap_mode="r")
+    return trajectory_files[path]
+
+
+def release_trajectory_file(path):
+    """Close the memmap of the trajectory file."""
+    trajectory_files.pop(bpy.path.abspath(path), None)
+
+
+def write_trajectory_header(fp, nframe, nvert, header_size=128):
+    """Write the header of the .npy trajectory file with a fixed size,
+    thus it can be updated while frames are appended."""
+    import struct
+
+    header = repr(
+        {
+            "descr": np.lib.format.dtype_to_descr(np.dtype(np.float32)),
+            "fortran_order": False,
+            "shape": (nframe, nvert, 3),
+        }
+    )
+    header_len = header_size - 10
+    fp.seek(0)
+    fp.write(np.lib.format.magic(1, 0))
+    fp.write(struct.pack("<H", header_len))
+    fp.write((header.ljust(header_len - 1) + "\n").encode("latin1"))
+
+
+def append_trajectory_file(path, frames, nframe=0):
+    """Append frames to a .npy trajectory file.
+
+    Args:
+        path (str): path of the file, created if nframe is 0
+        frames (array): positions of the frames, (m, nvert, 3)
+        nframe (int): number of frames already in the file
+
+    Returns:
+        int: number of frames in the file
+    """
+    frames = np.asarray(frames, dtype=np.float32)
+    nvert = frames.shape[1]
+    with open(path, "r+b" if nframe > 0 else "wb") as fp:
+        if nframe == 0:
+            write_trajectory_header(fp, 0, nvert)
+        fp.seek(0, 2)
+        fp.write(frames.tobytes())
+        nframe += len(frames)
+        write_trajectory_header(fp, nframe, nvert)
+    return nframe
+
+
+def set_trajectory_frame(obj, frame):
+    """Write the positions of the frame from the trajectory file to the mesh."""
+    trajectory = load_trajectory_file(obj.batoms.trajectory_file)
+    nframe = len(trajectory)
+    if nframe == 0:
+        return
+    i = min(max(frame - obj.batoms.trajectory_frame_start, 0), nframe - 1)
+    positions = np.ascontiguousarray(trajectory[i]).reshape(-1)
+    if len(positions) != len(obj.data.vertices) * 3:
+        logger.warning(
+            "Trajectory of {} does not match the mesh, skip.".format(obj.name)
+        )
+        return
+    obj.data.vertices.foreach_set("co", positions)
+    obj.data.update()
+    invalidate_attribute_cache(obj.data, ["positions"])
+
+
+def link_trajectory_file(obj, path, frame_start=0):
+    """Use the trajectory file for the object, instead of shape keys."""
+    if obj.data.shape_keys is not None:
+        obj.shape_key_clear()
+    release_trajectory_file(path)
+    obj.batoms.trajectory_file = bpy.path.relpath(path) if bpy.data.filepath else path
+    obj.batoms.trajectory_frame_start = frame_start
+    set_trajectory_frame(obj, bpy.context.scene.frame_current)
+
+
+@persistent
+def frame_change_handler(scene, *args):
+    """Write the current frame of the trajectory files to the meshes."""
+    for obj in scene.objects:
+        if obj.type == "MESH" and obj.batoms.trajectory_file:
+            set_trajectory_frame(obj, scene.frame_current)
+
+
+@persistent
+def load_pre_handler(*args):
+    """Drop the neighbor caches of the batoms of the current file."""
+    from batoms.bond.bond import delete_neighbor_cache
+
+    delete_neighbor_cache()
+
+
+def register_handler():
+    if depsgraph_update_handler not in bpy.app.handlers.depsgraph_update_post:
+        bpy.app.handlers.depsgraph_update_post.append(depsgraph_update_handler)
+    if frame_change_handler not in bpy.app.handlers.frame_change_pre:
+        bpy.app.handlers.frame_change_pre.append(frame_change_handler)
+    if load_pre_handler not in bpy.app.handlers.load_pre:
+        bpy.app.handlers.load_pre.append(load_pre_handler)
+
+
+def unregister_handler():
+    if depsgraph_update_handler in bpy.app.handlers.depsgraph_update_post:
+        bpy.app.handlers.depsgraph_update_post.remove(depsgraph_update_handler)
+    if frame_change_handler in bpy.app.handlers.frame_change_pre:
+        bpy.app.handlers.frame_change_pre.remove(frame_change_handler)
+    if load_pre_handler in bpy.app.handlers.load_pre:
+        bpy.app.handlers.load_pre.remove(load_pre_handler)
+
+
+# attribute types which can be read and written by get_mesh_attribute and
+# set_mesh_attribute
+rebuild_attribute_types = [
+    "INT",
+    "FLOAT",
+    "BOOLEAN",
+    "STRING",
+    "FLOAT2",
+    "FLOAT_VECTOR",
+    "FLOAT_COLOR",
+    "QUATERNION",
+]
+
+
+def rebuild_mesh_vertices(obj, index):
+    """Rebuild the vertices of a mesh from the kept vertices.
+
+    The positions, the POINT attributes and the shape keys, including
+    their animation, are read as numpy arrays, the geometry is cleared,
+    and the kept data is written back by foreach_set.
+
+    Args:
+        obj (bpy.types.Object): object, the mesh only has vertices
+        index (array): for each new vertex, the index of the old vertex,
+            -1 for a new vertex with zero position and attributes.
+
+    Returns:
+        bool: False if the mesh can not be rebuilt, e.g. with edges,
+            faces, vertex groups or unsupported attribute types.
+    """
+    from batoms.utils.attribute import get_mesh_attribute, set_mesh_attribute
+
+    me = obj.data
+    if len(me.edges) > 0 or len(me.polygons) > 0 or len(obj.vertex_groups) > 0:
+        return False
+    attributes = [
+        (att.name, att.data_type)
+        for att in me.attributes
+        if att.domain == "POINT"
+        and att.name not in ["position", ".select_vert", ".hide_vert"]  # noqa: W503
+    ]
+    if any(dtype not in rebuild_attribute_types for name, dtype in attributes):
+        return False
+    index = np.asarray(index, dtype=int)
+    new = index < 0
+    n = len(me.vertices)
+
+    def take(array):
+        if n == 0:
+            return np.zeros((len(index),) + array.shape[1:], dtype=array.dtype)
+        array = array[np.where(new, 0, index)]
+        array[new] = np.zeros(1, dtype=array.dtype)
+        return array
+
+    positions = np.empty(n * 3, dtype=np.float64)
+    me.vertices.foreach_get("co", positions)
+    positions = take(positions.reshape(n, 3))
+    datas = [
+        (name, dtype, take(get_mesh_attribute(obj, name))) for name, dtype in attributes
+    ]
+    shape_keys = []
+    action = None
+    key = me.shape_keys
+    if key is not None:
+        if key.animation_data is not None:
+            action = key.animation_data.action
+        for kb in key.key_blocks:
+            co = np.empty(n * 3, dtype=np.float64)
+            kb.data.foreach_get("co", co)
+            shape_keys.append(
+                (kb.name, kb.relative_key.name, kb.value, take(co.reshape(n, 3)))
+            )
+        obj.shape_key_clear()
+        # shape key should not be add for empty mesh
+        if len(index) == 0:
+            shape_keys = []
+    me.clear_geometry()
+    me.vertices.add(len(index))
+    me.vertices.foreach_set("co", positions.reshape(-1))
+    for name, dtype, data in datas:
+        if name not in me.attributes:
+            me.attributes.new(name=name, type=dtype, domain="POINT")
+        set_mesh_attribute(obj, name, data)
+    for name, relative_key, value, co in shape_keys:
+        kb = obj.shape_key_add(name=name, from_mix=False)
+        kb.data.foreach_set("co", co.reshape(-1))
+        kb.value = value
+    if shape_keys:
+        key_blocks = me.shape_keys.key_blocks
+        for name, relative_key, value, co in shape_keys:
+            key_blocks[name].relative_key = key_blocks[relative_key]
+        if action is not None:
+            me.shape_keys.animation_data_create()
+            me.shape_keys.animation_data.action = action
+    me.update()
+    invalidate_attribute_cache(me)
+    return True
+
 
 class BaseObject:
     def __init__(self, obj_name, btype="batoms"):
@@ -172,23 +467,12 @@ class BaseObject:
 
     def update_mesh(self, obj=None):
         """Update mesh of the object.
-        By switching to edit mode and back to object mode."""
+        By tagging the mesh and its shape keys, see update_object."""
 
         object_mode()
         if obj is None:
             obj = self.obj
-        # bm = bmesh.new()
-        # bm.from_mesh(obj.data)
-        # bm.verts.ensure_lookup_table()
-        # bm.to_mesh(obj.data)
-        # bm.clear()
-        # bpy.context.view_layer.update()
-        # I don't why the shape key is not udpate in background mode, so we need this.
-        bpy.context.view_layer.objects.active = self.obj
-        mode = self.obj.mode
-        bpy.ops.object.mode_set(mode="EDIT")
-        bpy.ops.object.mode_set(mode="OBJECT")
-        bpy.ops.object.mode_set(mode=mode)
+        update_object(obj)
 
     def add_verts(self, count, obj=None):
         """Add vertices to the object."""
@@ -197,6 +481,7 @@ class BaseObject:
         if obj is None:
             obj = self.obj
         obj.data.vertices.add(count)
+        invalidate_attribute_cache(obj.data)
         self.update_mesh(obj)
 
     def add_vertices_bmesh(self, count, obj=None):
@@ -214,6 +499,7 @@ class BaseObject:
             bm.verts.new(vert)
         bm.to_mesh(obj.data)
         bm.clear()
+        invalidate_attribute_cache(obj.data)
 
     def delete_vertices_bmesh(
         self,
@@ -235,6 +521,7 @@ class BaseObject:
         bmesh.ops.delete(bm, geom=verts_select, context="VERTS")
         bm.to_mesh(obj.data)
         bm.clear()
+        invalidate_attribute_cache(obj.data)
 
     def add_edges(self, edges=None, obj=None):
         object_mode()
@@ -243,6 +530,7 @@ class BaseObject:
         obj.data.edges.add(len(edges))
         edges = edges.reshape(len(edges) * 2)
         obj.data.edges.foreach_set("vertices", edges)
+        invalidate_attribute_cache(obj.data)
         self.update_mesh(obj)
 
     def delete_edges_bmesh(
@@ -265,6 +553,7 @@ class BaseObject:
         bmesh.ops.delete(bm, geom=edges_select, context="EDGES_FACES")
         bm.to_mesh(obj.data)
         bm.clear()
+        invalidate_attribute_cache(obj.data)
 
     @property
     def shape_keys(self):
@@ -303,6 +592,53 @@ class ObjectGN(BaseObject):
             flag = False
         return flag
 
+    def resize_vertices(self, count, obj=None):
+        """Resize the vertices of the object to count.
+
+        Used before the arrays are set, thus which vertices are removed
+        does not matter. Growing without shape keys is one
+        mesh.vertices.add, otherwise the mesh is rebuilt from the kept
+        vertices, see rebuild_mesh_vertices. The attributes and the shape
+        keys are preserved, the new vertices are zero.
+
+        Args:
+            count (int): number of vertices
+            obj (bpy.types.Object): object, default self.obj
+        """
+        object_mode()
+        if obj is None:
+            obj = self.obj
+        n = len(obj.data.vertices)
+        if count == n:
+            return
+        if count > n and obj.data.shape_keys is None:
+            obj.data.vertices.add(count - n)
+            invalidate_attribute_cache(obj.data)
+            return
+        index = np.arange(count)
+        index[n:] = -1
+        if not rebuild_mesh_vertices(obj, index):
+            if count > n:
+                self.add_vertices_bmesh(count - n, obj)
+            else:
+                self.delete_vertices_bmesh(range(count, n), obj)
+
+    def delete_vertices(self, index, obj=None):
+        """Delete the vertices by index, the other vertices keep their
+        order, attributes and shape keys.
+
+        Args:
+            index (list): indices of the vertices to be deleted
+            obj (bpy.types.Object): object, default self.obj
+        """
+        object_mode()
+        if obj is None:
+            obj = self.obj
+        keep = np.ones(len(obj.data.vertices), dtype=bool)
+        keep[np.asarray(index, dtype=int)] = False
+        if not rebuild_mesh_vertices(obj, np.where(keep)[0]):
+            self.delete_vertices_bmesh(index, obj)
+
     @property
     def gn_modifier(self):
         return self.get_gn_modifier()
@@ -512,18 +848,144 @@ class ObjectGN(BaseObject):
         # get the mesh
         obj = self.obj
         att = obj.data.attributes[key]
-        if obj.mode == "EDIT" and att.data_type in [
-            "STRING",
-            "INT",
-            "FLOAT",
-            "FLOAT_VECTOR",
-            "FLOAT_COLOR",
-        ]:
-            attribute = get_mesh_attribute_bmesh(obj, att.name, index)
+        # read from the cache, see cache_attributes
+        cache = get_attribute_cache(obj.data)
+        if cache is not None and obj.mode != "EDIT":
+            if key in cache["datas"]:
+                attribute = cache["datas"][key]
+                if index is not None:
+                    return attribute[[index]]
+                return attribute.copy()
+            if index is not None:
+                return self.get_attribute(key)[[index]]
+        # decode STRING attribute from its integer codes
+        pair = self.get_string_attribute_pair(key)
+        attribute = None
+        if pair is not None and key == pair[0] and obj.mode != "EDIT":
+            from batoms.utils import numbers2Strings, string_codes_exact
+
+            codes = get_mesh_attribute(obj, pair[1], index)
+            attribute = numbers2Strings(codes)
+            # the codes of the strings longer than 4 bytes are truncated
+            if not string_codes_exact(attribute, decoded=True):
+                attribute = None
+        if attribute is None:
+            if obj.mode == "EDIT" and att.data_type in [
+                "STRING",
+                "INT",
+                "FLOAT",
+                "FLOAT_VECTOR",
+                "FLOAT_COLOR",
+            ]:
+                attribute = get_mesh_attribute_bmesh(obj, att.name, index)
+            else:
+                attribute = get_mesh_attribute(obj, att.name, index)
+        if cache is not None and obj.mode != "EDIT":
+            cache["datas"][key] = attribute.copy()
+        return attribute
+
+    @contextmanager
+    def cache_attributes(self):
+        """Cache the attributes and positions read from the mesh.
+
+        Inside the context, each attribute is read from blender only once,
+        the cache is keyed on the mesh, thus shared by all objects using
+        the same mesh. It is invalidated by set_attribute, set_positions,
+        adding or deleting vertices and edges, and by the depsgraph update
+        of the mesh.
+
+        Example:
+
+        .. code-block:: python
+
+            with batoms.cache_attributes():
+                arrays = batoms.arrays
+                species = batoms.get_attribute("species")
+
+        Yields:
+            dict: the cache, with a change counter and the cached datas.
+        """
+        key = self.obj.data.as_pointer()
+        cache = attribute_caches.setdefault(
+            key, {"depth": 0, "counter": 0, "datas": {}}
+        )
+        cache["depth"] += 1
+        try:
+            yield cache
+        finally:
+            cache["depth"] -= 1
+            if cache["depth"] == 0:
+                attribute_caches.pop(key, None)
+
+    def get_string_attribute_pair(self, key):
+        """Get the STRING attribute and its INT code attribute.
+
+        A STRING attribute, e.g. species, can be stored together with an
+        INT attribute named with the suffix "_index", e.g. species_index,
+        which saves the code of the string by string2Number. The codes
+        can be read and written by foreach_get/foreach_set, thus the
+        STRING attribute is decoded from the codes. The INT attribute is
+        32-bit, if a string is longer than 4 bytes, the STRING attribute
+        is read instead.
+
+        Args:
+            key (str): name of the STRING or the INT attribute
+
+        Returns:
+            tuple: (name of the STRING attribute, name of the INT attribute),
+                None if the attribute does not have a pair.
+        """
+        attributes = self.obj.data.attributes
+        if key.endswith("_index"):
+            string_key, code_key = key[:-6], key
         else:
-            attribute = get_mesh_attribute(obj, att.name, index)
+            string_key, code_key = key, "%s_index" % key
+        string_att = attributes.get(string_key)
+        code_att = attributes.get(code_key)
+        if (
+            string_att is None
+            or code_att is None  # noqa: W503
+            or string_att.data_type != "STRING"  # noqa: W503
+            or code_att.data_type != "INT"  # noqa: W503
+            or string_att.domain != code_att.domain  # noqa: W503
+        ):
+            return None
+        return string_key, code_key
 
-        return attribute
+    def set_string_attribute_pair(self, key, array, pair):
+        """Set the INT codes of a STRING attribute, and only write the
+        strings of the changed elements to the STRING attribute.
+
+        Args:
+            key (str): name of the STRING or the INT attribute
+            array (np.array): value of the attribute
+            pair (tuple): see get_string_attribute_pair
+        """
+        from batoms.utils import strings2Numbers, numbers2Strings, string_codes_exact
+        from batoms.utils.attribute import (
+            get_mesh_attribute,
+            set_mesh_attribute,
+            set_mesh_attribute_bmesh,
+        )
+
+        obj = self.obj
+        string_key, code_key = pair
+        if key == string_key:
+            strings = np.asarray(array, dtype=str)
+            codes = strings2Numbers(strings)
+        else:
+            codes = np.asarray(array, dtype=int)
+            strings = numbers2Strings(codes)
+        old_codes = get_mesh_attribute(obj, code_key)
+        set_mesh_attribute(obj, code_key, codes)
+        if string_codes_exact(strings):
+            changed = np.where(old_codes != codes)[0]
+        else:
+            # the truncated codes of two strings may be the same
+            old_strings = get_mesh_attribute(obj, string_key)
+            changed = np.where(old_strings != strings)[0]
+        if len(changed) > 0:
+            set_mesh_attribute_bmesh(obj, string_key, strings[changed], changed)
 
     def add_attribute_from_array(self, name, data, domain="POINT"):
         """Add an attribute from array"""
@@ -617,7 +1079,10 @@ class ObjectGN(BaseObject):
 
         Special case:
         1) String, can not use foreach_set. Must use bmesh with encode,
-            otherwise, can not read use bmesh.
+            otherwise, can not read use bmesh. If the string attribute
+            has an INT code attribute, e.g. species and species_index,
+            the codes are set, and only the changed strings are written,
+            see set_string_attribute_pair.
         2) Boolean, does not supported by bmesh. Must use Object mode.
            We set all Boolean properties to INT.
 
@@ -638,6 +1103,12 @@ class ObjectGN(BaseObject):
             array = np.array([array])
         if len(array) == 0:
             return
+        # STRING attribute with INT codes
+        pair = self.get_string_attribute_pair(key)
+        invalidate_attribute_cache(me, [key] if pair is None else pair)
+        if pair is not None and index is None and obj.mode != "EDIT":
+            self.set_string_attribute_pair(key, array, pair)
+            return
         # single value data
         att = me.attributes.get(key)
         if att.data_type == "STRING" or (
@@ -646,6 +1117,19 @@ class ObjectGN(BaseObject):
             set_mesh_attribute_bmesh(obj, key, array, index)
         else:
             set_mesh_attribute(obj, key, array, index)
+        # keep the pair in sync in edit mode, or for single value
+        if pair is not None:
+            from batoms.utils import strings2Numbers, numbers2Strings
+
+            string_key, code_key = pair
+            if key == string_key:
+                other_key, other = code_key, strings2Numbers(array)
+            else:
+                other_key, other = string_key, numbers2Strings(array)
+            if obj.mode == "EDIT" or other_key == string_key:
+                set_mesh_attribute_bmesh(obj, other_key, other, index)
+            else:
+                set_mesh_attribute(obj, other_key, other, index)
 
     def set_attribute_with_indices(self, name, indices, data):
         data0 = self.get_attribute(name)
@@ -675,10 +1159,15 @@ class ObjectGN(BaseObject):
 
     def get_positions(self):
         """Get the local positions of the object."""
+        cache = get_attribute_cache(self.obj.data)
+        if cache is not None and "positions" in cache["datas"]:
+            return cache["datas"]["positions"].copy()
         n = len(self)
         positions = np.empty(n * 3, dtype=np.float64)
         self.obj.data.vertices.foreach_get("co", positions)
         positions = positions.reshape((n, 3))
+        if cache is not None:
+            cache["datas"]["positions"] = positions.copy()
         return positions
 
     @positions.setter
@@ -696,12 +1185,9 @@ class ObjectGN(BaseObject):
             raise ValueError("positions has wrong shape %s != %s." % (n, natom))
         if natom == 0:
             return
-        positions = positions.reshape((natom * 3, 1))
-        self.obj.data.vertices.foreach_set("co", positions)
-        self.obj.data.update()
-        bpy.context.view_layer.objects.active = self.obj
-        bpy.ops.object.mode_set(mode="EDIT")
-        bpy.ops.object.mode_set(mode="OBJECT")
+        invalidate_attribute_cache(self.obj.data, ["positions"])
+        set_mesh_positions(self.obj, positions)
+        update_object(self.obj)
 
     @property
     def global_positions(self):
@@ -743,17 +1229,69 @@ class ObjectGN(BaseObject):
         return self.get_nframe()
 
     def get_nframe(self):
+        if self.obj.batoms.trajectory_file:
+            return len(load_trajectory_file(self.obj.batoms.trajectory_file))
         if self.obj.data.shape_keys is None:
             return 0
         nframe = len(self.obj.data.shape_keys.key_blocks)
         return nframe
 
+    @property
+    def trajectory_backend(self):
+        return self.get_trajectory_backend()
+
+    def get_trajectory_backend(self):
+        """Storage of the trajectory, "shape_key" or "memmap".
+
+        The objects belong to a Batoms, e.g. boundary, follow the Batoms.
+        """
+        batoms = getattr(self, "batoms", None)
+        if batoms is None or batoms is self:
+            return "shape_key"
+        return batoms.trajectory_backend
+
+    def set_trajectory_file(self, obj, trajectory, frame_start=0):
+        """Save the trajectory to a .npy file instead of shape keys.
+
+        Only the current frame is written to the mesh, by the
+        frame_change_pre handler.
+
+        obj: bpy.data.objects
+            object to set the trajectory
+        trajectory: list
+            list of positions
+        frame_start: int
+            start frame
+        """
+        path = get_trajectory_path(obj)
+        release_trajectory_file(path)
+        nframe = len(trajectory)
+        nvert = len(trajectory[0])
+        data = np.lib.format.open_memmap(
+            path, mode="w+", dtype=np.float32, shape=(nframe, nvert, 3)
+        )
+        for i in range(nframe):
+            data[i] = trajectory[i]
+        data.flush()
+        del data
+        link_trajectory_file(obj, path, frame_start=frame_start)
+
     def get_shape_key(self, obj, local=True):
         """
         read shape key
+
+        If the trajectory is saved in a file, return a read-only memmap
+        for local positions.
         """
         from batoms.utils import local2global
 
+        if obj.batoms.trajectory_file:
+            trajectory = load_trajectory_file(obj.batoms.trajectory_file)
+            if local:
+                return trajectory
+            nframe, n = trajectory.shape[:2]
+            matrix = np.array(obj.matrix_world)
+            return local2global(trajectory.reshape(-1, 3), matrix).reshape(nframe, n, 3)
         n = len(self)
         nframe = self.nframe
         trajectory = np.empty((nframe, n, 3), dtype=np.float64)
@@ -793,6 +1331,12 @@ class ObjectGN(BaseObject):
         # shape key should not be add for empty mesh
         if len(trajectory[0]) == 0:
             return
+        if self.trajectory_backend == "memmap":
+            self.set_trajectory_file(obj, trajectory, frame_start=frame_start)
+            return
+        if obj.batoms.trajectory_file:
+            release_trajectory_file(obj.batoms.trajectory_file)
+            obj.batoms.trajectory_file = ""
         # name = '%s_bond%s'%(self.label, sp)
         # obj = bpy.data.objects.get(name)
         base_name = "Basis_%s" % (name)
@@ -807,6 +1351,10 @@ class ObjectGN(BaseObject):
         positions = trajectory[0]
         vertices = positions.reshape(nvert * 3)
         sk.data.foreach_set("co", vertices)
+        # keep the vertices the same as the basis key
+        if sk == obj.data.shape_keys.reference_key:
+            obj.data.vertices.foreach_set("co", vertices)
+        invalidate_attribute_cache(obj.data, ["positions"])
         # self.obj.data.update()
         for i in range(1, nframe):
             name = str(i)
@@ -949,9 +1497,7 @@ class childObjectGN:
         position = local2global(
             position, np.array(self.obj.matrix_world), reversed=True
         )
-        # rashpe to (natoms*3, 1) and use forseach_set
-        self.vertice.co = position[0]
-        self.obj.data.update()
+        set_mesh_positions(self.obj, position[0], int(self.indices[0]))
         update_object(self.obj)
 
     @property
@@ -10,18 +10,24 @@ from batoms.volumetric_data import VolumetricData
 from batoms.cell import Bcell
 from batoms.bselect import Selects
 from batoms.base.collection import BaseCollection
-from batoms.base.object import ObjectGN
+from batoms.base.object import ObjectGN, invalidate_attribute_cache
 from batoms.ribbon.ribbon import Ribbon
 from batoms.utils.butils import (
     get_node_with_node_tree_by_name,
     show_index,
     get_node_by_name,
 )
-from batoms.utils import string2Number, read_from_others, deprecated
+from batoms.utils import (
+    string2Number,
+    strings2Numbers,
+    read_from_others,
+    deprecated,
+)
 from batoms.plugins import plugin_info
 
 import numpy as np
 from time import time
+from contextlib import contextmanager
 
 import logging
 
@@ -46,6 +52,14 @@ default_GroupInput = [
 
 subcollections = ["instancer", "surface", "ribbon", "plane"]
 
+# the deferred updates of the batoms in batch_update, keyed on the label
+batch_updates = {}
+# the updates which have run while the deferred updates are running
+running_updates = {}
+# the order of the deferred updates, the boundary, bonds (and search bonds)
+# and polyhedra depend on the previous ones. draw runs all of them.
+batch_update_order = ["draw", "boundary", "bond", "polyhedra"]
+
 
 class Batoms(BaseCollection, ObjectGN):
     """Batoms Class
@@ -73,6 +87,7 @@ class Batoms(BaseCollection, ObjectGN):
         from_pymatgen=None,
         from_pybel=None,
         load_trajectory=False,
+        trajectory_backend="shape_key",
         segments=None,
     ):
         """Batoms Class
@@ -118,6 +133,10 @@ class Batoms(BaseCollection, ObjectGN):
                 Show atoms as metaball. Defaults to False.
             load_trajectory (bool, optional):
                 Load all trajectory. Defaults to True.
+            trajectory_backend (str, optional):
+                Enum in ["shape_key", "memmap"]. Save the trajectory as shape
+                keys, or in a .npy file next to the .blend file.
+                Defaults to "shape_key".
             segments (_type_, optional):
                 Resolution of the sphere. Defaults to None.
 
@@ -153,6 +172,7 @@ class Batoms(BaseCollection, ObjectGN):
             self.set_collection(
                 label, color_style=color_style, radius_style=radius_style
             )
+            self.coll.batoms.trajectory_backend = trajectory_backend
             self._cell = Bcell(label, cell, batoms=self)
             positions = np.array(positions)
             if len(positions.shape) == 3:
@@ -166,7 +186,7 @@ class Batoms(BaseCollection, ObjectGN):
             self.coll.batoms.model_style = str(model_style)
             arrays = {
                 "species": species,
-                "species_index": [string2Number(sp) for sp in species],
+                "species_index": strings2Numbers(species),
                 "scale": np.ones(natom) * scale,
                 "show": np.ones(natom, dtype=bool),
                 "model_style": np.ones(natom, dtype=int) * model_style,
@@ -578,19 +598,39 @@ class Batoms(BaseCollection, ObjectGN):
         obj = self.obj
         self.set_shape_key(name, obj, trajectory["positions"], frame_start=frame_start)
 
+    def get_trajectory_backend(self):
+        return self.coll.batoms.trajectory_backend
+
+    @property
+    def trajectory_backend(self):
+        return self.get_trajectory_backend()
+
+    @trajectory_backend.setter
+    def trajectory_backend(self, trajectory_backend):
+        self.set_trajectory_backend(trajectory_backend)
+
+    def set_trajectory_backend(self, trajectory_backend):
+        """Change the storage of the trajectory, and move the frames
+        to the new storage.
+
+        Args:
+            trajectory_backend (str): "shape_key" or "memmap"
+        """
+        if trajectory_backend == self.trajectory_backend:
+            return
+        trajectory = None
+        if self.nframe > 0:
+            trajectory = {"positions": np.array(self.get_trajectory()["positions"])}
+        self.coll.batoms.trajectory_backend = trajectory_backend
+        if trajectory is not None:
+            self.set_trajectory(trajectory)
+
     def set_arrays(self, arrays):
         """ """
         # if len(arrays['positions']) == 0:
         #     return
-        attributes = self.attributes
         # same length
-        dnvert = len(arrays["species_index"]) - len(attributes["species_index"])
-        if dnvert > 0:
-            # self.obj.data.vertices.add(dnvert)
-            self.add_vertices_bmesh(dnvert)
-            # self.udpate_mesh(self.obj)
-        elif dnvert < 0:
-            self.delete_vertices_bmesh(range(-dnvert))
+        self.resize_vertices(len(arrays["species_index"]))
         self.positions = arrays["positions"]
         print("positions", self.positions)
         for key, value in arrays.items():
@@ -713,9 +753,10 @@ class Batoms(BaseCollection, ObjectGN):
     def set_model_style_array(self, model_style_array):
         model_style = {"model_style": model_style_array}
         self.set_attributes(model_style)
-        self.draw()
-        if self._boundary is not None:
-            self.boundary.update()
+        with self.batch_update():
+            self.draw()
+            if self._boundary is not None:
+                self.boundary.update()
 
     @property
     def polyhedra_style(self):
@@ -982,11 +1023,14 @@ class Batoms(BaseCollection, ObjectGN):
         Please note that index start from 0.
 
         """
+        from batoms.bond.bond import delete_neighbor_cache_atoms
+
         if isinstance(index[0], (bool, np.bool_)):
             index = np.where(index)[0]
         if isinstance(index, int):
             index = [index]
-        self.delete_vertices_bmesh(index)
+        self.delete_vertices(index)
+        delete_neighbor_cache_atoms(self.label, index)
 
     def __delitem__(self, index):
         """ """
@@ -1080,9 +1124,10 @@ class Batoms(BaseCollection, ObjectGN):
         if self.volumetric_data is not None:
             self._volumetric_data *= m
         self.species.update_geometry_node()
-        if self._boundary is not None:
-            self.boundary.update()
-        self.draw()
+        with self.batch_update():
+            if self._boundary is not None:
+                self.boundary.update()
+            self.draw()
         return self
 
     def repeat(self, m):
@@ -1144,6 +1189,7 @@ class Batoms(BaseCollection, ObjectGN):
         bpy.ops.object.join()
         # update species and species_index
         self._species.extend(other._species)
+        self.selects.add("all", indices1 + indices2)
         self.selects.add(self.label, indices1)
         self.selects.add(other.label, indices2)
         # remove old
@@ -1330,11 +1376,12 @@ class Batoms(BaseCollection, ObjectGN):
             bm.verts.new(pos)
         bm.to_mesh(self.obj.data)
         bm.clear()
+        invalidate_attribute_cache(self.obj.data)
         # add species
         self.species.add(list(set(arrays["species"])))
         self.set_attribute_with_indices("species", range(n0, n1), arrays["species"])
         if "species_index" not in arrays:
-            species_index = [string2Number(sp) for sp in arrays["species"]]
+            species_index = strings2Numbers(arrays["species"])
             self.set_attribute_with_indices(
                 "species_index", range(n0, n1), species_index
             )
@@ -1793,12 +1840,81 @@ class Batoms(BaseCollection, ObjectGN):
         """
         if model_style is not None:
             self.model_style = model_style
+        if self.defer_update("draw"):
+            return
         # self.draw_cell()
         self.draw_space_filling()
         self.draw_ball_and_stick()
         self.draw_polyhedra()
         self.draw_wireframe()
 
+    @contextmanager
+    def batch_update(self):
+        """Defer the updates of the boundary, bonds, polyhedra and draw.
+
+        Inside the context, the setters, e.g. model_style, boundary and
+        crystal_view, only record which updates are needed. On exit, each
+        update runs once, in the order of batch_update_order. The derived
+        data, e.g. the bondlists, is not updated inside the context.
+
+        Example:
+
+        .. code-block:: python
+
+            with batoms.batch_update():
+                batoms.model_style = 2
+                batoms.boundary = 0.01
+                batoms.crystal_view = True
+
+        Yields:
+            set: names of the deferred updates
+        """
+        batch = batch_updates.setdefault(self.label, {"depth": 0, "dirty": set()})
+        batch["depth"] += 1
+        try:
+            yield batch["dirty"]
+        finally:
+            batch["depth"] -= 1
+            if batch["depth"] == 0:
+                batch_updates.pop(self.label, None)
+        if batch["depth"] == 0:
+            self.run_updates(batch["dirty"])
+
+    def defer_update(self, name):
+        """Record the update if inside batch_update.
+
+        Args:
+            name (str): name of the update, see batch_update_order
+
+        Returns:
+            bool: True if the update is deferred
+        """
+        batch = batch_updates.get(self.label)
+        if batch is None:
+            done = running_updates.get(self.label)
+            if done is not None:
+                done.add(name)
+            return False
+        batch["dirty"].add(name)
+        return True
+
+    def run_updates(self, dirty):
+        """Run the deferred updates, the updates already run by a previous
+        one, e.g. the boundary by draw, are not repeated."""
+        done = running_updates.setdefault(self.label, set())
+        tstart = time()
+        try:
+            for name in batch_update_order:
+                if name not in dirty or name in done:
+                    continue
+                if name == "draw":
+                    self.draw()
+                else:
+                    getattr(self, name).update()
+        finally:
+            running_updates.pop(self.label, None)
+        logger.debug("run updates {}: {:1.2f} s".format(sorted(dirty), time() - tstart))
+
     def draw_space_filling(self):
         # mask = np.where(self.model_style_array == 0, True, False)
         # self.set_attribute_with_indices('scale', mask, self.scale)
@@ -2085,16 +2201,18 @@ class Batoms(BaseCollection, ObjectGN):
     def set_crystal_view(self, crystal_view):
         #
         self.coll.batoms.crystal_view = crystal_view
-        if crystal_view:
-            self.boundary = 0.01
-            self.bond.show_search = True
-            self.bond.update()
-            self.polyhedra.update()
-        else:
-            self.boundary = 0
-            self.bond.show_search = False
-            self.bond.update()
-            self.polyhedra.update()
+        # boundary, bonds and polyhedra are updated once
+        with self.batch_update():
+            if crystal_view:
+                self.boundary = 0.01
+                self.bond.show_search = True
+                self.bond.update()
+                self.polyhedra.update()
+            else:
+                self.boundary = 0
+                self.bond.show_search = False
+                self.bond.update()
+                self.polyhedra.update()
 
     @property
     def segments(self):
@@ -2132,31 +2250,42 @@ class Batoms(BaseCollection, ObjectGN):
         logger.debug("time: {:1.3f}".format(time() - tstart))
         return charges
 
-    def calc_electrostatic_potential(self, points):
+    def calc_electrostatic_potential(
+        self, points, method="auto", tolerance=0.3, accuracy=1e-5, dtype=np.float64
+    ):
         """Calc electrostatic potential on given points
             based on partial charges.
 
+        The points are processed in chunks, so the memory is bounded
+        for large molecules and surfaces.
+
         Args:
             points (array): points
+            method (str): "direct", "tree" (Barnes-Hut approximation),
+                "ewald" (periodic cell) or "auto".
+            tolerance (float): opening criterion of the tree method,
+                smaller is more accurate, the default keeps the rms
+                error below 2%.
+            accuracy (float): accuracy of the ewald method.
+            dtype: float type of the direct method.
 
         Returns:
             array: potentials at given points
         """
-        from ase.geometry import get_distances
+        from batoms.electrostatic import calc_electrostatic_potential
 
-        tstart = time()
         positions = self.positions
         charges = self.get_attribute("charges")
-        # parameter
-        eps = 8.854e-12  # Permittivity of free space (F.m-1)
-        k = 1 / 4 / np.pi / eps
-        # calculate distance
-        D, D_len = get_distances(positions, points)
-        # matrix
-        pot_mat = k / D_len * charges[:, None]
-        # sum over all charge (atoms)
-        potentials = np.sum(pot_mat, axis=0)
-        logger.debug("time: {:1.3f}".format(time() - tstart))
+        potentials = calc_electrostatic_potential(
+            positions,
+            charges,
+            points,
+            method=method,
+            cell=self.cell.array,
+            tolerance=tolerance,
+            accuracy=accuracy,
+            dtype=dtype,
+        )
         return potentials
 
     def set_hide(self, state):
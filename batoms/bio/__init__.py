@@ -1,3 +1,3 @@
-from batoms.bio.bio import read
+from batoms.bio.bio import read, iread
 
-__all__ = ["read"]
+__all__ = ["read", "iread"]
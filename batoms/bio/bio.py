@@ -2,13 +2,19 @@ import os
 from ase import io
 from ase.io.cube import read_cube_data
 from batoms import Batoms
+import logging
+
+logger = logging.getLogger(__name__)
 
 # from time import time
 
 
-def read(filename, label=None, **kwargs):
+def read(filename, label=None, stream=False, **kwargs):
     """
     wrapper function for ase.io.read
+
+    stream (bool): read the trajectory frame by frame, the first frame
+        is drawn immediately, see iread.
     """
     base = os.path.basename(filename)
     base = os.path.splitext(base)
@@ -30,7 +36,121 @@ def read(filename, label=None, **kwargs):
         # load structure and vlumetric data into Batoms
         batoms = Batoms("batoms", from_pymatgen=poscar.structure)
         batoms.volumetric_data["chgcar"] = data["total"]
+    elif stream:
+        batoms = iread(filename, label=label, **kwargs)
     else:
         atoms = io.read(filename=filename, **kwargs)
         batoms = Batoms(label=label, from_ase=atoms)
     return batoms
+
+
+def iread(
+    filename,
+    label,
+    index=":",
+    stride=1,
+    chunk_size=100,
+    threaded=None,
+    callback=None,
+    **kwargs,
+):
+    """
+    Read a trajectory frame by frame with ase.io.iread.
+
+    The first frame is drawn immediately. The other frames are read in a
+    background thread, and written in chunks to the trajectory file
+    (memmap backend), the frames are available in blender once a chunk
+    is written.
+
+    Args:
+        filename (str): name of the file
+        label (str): label of the Batoms
+        index (str, slice): frames to read, e.g. "100:2000"
+        stride (int): read every stride-th frame of the index
+        chunk_size (int): number of frames written at once
+        threaded (bool): read in a background thread, default True
+            if blender is not in background mode.
+        callback (function): called as callback(nframe) in the main
+            thread after each chunk, e.g. to report the progress.
+
+    Returns:
+        Batoms: the Batoms object with the first frame
+    """
+    import bpy
+    import itertools
+    import threading
+    from batoms.base.object import (
+        get_trajectory_path,
+        append_trajectory_file,
+        link_trajectory_file,
+    )
+
+    if threaded is None:
+        threaded = not bpy.app.background
+    frames = itertools.islice(
+        io.iread(filename, index=index, **kwargs), 0, None, stride
+    )
+    atoms = next(frames, None)
+    if atoms is None:
+        raise ValueError("No frame found in {} with index {}".format(filename, index))
+    batoms = Batoms(label=label, from_ase=atoms, trajectory_backend="memmap")
+    path = get_trajectory_path(batoms.obj)
+    natom = len(atoms)
+    state = {"nframe": append_trajectory_file(path, [atoms.positions])}
+    link_trajectory_file(batoms.obj, path)
+    state.update({"done": False, "error": None})
+    lock = threading.Lock()
+
+    def update():
+        """Publish the frames written to the file, in the main thread."""
+        with lock:
+            # reopen the file, thus the memmap sees the new frames. done is
+            # read together, thus the last link includes the last chunk.
+            link_trajectory_file(batoms.obj, path)
+            nframe = state["nframe"]
+            done = state["done"]
+        if callback is not None:
+            callback(nframe)
+        logger.info("Read {}: {} frames".format(filename, nframe))
+        if not done:
+            return 0.5
+        if state["error"] is not None:
+            logger.error("Read {} failed: {}".format(filename, state["error"]))
+        return None
+
+    def write(chunk):
+        with lock:
+            state["nframe"] = append_trajectory_file(path, chunk, state["nframe"])
+        if not threaded:
+            update()
+
+    def load():
+        chunk = []
+        try:
+            for atoms in frames:
+                if len(atoms) != natom:
+                    raise ValueError(
+                        "Number of atoms changes in frame {}.".format(
+                            state["nframe"] + len(chunk)
+                        )
+                    )
+                chunk.append(atoms.positions)
+                if len(chunk) == chunk_size:
+                    write(chunk)
+                    chunk = []
+            if len(chunk) > 0:
+                write(chunk)
+        except Exception as e:
+            if not threaded:
+                raise
+            state["error"] = e
+        finally:
+            with lock:
+                state["done"] = True
+
+    if threaded:
+        threading.Thread(target=load, daemon=True).start()
+        bpy.app.timers.register(update, first_interval=0.5)
+    else:
+        load()
+    return batoms
@@ -62,6 +62,58 @@ default_bond_datas = {
     "second_bond": np.ones(0, dtype=int),
 }
 
+# persistent neighbor structures for the incremental update, the key is the
+# label, so that they are shared by the Bond objects of the same batoms,
+# e.g. the ones created by the operators.
+neighbor_caches = {}
+
+
+def delete_neighbor_cache(label=None):
+    """Remove the neighbor cache of the batoms, or all caches if label is
+    None, e.g. when the batoms is deleted or a new file is loaded.
+
+    Args:
+        label (str): label of the batoms
+    """
+    if label is None:
+        neighbor_caches.clear()
+    else:
+        neighbor_caches.pop(label, None)
+
+
+def delete_neighbor_cache_atoms(label, indices):
+    """Remove the deleted atoms from the neighbor cache.
+
+    The bonds between the other atoms are kept, and their indices are
+    shifted. The KDTree is rebuilt at the next incremental update.
+
+    Args:
+        label (str): label of the batoms
+        indices (list): indices of the deleted atoms
+    """
+    cache = neighbor_caches.get(label)
+    if cache is None:
+        return
+    indices = np.asarray(indices, dtype=int)
+    natom = len(cache["positions"])
+    if len(indices) > 0 and (indices.max() >= natom or indices.min() < -natom):
+        neighbor_caches.pop(label, None)
+        return
+    keep = np.ones(natom, dtype=bool)
+    keep[indices] = False
+    new_indices = np.cumsum(keep) - 1
+    bondlists = cache["bondlists"]
+    bondlists = bondlists[keep[bondlists[:, 0]] & keep[bondlists[:, 1]]].copy()
+    bondlists[:, 0:2] = new_indices[bondlists[:, 0:2]]
+    neighbor_caches[label] = {
+        "species": cache["species"][keep],
+        "positions": cache["positions"][keep],
+        "cell": cache["cell"],
+        "pbc": cache["pbc"],
+        "setting": cache["setting"],
+        "bondlists": bondlists,
+    }
+
 
 class Bond(BaseCollection, ObjectGN):
     """Bbond Class
@@ -88,6 +140,8 @@ class Bond(BaseCollection, ObjectGN):
         self.settings = BondSettings(self.label, batoms=batoms, bonds=self)
         self.build_geometry_node()
         self._search_bond = SearchBond(self.label, batoms=batoms, load=True)
+        # symmetry mapping of the last structure
+        self._symmetry_cache = None
 
     @property
     def bond_node(self):
@@ -647,84 +701,254 @@ class Bond(BaseCollection, ObjectGN):
             ][order_style]
         logger.debug("update bond instancer: %s" % (time() - tstart))
 
-    def update(self, bondlists=None, orders=None):
+    def update(
+        self, bondlists=None, orders=None, indices=None, workers=None, callback=None
+    ):
         """
         Draw bonds.
         calculate bond in all farmes, and merge all bondlists.
         Draw bonds in the bondlists, only show the bond if it
         is smaller than the max bond length.
+
+        indices: list of int
+            indices of the atoms moved since the last update. If given,
+            only the bonds connected to these atoms are re-calculated,
+            see update_incremental. The atoms appended since the last
+            update, e.g. by add_atoms, are always searched incrementally.
+        workers: int
+            number of threads used to search the bonds of the frames,
+            default is self.workers.
+        callback: function
+            called as callback(nfinished, nframe) after each frame,
+            e.g. to report the progress in the GUI.
         """
+        from concurrent.futures import ThreadPoolExecutor
 
+        if bondlists is None and self.batoms.defer_update("bond"):
+            return
         object_mode()
-        # clean_coll_objects(self.coll, 'bond')
-        positions = self.batoms.positions
-        trajectory = self.batoms.get_trajectory()["positions"]
-        arrays = self.batoms.arrays
-        boundary_data = self.batoms.boundary.boundary_data
-        show = arrays["show"].astype(bool)
-        species = arrays["species"][show]
-        # trajectory_boundary = self.batoms.get_trajectory(self.batoms.batoms_boundary)
-        # trajectory_search = self.batoms.get_trajectory(self.batoms.batoms_search)
-        if self.batoms.nframe == 0:
-            trajectory = np.array([positions])
-        nframe = len(trajectory)
-        bond_datas = {}
-        tstart = time()
-        setting = self.settings.as_dict()
         if bondlists is None:
-            for f in range(nframe):
-                # print('update bond: ', f)
-                positions = trajectory[f, show, :]
-                # build bondlist for unit cell
-                (
-                    bondlist,
-                    bonddatas,
-                    peciesBondDatas,
-                    molPeciesDatas,
-                ) = self.build_bondlists(
-                    species, positions, self.batoms.cell, self.batoms.pbc, setting
-                )
-                # build bondlist for boundary atoms
-                # for molecule with cell == [0, 0, 0], skip
+            cache = self.neighbor_cache
+            if (
+                indices is None
+                and cache is not None  # noqa: W503
+                and len(self.batoms) > len(cache["positions"])  # noqa: W503
+            ):
+                indices = []
+            if indices is not None and self.update_incremental(indices, orders=orders):
+                return
+        # read the arrays of batoms only once
+        with self.batoms.cache_attributes():
+            # clean_coll_objects(self.coll, 'bond')
+            positions = self.batoms.positions
+            trajectory = self.batoms.get_trajectory()["positions"]
+            arrays = self.batoms.arrays
+            boundary_data = self.batoms.boundary.boundary_data
+            show = arrays["show"].astype(bool)
+            species = arrays["species"][show]
+            # trajectory_boundary = self.batoms.get_trajectory(self.batoms.batoms_boundary)
+            # trajectory_search = self.batoms.get_trajectory(self.batoms.batoms_search)
+            if self.batoms.nframe == 0:
+                trajectory = np.array([positions])
+            nframe = len(trajectory)
+            bond_datas = {}
+            tstart = time()
+            setting = self.settings.as_dict()
+            if bondlists is None:
+                # read all blender data here, the frames are searched in threads
+                workers = self.workers if workers is None else workers
+                show_search = self.show_search
+                kwargs = {
+                    "species": species,
+                    "cell": self.batoms.cell,
+                    "pbc": self.batoms.pbc,
+                    "setting": setting,
+                    "engine": self.neighbor_engine,
+                    "boundary_data": boundary_data,
+                }
                 if boundary_data is not None:
-                    bondlist = self.build_bondlists_with_boundary(
-                        boundary_data,
-                        bondlist,
-                        bonddatas,
-                        peciesBondDatas,
-                        molPeciesDatas,
+                    kwargs["scaled_positions"] = self.get_scaled_positions()
+                    kwargs["boundary"] = self.batoms.boundary.boundary
+                if self.use_symmetry and nframe == 1:
+                    kwargs["symmetry"] = self.get_symmetry(
+                        species, trajectory[0, show, :]
                     )
-                    bondlist = self.check_boundary(bondlist)
-                # search molecule
+
+                def search(f):
+                    return self.build_frame_bondlists(trajectory[f, show, :], **kwargs)
+
+                results = []
+                if workers > 1 and nframe > 1:
+                    with ThreadPoolExecutor(max_workers=workers) as executor:
+                        for f, result in enumerate(executor.map(search, range(nframe))):
+                            results.append(result)
+                            if callback is not None:
+                                callback(f + 1, nframe)
+                else:
+                    for f in range(nframe):
+                        results.append(search(f))
+                        if callback is not None:
+                            callback(f + 1, nframe)
+                # the pecies of the first frame, set after the threads finish
+                (
+                    self.peciesBondDatas,
+                    self.molPeciesDatas,
+                    self.peciesBondLists,
+                    self.molDatas,
+                ) = results[0][1:]
                 # search bond
-                if self.show_search:
+                if show_search:
                     self.search_bond.hide = False
-                    self.search_bond.update(
-                        bondlist,
-                        peciesBondDatas,
-                        molPeciesDatas,
-                        arrays,
-                        self.batoms.cell,
-                    )
-                if f == 0:
-                    bondlists = bondlist
-                else:
-                    bondlists = np.append(bondlists, bondlist, axis=0)
-            bondlists = np.unique(bondlists, axis=0)
+                    for bondlist, peciesBondDatas, molPeciesDatas, _, _ in results:
+                        self.search_bond.update(
+                            bondlist,
+                            peciesBondDatas,
+                            molPeciesDatas,
+                            arrays,
+                            self.batoms.cell,
+                        )
+                bondlists = np.concatenate([result[0] for result in results], axis=0)
+                bondlists = np.unique(bondlists, axis=0)
+                # save the bondlists for incremental update
+                self.neighbor_cache = None
+                if self.incremental_supported(nframe, show, boundary_data, setting):
+                    self.neighbor_cache = {
+                        "species": species,
+                        "positions": trajectory[0, show, :],
+                        "cell": self.batoms.cell.array,
+                        "pbc": self.batoms.pbc,
+                        "setting": setting,
+                        "bondlists": bondlists,
+                    }
+            bond_datas = self.calc_bond_data(
+                species,
+                trajectory[:, show, :],
+                self.batoms.cell,
+                bondlists,
+                self.settings,
+                arrays["model_style"][show],
+            )
+            if orders:
+                bond_datas.update({"bond_order": orders})
+            if len(bond_datas) == 0:
+                return
+            self.set_arrays(bond_datas)
+            logger.debug("draw bond: {0:10.2f} s".format(time() - tstart))
+
+    def incremental_supported(self, nframe, show, boundary_data, setting):
+        """Incremental update only support single frame without
+        boundary atoms, search bond and search molecule (search type 2)."""
+        if nframe > 1 or not show.all() or self.show_search:
+            return False
+        if boundary_data is not None and len(boundary_data["positions"]) > 0:
+            return False
+        for b in setting.values():
+            if b["search"] == 2:
+                return False
+        return True
+
+    def update_incremental(self, indices, orders=None):
+        """Only re-calculate the bonds connected to the moved atoms.
+
+        The bondlists of the last update, and the KDTree of the atoms
+        are kept. The bonds connected to the moved atoms are removed
+        by the per-atom index, and searched again. The atoms appended
+        since the last update are searched as moved atoms.
+
+        Args:
+            indices (list): indices of the moved atoms
+
+        Returns:
+            bool: False if the incremental update is not possible,
+            e.g. the cell, the bond setting or other atoms changed.
+        """
+        from batoms.neighborlist import (
+            build_neighbor_cache,
+            update_neighbor_cache,
+            set_neighbor_cache_bondlists,
+        )
+
+        tstart = time()
+        cache = self.neighbor_cache
+        if cache is None:
+            return False
+        arrays = self.batoms.arrays
+        positions = arrays["positions"]
+        species = arrays["species"]
+        cell = self.batoms.cell.array
+        pbc = self.batoms.pbc
+        setting = self.settings.as_dict()
+        boundary_data = self.batoms.boundary.boundary_data
+        show = arrays["show"].astype(bool)
+        if not self.incremental_supported(
+            self.batoms.nframe, show, boundary_data, setting
+        ):
+            return False
+        # check the cache is still valid
+        natom = len(positions)
+        n0 = len(cache["positions"])
+        if natom < n0:
+            self.neighbor_cache = None
+            return False
+        indices = np.union1d(np.asarray(indices, dtype=int), np.arange(n0, natom))
+        static = np.ones(n0, dtype=bool)
+        static[indices[indices < n0]] = False
+        if (
+            not np.array_equal(species[:n0][static], cache["species"][static])
+            or not np.allclose(cell, cache["cell"])  # noqa: W503
+            or not np.array_equal(pbc, cache["pbc"])  # noqa: W503
+            or setting != cache["setting"]  # noqa: W503
+            or not np.allclose(  # noqa: W503
+                positions[:n0][static], cache["positions"][static]
+            )
+        ):
+            self.neighbor_cache = None
+            return False
+        if (
+            "tree" not in cache
+            or natom > n0  # noqa: W503
+            or not np.array_equal(species[:n0], cache["species"])  # noqa: W503
+        ):
+            # the appended atoms and the atoms with a new species are
+            # in the tree, but searched as moved atoms
+            cache = build_neighbor_cache(
+                species,
+                np.append(cache["positions"], positions[n0:], axis=0),
+                cell,
+                pbc,
+                setting,
+                cache["bondlists"],
+            )
+            self.neighbor_cache = cache
+        bondlists = update_neighbor_cache(cache, positions, indices)
+        if boundary_data is not None:
+            bondlists = self.check_boundary(bondlists)
+        set_neighbor_cache_bondlists(cache, bondlists)
         bond_datas = self.calc_bond_data(
             species,
-            trajectory[:, show, :],
-            self.batoms.cell,
+            positions,
+            cell,
             bondlists,
             self.settings,
-            arrays["model_style"][show],
+            arrays["model_style"],
         )
         if orders:
             bond_datas.update({"bond_order": orders})
-        if len(bond_datas) == 0:
-            return
         self.set_arrays(bond_datas)
-        logger.debug("draw bond: {0:10.2f} s".format(time() - tstart))
+        logger.debug("update bond incrementally: {0:10.2f} s".format(time() - tstart))
+        return True
+
+    @property
+    def neighbor_cache(self):
+        """Neighbor structure of the last update, see update_incremental."""
+        return neighbor_caches.get(self.label)
+
+    @neighbor_cache.setter
+    def neighbor_cache(self, cache):
+        if cache is None:
+            neighbor_caches.pop(self.label, None)
+        else:
+            neighbor_caches[self.label] = cache
 
     def get_arrays(self):
         """ """
@@ -748,12 +972,18 @@ class Bond(BaseCollection, ObjectGN):
         if "atoms_index0" not in self.obj.data.attributes:
             for att in default_bond_attributes:
                 self.add_attribute(**att)
-        # blender delete all edges
-        dnvert = len(self.obj.data.edges)
-        self.delete_edges_bmesh(range(dnvert))
-        #
         edges = np.vstack((arrays["atoms_index0"], arrays["atoms_index1"])).T
-        self.add_edges(edges, self.batoms.obj)
+        me = self.obj.data
+        if len(me.edges) == len(edges) and len(edges) > 0:
+            # same number of bonds, only patch the vertices of the edges
+            me.edges.foreach_set("vertices", edges.reshape(-1))
+            me.update()
+        else:
+            # blender delete all edges
+            dnvert = len(me.edges)
+            self.delete_edges_bmesh(range(dnvert))
+            #
+            self.add_edges(edges, self.batoms.obj)
         self.set_attributes(arrays)
         # self.set_trajectory(arrays)
         self.update_geometry_node_instancer()
@@ -830,6 +1060,54 @@ class Bond(BaseCollection, ObjectGN):
         self.settings.coll.Bbond.show_hydrogen_bond = show_hydrogen_bond
         self.update()
 
+    @property
+    def neighbor_engine(self):
+        return self.settings.coll.Bbond.neighbor_engine
+
+    @neighbor_engine.setter
+    def neighbor_engine(self, neighbor_engine):
+        self.settings.coll.Bbond.neighbor_engine = neighbor_engine
+        self.update()
+
+    @property
+    def use_symmetry(self):
+        return self.settings.coll.Bbond.use_symmetry
+
+    @use_symmetry.setter
+    def use_symmetry(self, use_symmetry):
+        self.settings.coll.Bbond.use_symmetry = use_symmetry
+        self.update()
+
+    def get_symmetry(self, species, positions, tol=1e-5):
+        """Symmetry mapping of the atoms, see
+        batoms.neighborlist.get_symmetry_mapping.
+
+        The mapping is kept for the same structure, because finding the
+        space group of a large cell is slow. None if the structure is not
+        periodic in all directions, or the symmetry is not found.
+        """
+        from batoms.neighborlist import get_symmetry_mapping
+
+        if not all(self.batoms.pbc):
+            return None
+        cell = np.array(self.batoms.cell)
+        key = (species.tobytes(), positions.tobytes(), cell.tobytes(), tol)
+        if self._symmetry_cache is not None and self._symmetry_cache[0] == key:
+            return self._symmetry_cache[1]
+        tstart = time()
+        symmetry = get_symmetry_mapping(species, positions, cell, tol=tol)
+        self._symmetry_cache = (key, symmetry)
+        logger.debug("symmetry mapping: {0:10.2f} s".format(time() - tstart))
+        return symmetry
+
+    @property
+    def workers(self):
+        return self.settings.coll.Bbond.workers
+
+    @workers.setter
+    def workers(self, workers):
+        self.settings.coll.Bbond.workers = workers
+
     def __getitem__(self, indices):
         """Return a subset of the Bbond.
 
@@ -945,7 +1223,9 @@ class Bond(BaseCollection, ObjectGN):
         s = "Bonds(Total: {:6d}, {}".format(len(self), self.arrays)
         return s
 
-    def build_bondlists(self, species, positions, cell, pbc, setting):
+    def build_bondlists(
+        self, species, positions, cell, pbc, setting, engine=None, symmetry=None
+    ):
         """
         build bondlist for atoms
         steps:
@@ -954,13 +1234,29 @@ class Bond(BaseCollection, ObjectGN):
           return pecies data and its neighbour
         3 add bondlist related with molecule
 
+        symmetry: dict
+            if given, only search the bonds of the symmetry-unique atoms,
+            see batoms.neighborlist.bondlist_symmetry.
+
+        It does not change the Bond object, thus it can run in threads.
+
+        Returns:
+            tuple: bondlists, bonddatas, peciesBondDatas, molPeciesDatas,
+            peciesBondLists, molDatas
         """
-        from batoms.neighborlist import bondlist_kdtree
+        from batoms.neighborlist import (
+            bondlist_kdtree,
+            bondlist_symmetry,
+            build_bonddatas,
+            gather_pecies_bonddatas,
+        )
 
+        if engine is None:
+            engine = self.neighbor_engine
         bondlists = np.zeros((0, 11), dtype=int)
-        bonddatas = {}
+        bonddatas = build_bonddatas(bondlists, len(positions))
         if len(setting) == 0:
-            return bondlists, bonddatas, {}, {}
+            return bondlists, bonddatas, {}, {}, np.zeros((0, 11), dtype=int), {}
         #
         # tstart = time()
         # ==========================================================
@@ -971,9 +1267,27 @@ class Bond(BaseCollection, ObjectGN):
         # nlp: polyhedra
         # nlt: bond type: hydrogen bond
         # nlSj: offset of atoms in nlj
-        nli, nlj, nlk, nlp, nlt, nlSj = bondlist_kdtree(
-            "ijkptS", species, positions, cell, pbc, setting
-        )
+        if symmetry is not None:
+            nli, nlj, nlk, nlp, nlt, nlSj = bondlist_symmetry(
+                "ijkptS",
+                species,
+                positions,
+                cell,
+                pbc,
+                setting,
+                symmetry,
+                engine=engine,
+            )
+        else:
+            nli, nlj, nlk, nlp, nlt, nlSj = bondlist_kdtree(
+                "ijkptS",
+                species,
+                positions,
+                cell,
+                pbc,
+                setting,
+                engine=engine,
+            )
         nb = len(nli)
         nlSi = np.zeros((nb, 3))
         # print('build_bondlists: {0:10.2f} s'.format(time() - tstart))
@@ -1000,18 +1314,13 @@ class Bond(BaseCollection, ObjectGN):
         # not now, we need all bonds here, and then add a final check.
         # bondlists = bondlists[search0]
         # build bondatas, for each atom, save the bonds connect to it.
-        argsort = bondlists[:, 0].argsort()
-        bondlists = bondlists[argsort]
-        u, indices = np.unique(bondlists[:, 0], return_index=True)
-        indices = np.append(indices, len(bondlists))
-        m = len(u)
-        for i in range(m):
-            bonddatas[u[i]] = bondlists[indices[i] : indices[i + 1]]
+        bonddatas = build_bonddatas(bondlists, len(positions))
+        bondlists = bonddatas["bondlists"]
         #
         # ===================================================
         # 2 search connected_components (molecule),
         #   return pecies data and its neighbour
-        peciesBondLists, molPeciesDatas = self.build_peciesBondLists(
+        peciesBondLists, molPeciesDatas, molDatas = self.build_peciesBondLists(
             len(positions), bondlists
         )
         # build peciesBondDatas
@@ -1042,33 +1351,26 @@ class Bond(BaseCollection, ObjectGN):
             peciesBondDatas[u[i]] = data
         # ==========================================================
         # 3 add bondlist related with molecule
-        # add bondlist for molecule
-        for mol in peciesBondLists:
-            indices = molPeciesDatas[mol[1]]
-            for i in indices:
-                if i not in bonddatas:
-                    continue
-                data = bonddatas[i]
-                n = len(data)
-                bondlists = np.append(bondlists, data, axis=0)
-                bondlists[-n:, 2:5] += mol[5:8]
-                bondlists[-n:, 5:8] += mol[5:8]
-            indices = molPeciesDatas[mol[0]]
-            for i in indices:
-                if i not in bonddatas:
-                    continue
-                data = bonddatas[i]
-                n = len(data)
-                bondlists = np.append(bondlists, data, axis=0)
-                bondlists[-n:, 2:5] -= mol[5:8]
-                bondlists[-n:, 5:8] -= mol[5:8]
+        # add bondlist for molecule, the atoms of pecies j are shifted by
+        # the offset, and the atoms of pecies i are shifted back.
+        data = gather_pecies_bonddatas(
+            bonddatas,
+            molPeciesDatas,
+            np.concatenate((peciesBondLists[:, 1], peciesBondLists[:, 0])),
+            np.concatenate((peciesBondLists[:, 5:8], -peciesBondLists[:, 5:8])),
+        )
+        bondlists = np.append(bondlists, data, axis=0)
         # print(bondlists)
         bondlists = bondlists.astype(int)
         bondlists = np.unique(bondlists, axis=0)
-        self.peciesBondLists = peciesBondLists
-        self.molPeciesDatas = molPeciesDatas
-        self.peciesBondDatas = peciesBondDatas
-        return bondlists, bonddatas, peciesBondDatas, molPeciesDatas
+        return (
+            bondlists,
+            bonddatas,
+            peciesBondDatas,
+            molPeciesDatas,
+            peciesBondLists,
+            molDatas,
+        )
 
     def build_peciesBondLists(self, natom, bondlists):
         """
@@ -1078,6 +1380,9 @@ class Bond(BaseCollection, ObjectGN):
         2 construct the molecules by its pecies and the coresponding offsets
         3 for
         3 return the molecules
+
+        Returns:
+            tuple: peciesBondLists, molPeciesDatas, molDatas
         """
         from scipy.sparse import csgraph, csr_matrix
 
@@ -1088,7 +1393,7 @@ class Bond(BaseCollection, ObjectGN):
         indices = np.where(k == 2)[0]
         ns2 = len(indices)
         if ns2 == 0:
-            return peciesBondLists, molPeciesDatas
+            return peciesBondLists, molPeciesDatas, {}
         bondlists1 = bondlists[indices, :]
         # ========================================================
         # 1 search connected_components (molecules) inside atoms
@@ -1180,106 +1485,147 @@ class Bond(BaseCollection, ObjectGN):
                     peciesBondLists = np.append(
                         peciesBondLists, np.array([mollist]), axis=0
                     )
-        self.molDatas = molDatas
-        return peciesBondLists, molPeciesDatas
+        return peciesBondLists, molPeciesDatas, molDatas
 
     def build_bondlists_with_boundary(
         self, arrays, bondlists, bonddatas, peciesBondDatas, molPeciesDatas
     ):
         """
         build extra bondlists based on boundary atoms
+
+        bonddatas: bonds connect to each atom in CSR layout,
+            see build_bonddatas
         """
+        from batoms.neighborlist import (
+            gather_csr,
+            dict_to_csr,
+            gather_bonddatas,
+            gather_pecies_bonddatas,
+        )
+
         n = len(arrays["positions"])
         if n == 0:
             return bondlists
         # search bond type 0 and 1
-        for i in range(n):
-            if arrays["indices"][i] not in bonddatas:
-                # print('no bonds: ', arrays['indices'][i])
-                continue
-            data = bonddatas[arrays["indices"][i]]
-            n = len(data)
-            bondlists = np.append(bondlists, data, axis=0)
-            bondlists[-n:, 2:5] = bondlists[-n:, 2:5] + arrays["boundary_offset"][i]
-            bondlists[-n:, 5:8] = bondlists[-n:, 5:8] + arrays["boundary_offset"][i]
-            # todo: in this case, some of the atoms overlap
-            # with original atoms.
-            # since it doesn't influence the 3d view, we
-            # just leave it like this
-            # bondlists[-n:, 8] = 1
+        # copy the bonds of all boundary atoms at once
+        data = gather_bonddatas(bonddatas, arrays["indices"], arrays["boundary_offset"])
+        # todo: in this case, some of the atoms overlap
+        # with original atoms.
+        # since it doesn't influence the 3d view, we
+        # just leave it like this
+        bondlists = np.append(bondlists, data, axis=0)
         # print('build_bondlists: {0:10.2f} s'.format(time() - tstart))
         bondlists = np.unique(bondlists, axis=0)
         # search bond type 2
-        # divide boudanry atoms by boundary_offset
-        boundary_offset = np.unique(arrays["boundary_offset"], axis=0)
-        n = len(boundary_offset) * len(molPeciesDatas)
-        peciesArrays = np.zeros((n, 4), dtype=int)
-        n = 0
-        for offset in boundary_offset:
-            indices = np.where((arrays["boundary_offset"] == offset).all(axis=1))[0]
-            indices = arrays["indices"][indices]
-            for p, indices0 in molPeciesDatas.items():
-                indices1 = np.intersect1d(indices0, indices)
-                if len(indices1) > 0:
-                    peciesArrays[n][0] = p
-                    peciesArrays[n][1:4] = offset
-                    n += 1
-        peciesArrays = peciesArrays[:n]
+        # find the pecies of boundary atoms, and divide them by boundary_offset
+        natom = len(bonddatas["indptr"]) - 1
+        indptr, atoms = dict_to_csr(molPeciesDatas, natom)
+        atom_pecies = np.full(natom, -1, dtype=int)
+        atom_pecies[atoms] = np.repeat(np.arange(natom), np.diff(indptr))
+        indices = np.asarray(arrays["indices"], dtype=int)
+        mask = indices < natom
+        pecies = atom_pecies[indices[mask]]
+        offsets = np.asarray(arrays["boundary_offset"], dtype=int)[mask]
+        mask = pecies >= 0
+        peciesArrays = np.unique(
+            np.concatenate((pecies[mask].reshape(-1, 1), offsets[mask]), axis=1),
+            axis=0,
+        )
         npa = len(peciesArrays)
         if npa == 0:
             return bondlists
-        # search bond type 2
-        for i in range(npa):
-            peciesId = peciesArrays[i, 0]
-            p = peciesBondDatas[peciesId]
-            # repeat itself
-            indices = molPeciesDatas[peciesId]
-            for j in indices:
-                if j not in bonddatas:
-                    continue
-                data = bonddatas[j]
-                n = len(data)
-                bondlists = np.append(bondlists, data, axis=0)
-                bondlists[-n:, 2:5] += peciesArrays[i, 1:4]
-                bondlists[-n:, 5:8] += peciesArrays[i, 1:4]
-            # repeat its neighbour pecies
-            for pb in p:
-                peciesId = pb[1]
-                indices = molPeciesDatas[peciesId]
-                for j in indices:
-                    if j not in bonddatas:
-                        continue
-                    data = bonddatas[j]
-                    n = len(data)
-                    bondlists = np.append(bondlists, data, axis=0)
-                    bondlists[-n:, 2:5] += peciesArrays[i, 1:4] + pb[5:8]
-                    bondlists[-n:, 5:8] += peciesArrays[i, 1:4] + pb[5:8]
-            # todo: in this case, some of the atoms overlap with
-            # original atoms.
-            # since it doesn't influence the 3d view,
-            # we just leave it like this
-            # bondlists[-n:, 8] = 1
+        # repeat itself and its neighbour pecies
+        indptr, pb = dict_to_csr(peciesBondDatas, natom)
+        pb = pb.reshape(-1, 11)
+        counts = indptr[peciesArrays[:, 0] + 1] - indptr[peciesArrays[:, 0]]
+        _, pb = gather_csr(indptr, pb, peciesArrays[:, 0])
+        offsets = np.repeat(peciesArrays[:, 1:4], counts, axis=0) + pb[:, 5:8]
+        data = gather_pecies_bonddatas(
+            bonddatas,
+            molPeciesDatas,
+            np.concatenate((peciesArrays[:, 0], pb[:, 1])),
+            np.concatenate((peciesArrays[:, 1:4], offsets)),
+        )
+        # todo: in this case, some of the atoms overlap with
+        # original atoms.
+        # since it doesn't influence the 3d view,
+        # we just leave it like this
+        bondlists = np.append(bondlists, data, axis=0)
         # print('build_bondlists: {0:10.2f} s'.format(time() - tstart))
         bondlists = np.unique(bondlists, axis=0)
-        # search bond type 2
 
         return bondlists
 
-    def check_boundary(self, bondlists, eps=1e-6):
-        """check boundary for bond search 0
+    def build_frame_bondlists(
+        self,
+        positions,
+        species,
+        cell,
+        pbc,
+        setting,
+        engine,
+        boundary_data=None,
+        scaled_positions=None,
+        boundary=None,
+        symmetry=None,
+    ):
+        """
+        build bondlist for one frame, including the bonds of boundary atoms.
+        It does not access blender data, thus it can run in threads.
 
-        Args:
-            eps (float): default 1e-6
+        Returns:
+            tuple: bondlists, peciesBondDatas, molPeciesDatas, peciesBondLists,
+            molDatas
         """
+        # build bondlist for unit cell
+        (
+            bondlists,
+            bonddatas,
+            peciesBondDatas,
+            molPeciesDatas,
+            peciesBondLists,
+            molDatas,
+        ) = self.build_bondlists(
+            species, positions, cell, pbc, setting, engine=engine, symmetry=symmetry
+        )
+        # build bondlist for boundary atoms
+        # for molecule with cell == [0, 0, 0], skip
+        if boundary_data is not None:
+            bondlists = self.build_bondlists_with_boundary(
+                boundary_data,
+                bondlists,
+                bonddatas,
+                peciesBondDatas,
+                molPeciesDatas,
+            )
+            bondlists = self.check_boundary(
+                bondlists, positions=scaled_positions, boundary=boundary
+            )
+        return bondlists, peciesBondDatas, molPeciesDatas, peciesBondLists, molDatas
+
+    def get_scaled_positions(self):
+        """scaled positions of all atoms"""
         from ase.geometry import complete_cell
 
-        arrays = self.batoms.arrays
-        positions = arrays["positions"]
+        positions = self.batoms.arrays["positions"]
         cell = self.batoms.cell
+        return np.linalg.solve(complete_cell(cell).T, positions.T).T
+
+    def check_boundary(self, bondlists, eps=1e-6, positions=None, boundary=None):
+        """check boundary for bond search 0
+
+        Args:
+            eps (float): default 1e-6
+            positions (array): scaled positions of the atoms,
+                default is read from the batoms.
+            boundary (array): default is read from the batoms.
+        """
         # get scaled positions
-        positions = np.linalg.solve(complete_cell(cell).T, positions.T).T
+        if positions is None:
+            positions = self.get_scaled_positions()
+        if boundary is None:
+            boundary = self.batoms.boundary.boundary
         npositions = positions[bondlists[:, 1]] + bondlists[:, 5:8]
-        boundary = self.batoms.boundary.boundary
         # boundary condition
         mask1 = np.where(
             (npositions[:, 0] > boundary[0][0] - eps)
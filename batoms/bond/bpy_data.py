@@ -96,6 +96,28 @@ class Bond(Base):
     label: StringProperty(name="label", default="batoms")
     show_search: BoolProperty(name="show_search", default=False)
     show_hydrogen_bond: BoolProperty(name="show_hydrogen_bond", default=False)
+    neighbor_engine: EnumProperty(
+        name="neighbor_engine",
+        description="Engine used to search the neighbor list",
+        items=(
+            ("pair", "Pair", "Build one KDTree for each species pair"),
+            ("vectorized", "Vectorized", "Search all species pairs at once"),
+            ("cell_list", "Cell list", "Periodic cell list without boundary atoms"),
+        ),
+        default="pair",
+    )
+    use_symmetry: BoolProperty(
+        name="use_symmetry",
+        description="Only search the bonds and polyhedra of the "
+        "symmetry-unique atoms, and copy them to the equivalent atoms",
+        default=False,
+    )
+    workers: IntProperty(
+        name="workers",
+        description="Number of threads used to search bonds of trajectory frames",
+        default=1,
+        min=1,
+    )
     ui_list_index: IntProperty(name="ui_list_index", default=0)
     # collection
     settings: CollectionProperty(name="bondsetting", type=BondSetting)
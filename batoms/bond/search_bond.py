@@ -1,8 +1,13 @@
 import bpy
 import numpy as np
 from batoms.base.object import ObjectGN
-from batoms.utils.butils import object_mode, compareNodeType, get_node_by_name
-from batoms.utils import number2String, string2Number
+from batoms.utils.butils import (
+    object_mode,
+    compareNodeType,
+    get_node_by_name,
+    set_mesh_positions,
+)
+from batoms.utils import string2Number, numbers2Strings, strings2Numbers
 import logging
 
 # logger = logging.getLogger('batoms')
@@ -312,22 +317,16 @@ class SearchBond(ObjectGN):
 
     def set_arrays(self, arrays):
         """ """
-        attributes = self.attributes
         # same length
-        dnvert = len(arrays["species_index"]) - len(attributes["species_index"])
-        if dnvert > 0:
-            self.add_vertices_bmesh(dnvert)
-            self.add_vertices_bmesh(dnvert, self.obj_o)
-        elif dnvert < 0:
-            self.delete_vertices_bmesh(range(-dnvert))
-            self.delete_vertices_bmesh(range(-dnvert), self.obj_o)
+        self.resize_vertices(len(arrays["species_index"]))
+        self.resize_vertices(len(arrays["species_index"]), self.obj_o)
         if len(self) == 0:
             self.update_mesh()
             return
         self.positions = arrays["positions"][0]
         self.offsets = arrays["offsets"][0]
         self.set_trajectory(arrays)
-        species_index = [string2Number(sp) for sp in arrays["species"]]
+        species_index = strings2Numbers(arrays["species"])
         self.set_attributes(
             {
                 "atoms_index": arrays["atoms_index"],
@@ -350,9 +349,7 @@ class SearchBond(ObjectGN):
         # radius
         radius = self.batoms.radius
         arrays.update({"radius": np.zeros(len(self))})
-        species = np.array(
-            [number2String(i) for i in arrays["species_index"]], dtype="U20"
-        )
+        species = numbers2Strings(arrays["species_index"])
         arrays["species"] = species
         for sp, value in radius.items():
             mask = np.where(arrays["species"] == sp)
@@ -414,8 +411,7 @@ class SearchBond(ObjectGN):
         if self.obj_o.data.shape_keys is None and len(self) > 0:
             base_name = "Basis_%s" % self.obj_o.name
             self.obj_o.shape_key_add(name=base_name)
-        self.obj_o.data.shape_keys.key_blocks[0].data.foreach_set("co", offsets)
-        self.obj_o.data.update()
+        set_mesh_positions(self.obj_o, offsets)
         self.update_mesh(self.obj_o)
 
     @property
@@ -9,7 +9,7 @@ import bpy
 import numpy as np
 from ase.geometry import complete_cell
 from batoms.base.object import ObjectGN
-from batoms.utils import number2String, string2Number
+from batoms.utils import string2Number, numbers2Strings, strings2Numbers
 from batoms.utils.butils import compareNodeType
 import logging
 
@@ -388,37 +388,28 @@ class Boundary(ObjectGN):
 
     def update(self):
         """Main function to update boundary
-        1) for each frame, search the boundary list
+        1) search the boundary list of all frames in one pass
         2) mearch all boundary list, and find the unique boundary list
         3) calculate all boundary data
         """
         # object_mode()
         # clean_coll_objects(self.coll, 'bond')
+        if self.batoms.defer_update("boundary"):
+            return
         self.hide = False
         if not self.active:
             self.set_arrays(default_boundary_datas)
             return
-        positions = self.batoms.positions
+        # use local positions for boundary search
         trajectory = self.batoms.get_trajectory()["positions"]
-        images = self.batoms.as_ase()
-        nframe = self.batoms.nframe
-        if nframe == 0:
-            images = [images]
-            trajectory = np.array([positions])
-            nframe = 1
+        if len(trajectory) == 0:
+            trajectory = np.array([self.batoms.positions])
         tstart = time()
-        for f in range(nframe):
-            # print('update boundary: ', f)
-            # print(images[f].positions)
-            # use local positions for boundary search
-            boundary_list = search_boundary(images[f], self.boundary)
-            if f == 0:
-                boundary_lists = boundary_list
-            else:
-                boundary_lists = np.append(boundary_lists, boundary_list, axis=0)
-        boundary_lists = np.unique(boundary_lists, axis=0)
+        boundary_lists = search_boundary_frames(
+            trajectory, self.batoms.cell, self.boundary
+        )
         boundary_datas = self.calc_boundary_data(
-            boundary_lists, images[0].arrays, trajectory, self.batoms.cell
+            boundary_lists, self.batoms.arrays, trajectory, self.batoms.cell
         )
         # update unit cell
 
@@ -516,19 +507,14 @@ class Boundary(ObjectGN):
 
     def set_arrays(self, arrays):
         """ """
-        attributes = self.attributes
         # same length
-        dnvert = len(arrays["species_index"]) - len(attributes["species_index"])
-        if dnvert > 0:
-            self.add_vertices_bmesh(dnvert)
-        elif dnvert < 0:
-            self.delete_vertices_bmesh(range(-dnvert))
+        self.resize_vertices(len(arrays["species_index"]))
         if len(arrays["positions"]) == 0:
             return
         self.positions = arrays["positions"][0]
         self.set_trajectory(arrays)
         self.update_mesh()
-        species_index = [string2Number(sp) for sp in arrays["species"]]
+        species_index = strings2Numbers(arrays["species"])
         self.set_attributes(
             {
                 "atoms_index": arrays["atoms_index"],
@@ -551,9 +537,7 @@ class Boundary(ObjectGN):
         # radius
         radius = self.batoms.radius
         arrays.update({"radius": np.zeros(len(self))})
-        species = np.array(
-            [number2String(i) for i in arrays["species_index"]], dtype="U20"
-        )
+        species = numbers2Strings(arrays["species_index"])
         arrays["species"] = species
         for sp, value in radius.items():
             mask = np.where(arrays["species"] == sp)
@@ -664,67 +648,128 @@ class Boundary(ObjectGN):
         return data
 
 
+def boundary_ranges(scaled, boundary):
+    """Range of the offsets of the atoms in the boundary.
+
+    For each atom and each axis, the integer offsets m with
+    boundary[0] < x + m < boundary[1], clipped to the supercell which
+    covers the boundary.
+
+    Args:
+        scaled (array): (n, 3) scaled positions
+        boundary (array): (3, 2) boundary
+
+    Returns:
+        mmin (array): (n, 3) minimum offsets
+        counts (array): (n, 3) number of offsets
+    """
+    ib = np.array([np.floor(boundary[:, 0]), np.ceil(boundary[:, 1])]).astype(int)
+    mmin = np.maximum(np.floor(boundary[:, 0] - scaled).astype(int) + 1, ib[0])
+    mmax = np.minimum(np.ceil(boundary[:, 1] - scaled).astype(int) - 1, ib[1])
+    counts = np.maximum(mmax - mmin + 1, 0)
+    return mmin, counts
+
+
+def boundary_offsets(scaled, boundary):
+    """(index, m0, m1, m2) of the atoms in the boundary, the offsets
+    (0, 0, 0) are excluded, see boundary_ranges."""
+    mmin, counts = boundary_ranges(scaled, boundary)
+    total = np.prod(counts, axis=1)
+    indices = np.repeat(np.arange(len(scaled)), total)
+    # index of the offset in the range of each atom
+    k = np.arange(len(indices)) - np.repeat(np.cumsum(total) - total, total)
+    counts = counts[indices]
+    offsets = np.empty((len(indices), 4), dtype=int)
+    offsets[:, 0] = indices
+    offsets[:, 1] = mmin[indices, 0] + k // (counts[:, 1] * counts[:, 2])
+    offsets[:, 2] = mmin[indices, 1] + k // counts[:, 2] % counts[:, 1]
+    offsets[:, 3] = mmin[indices, 2] + k % counts[:, 2]
+    # remove the atoms in the original cell
+    return offsets[np.any(offsets[:, 1:] != 0, axis=1)]
+
+
+def get_boundary(boundary):
+    """boundary as a (3, 2) array"""
+    if isinstance(boundary, float):
+        boundary = [
+            [-boundary, 1 + boundary],
+            [-boundary, 1 + boundary],
+            [-boundary, 1 + boundary],
+        ]
+    return np.array(boundary)
+
+
 def search_boundary(
     atoms,
     boundary=[[0, 1], [0, 1], [0, 1]],
 ):
     """Search atoms in the boundary
 
+    For each atom and each axis, the range of the integer offsets m with
+    boundary[0] < x + m < boundary[1] is calculated from its scaled
+    position x, and only the valid (index, offset) pairs are generated.
+
     Args:
         atoms: _description_
         boundary (list, optional): _description_.
             Defaults to [[0, 1], [0, 1], [0, 1]].
 
     Returns:
-        _type_: _description_
+        array: (index, m0, m1, m2) of the atoms in the boundary, sorted by
+        the offsets.
     """
     # tstart = time()
-    cell = atoms.cell
-    positions = atoms.positions
-    species = atoms.arrays["species"]
-    if isinstance(boundary, float):
-        boundary = [
-            [-boundary, 1 + boundary],
-            [-boundary, 1 + boundary],
-            [-boundary, 1 + boundary],
-        ]
-    boundary = np.array(boundary)
-    # find supercell
-    f = np.floor(boundary)
-    c = np.ceil(boundary)
-    ib = np.array([f[:, 0], c[:, 1]]).astype(int)
-    M = np.product(ib[1] - ib[0] + 1)
+    boundary = get_boundary(boundary)
     # get scaled positions
-    positions = np.linalg.solve(complete_cell(cell).T, positions.T).T
-    n = len(positions)
-    npositions = np.tile(positions, (M - 1,) + (1,) * (len(positions.shape) - 1))
-    i0 = 0
-    # index
-    offsets = np.zeros((M * n, 4), dtype=int)
-    ind0 = np.arange(n).reshape(-1, 1)
-    species0 = species
-    species = []
-    # repeat the positions so that
-    # it completely covers the boundary
-    for m0 in range(ib[0, 0], ib[1, 0] + 1):
-        for m1 in range(ib[0, 1], ib[1, 1] + 1):
-            for m2 in range(ib[0, 2], ib[1, 2] + 1):
-                if m0 == 0 and m1 == 0 and m2 == 0:
-                    continue
-                i1 = i0 + n
-                npositions[i0:i1] += (m0, m1, m2)
-                offsets[i0:i1] = np.append(ind0, np.array([[m0, m1, m2]] * n), axis=1)
-                species.extend(species0)
-                i0 = i1
-    # boundary condition
-    ind1 = np.where(
-        (npositions[:, 0] > boundary[0][0])
-        & (npositions[:, 0] < boundary[0][1])  # noqa: W503
-        & (npositions[:, 1] > boundary[1][0])  # noqa: W503
-        & (npositions[:, 1] < boundary[1][1])  # noqa: W503
-        & (npositions[:, 2] > boundary[2][0])  # noqa: W503
-        & (npositions[:, 2] < boundary[2][1])  # noqa: W503
-    )[0]
-    offsets_b = offsets[ind1]
+    positions = np.linalg.solve(complete_cell(atoms.cell).T, atoms.positions.T).T
+    offsets = boundary_offsets(positions, boundary)
+    order = np.lexsort((offsets[:, 0], offsets[:, 3], offsets[:, 2], offsets[:, 1]))
+    offsets_b = offsets[order]
     # print('search boundary: {0:10.2f} s'.format(time() - tstart))
     return offsets_b
+
+
+def search_boundary_frames(
+    trajectory, cell, boundary=[[0, 1], [0, 1], [0, 1]], max_size=1e6
+):
+    """Search atoms in the boundary for all frames.
+
+    The (index, offset) of all frames are merged by int64 keys.
+
+    Args:
+        trajectory (array): (nframe, n, 3) positions
+        cell (array): 3x3 cell
+        boundary (list, optional): Defaults to [[0, 1], [0, 1], [0, 1]].
+        max_size (int): maximum number of atoms of the frames in a chunk
+
+    Returns:
+        array: (index, m0, m1, m2) of the atoms in the boundary of any
+        frame, sorted by index and offsets as np.unique(axis=0).
+    """
+    boundary = get_boundary(boundary)
+    trajectory = np.asarray(trajectory)
+    nframe, n = trajectory.shape[:2]
+    ib = np.array([np.floor(boundary[:, 0]), np.ceil(boundary[:, 1])]).astype(int)
+    widths = ib[1] - ib[0] + 1
+    # scaled positions of all frames
+    scaled = np.linalg.solve(
+        complete_cell(np.array(cell)).T, trajectory.reshape(-1, 3).T
+    ).T
+    chunk = max(1, int(max_size // max(n, 1))) * n
+    keys = np.zeros(0, dtype=np.int64)
+    for start in range(0, len(scaled), chunk):
+        offsets = boundary_offsets(scaled[start : start + chunk], boundary)
+        # encode (index, m0, m1, m2) to one key
+        m = offsets[:, 1:] - ib[0]
+        key = (offsets[:, 0] + start) % n
+        key = ((key * widths[0] + m[:, 0]) * widths[1] + m[:, 1]) * widths[2] + m[:, 2]
+        keys = np.union1d(keys, key.astype(np.int64))
+    # decode
+    offsets = np.empty((len(keys), 4), dtype=int)
+    offsets[:, 3] = keys % widths[2] + ib[0, 2]
+    keys = keys // widths[2]
+    offsets[:, 2] = keys % widths[1] + ib[0, 1]
+    keys = keys // widths[1]
+    offsets[:, 1] = keys % widths[0] + ib[0, 0]
+    offsets[:, 0] = keys // widths[0]
+    return offsets
@@ -5,6 +5,7 @@
 """
 import bpy
 from batoms.base.collection import Setting
+from batoms.base.object import invalidate_attribute_cache
 import numpy as np
 from batoms.utils import string2Number
 
@@ -128,6 +129,72 @@ class Select:
         mask = np.where(mask == string2Number(self.name))[0]
         return mask
 
+    @property
+    def attribute_name(self):
+        """Name of the INT attribute of the atoms in the select. It starts
+        with ".", thus it is not in the arrays of the batoms."""
+        return ".bselect_%s" % self.name
+
+    @property
+    def membership(self):
+        return self.get_membership()
+
+    @membership.setter
+    def membership(self, membership):
+        self.set_membership(membership)
+
+    def get_membership(self):
+        """Boolean array, True for the atoms in the select."""
+        if self.attribute_name in self.batoms.obj.data.attributes:
+            return self.batoms.get_attribute(self.attribute_name).astype(bool)
+        # select saved in a vertex group, e.g. by an old version
+        membership = self.get_vertex_group_membership()
+        if membership.any():
+            self.batoms.set_attributes({self.attribute_name: membership.astype(int)})
+        return membership
+
+    def set_membership(self, membership):
+        membership = np.asarray(membership, dtype=bool)
+        self.batoms.set_attributes({self.attribute_name: membership.astype(int)})
+        if self.vertex_group:
+            self.sync_vertex_group(membership)
+
+    def get_vertex_group_membership(self):
+        """Read the atoms in the vertex group of the select."""
+        obj = self.batoms.obj
+        membership = np.zeros(len(obj.data.vertices), dtype=bool)
+        vg = obj.vertex_groups.get(self.name)
+        if vg is None:
+            return membership
+        vg_idx = vg.index
+        for v in obj.data.vertices:
+            if vg_idx in [g.group for g in v.groups]:
+                membership[v.index] = True
+        return membership
+
+    @property
+    def vertex_group(self):
+        return self.get_vertex_group()
+
+    @vertex_group.setter
+    def vertex_group(self, state):
+        self.set_vertex_group(state)
+
+    def get_vertex_group(self):
+        setting = self.parent.find(self.name)
+        return setting is not None and setting.vertex_group
+
+    def set_vertex_group(self, state):
+        """Mirror the select to a vertex group, e.g. to edit it in the UI."""
+        self.parent.bpy_setting[self.name].vertex_group = state
+        if state:
+            self.sync_vertex_group(self.membership)
+
+    def sync_vertex_group(self, membership):
+        vg = self.vg
+        vg.remove(list(range(len(membership))))
+        vg.add(np.where(membership)[0].tolist(), 1.0, "REPLACE")
+
     @property
     def vg(self):
         vg = self.batoms.obj.vertex_groups.get(self.name)
@@ -144,24 +211,47 @@ class Select:
         self.set_indices(indices)
 
     def get_indices(self):
-        vg_idx = self.vg.index
-        obj = self.batoms.obj
-        indices = [
-            v.index
-            for v in obj.data.vertices
-            if vg_idx in [vg.group for vg in v.groups]
-        ]
-        return indices
+        return np.where(self.membership)[0]
 
     def set_indices(self, indices):
-        if isinstance(indices, np.ndarray):
-            indices = indices.tolist()
-        self.vg.add(indices, 1.0, "ADD")
-        select = self.batoms.attributes["select"]
-        select[self.indices] = string2Number("all")
+        """Add the atoms to the select."""
+        indices = np.asarray(indices)
+        if indices.dtype == bool:
+            indices = np.where(indices)[0]
+        indices = indices.astype(int)
+        membership = self.membership
+        select = self.batoms.get_attribute("select")
+        select[membership] = string2Number("all")
+        membership[indices] = True
         select[indices] = string2Number(self.name)
-        select = {"select": select}
-        self.batoms.set_attributes(select)
+        self.batoms.set_attributes({"select": select})
+        self.set_membership(membership)
+
+    def to_membership(self, other):
+        """Boolean array of a Select, a boolean array or indices."""
+        if isinstance(other, Select):
+            return other.membership
+        other = np.asarray(other)
+        if other.dtype == bool:
+            return other
+        membership = np.zeros(len(self.batoms), dtype=bool)
+        membership[other.astype(int)] = True
+        return membership
+
+    def __and__(self, other):
+        return self.membership & self.to_membership(other)
+
+    def __or__(self, other):
+        return self.membership | self.to_membership(other)
+
+    def __xor__(self, other):
+        return self.membership ^ self.to_membership(other)
+
+    def __sub__(self, other):
+        return self.membership & ~self.to_membership(other)
+
+    def __invert__(self):
+        return ~self.membership
 
     @property
     def scale(self):
@@ -183,7 +273,7 @@ class Select:
         if isinstance(scale, dict):
             species = self.batoms.attributes["species"]
             for key, value in scale.items():
-                scale0[np.where((species == key) & self.mask)] = value
+                scale0[np.where((species == key) & self.membership)] = value
             scale = scale0
         self.batoms.set_attributes({"scale": scale0})
 
@@ -319,6 +409,45 @@ class Selects(Setting):
             i += 1
         return s
 
+    def evaluate(self, expre, frames=None):
+        """Evaluate the expression for the frames of the trajectory.
+
+        The parts of the expression which do not depend on the positions
+        are evaluated once, see batoms.selection.
+
+        Args:
+            expre (str): selection expression
+            frames (list): indices of the frames, default all frames
+
+        Returns:
+            np.ndarray: (nframe, natom) boolean masks
+        """
+        from batoms.selection import evaluate_trajectory
+
+        trajectory = self.batoms.get_trajectory()["positions"]
+        if len(trajectory) == 0:
+            trajectory = np.array([self.batoms.positions])
+        if frames is not None:
+            trajectory = trajectory[frames]
+        return evaluate_trajectory(
+            expre,
+            self.batoms.arrays,
+            trajectory,
+            named=get_named_selections(self.batoms),
+        )
+
+    def remove(self, name):
+        """Remove the select, its attribute and vertex group."""
+        obj = self.batoms.obj
+        att = obj.data.attributes.get(".bselect_%s" % name)
+        if att is not None:
+            obj.data.attributes.remove(att)
+            invalidate_attribute_cache(obj.data, [".bselect_%s" % name])
+        vg = obj.vertex_groups.get(name)
+        if vg is not None:
+            obj.vertex_groups.remove(vg)
+        Setting.remove(self, name)
+
     def add(self, name, expre=None):
         if expre is not None:
             indices = elect_expression(expre, self.batoms)
@@ -356,48 +485,37 @@ class Selects(Setting):
 
 
 def elect_expression(expre, batoms):
-    """
-        select expression
-    all
-    none
+    """Indices of the atoms selected by the expression.
 
-    Logical
-    not Sele
-    sele1 and sele2
+    The expression is compiled to numpy masks over the arrays of the
+    batoms, see batoms.selection for the grammar, e.g.
 
-    Properties
-    element O
+    >>> elect_expression("within 5 of (species Fe) and not hetatm", batoms)
 
-    Coordinates
-    z<5
+    Besides the arrays, the named selections "sheet", "helix" (from the
+    ribbon) and "select" (the selects of the batoms) can be used, e.g.
+    "sheet A or select s1".
 
-    Chemcial classses
+    Args:
+        expre (str, list, np.ndarray): expression, or indices
+        batoms (Batoms): the batoms
 
-    solvent: water
-    hydrogens:
-    metals
+    Returns:
+        np.ndarray: indices
     """
-    indices = None
-    if isinstance(expre, (list, np.ndarray)):
+    from batoms.selection import evaluate
+
+    if expre is None or isinstance(expre, (list, np.ndarray)):
         return expre
-    if isinstance(expre, str):
-        if "chain" in expre:
-            chainid = expre.split()[1]
-            logger.debug("chain %s" % chainid)
-            indices = np.where(batoms.attributes["chainids"] == chainid)[0]
-        if "sheet" in expre:
-            sheet = expre.split()[1]
-            logger.debug("sheet %s" % sheet)
-            indices = batoms.ribbon.protein.sheets[sheet].indices
-        if "helix" in expre:
-            helix = expre.split()[1]
-            logger.debug("helix %s" % helix)
-            indices = batoms.ribbon.protein.helixs[helix].indices
-        if "hetatm" in expre:
-            logger.debug("hetatm")
-            indices = np.where(batoms.attributes["types"] == "HETATM")[0]
-        if "species" in expre:
-            species = expre.split()[1]
-            logger.debug("species %s" % species)
-            indices = np.where(batoms.attributes["species"] == species)[0]
-    return indices
+    mask = evaluate(expre, batoms.arrays, named=get_named_selections(batoms))
+    logger.debug("select %s: %s atoms" % (expre, mask.sum()))
+    return np.where(mask)[0]
+
+
+def get_named_selections(batoms):
+    """Functions of the named selections used in the expressions."""
+    return {
+        "sheet": lambda name: batoms.ribbon.protein.sheets[name].indices,
+        "helix": lambda name: batoms.ribbon.protein.helixs[name].indices,
+        "select": lambda name: batoms.selects[name].indices,
+    }
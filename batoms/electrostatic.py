@@ -0,0 +1,322 @@
+"""
+Electrostatic potential of point charges evaluated on a set of points.
+
+Three evaluators are provided:
+
+- direct: exact sum, the points are processed in chunks so that the memory
+  is bounded by max_size elements.
+- tree: Barnes-Hut approximation, the charges are grouped in an octree, and a
+  node far enough from a point is replaced by its monopole and dipole.
+- ewald: Ewald summation for periodic cells.
+"""
+import numpy as np
+from time import time
+import logging
+
+# logger = logging.getLogger('batoms')
+logger = logging.getLogger(__name__)
+
+eps = 8.854e-12  # Permittivity of free space (F.m-1)
+coulomb_constant = 1 / 4 / np.pi / eps
+
+
+def get_chunk_size(natom, max_size):
+    """Number of points per chunk, so that a (chunk, natom) array has at most
+    max_size elements."""
+    return max(1, int(max_size // max(natom, 1)))
+
+
+def potential_direct(positions, charges, points, max_size=1e7, dtype=np.float64):
+    """Exact potential, sum over all charges.
+
+    Args:
+        positions (array): (n, 3) positions of the charges
+        charges (array): (n,) charges
+        points (array): (m, 3) points
+        max_size (int): maximum number of elements of the temporary
+            (chunk, n) arrays
+        dtype: float type of the temporary arrays, np.float32 halves
+            the memory and is accurate enough for coloring
+
+    Returns:
+        array: (m,) potentials at given points
+    """
+    positions = np.asarray(positions, dtype=dtype)
+    charges = np.asarray(charges, dtype=dtype)
+    points = np.asarray(points, dtype=dtype)
+    potentials = np.zeros(len(points))
+    chunk = get_chunk_size(len(positions), max_size)
+    for start in range(0, len(points), chunk):
+        p = points[start : start + chunk]
+        d2 = np.zeros((len(p), len(positions)), dtype=dtype)
+        for c in range(3):
+            d2 += (p[:, c, None] - positions[None, :, c]) ** 2
+        potentials[start : start + chunk] = (1 / np.sqrt(d2)) @ charges
+    return potentials
+
+
+def build_octree(positions, charges, leaf_size=16):
+    """Build an octree of the charges.
+
+    The nodes are stored in breadth-first order, so that the children of a
+    node are contiguous. The atoms of a node are the contiguous range
+    [start, end) of the returned order.
+
+    Returns:
+        dict: order of the atoms, and the arrays of the nodes: start, end,
+            child (index of the first child), nchild, center, radius,
+            monopole and dipole.
+    """
+    n = len(positions)
+    order = np.arange(n)
+    nodes = {"start": [0], "end": [n], "child": [0], "nchild": [0]}
+    i = 0
+    while i < len(nodes["start"]):
+        start, end = nodes["start"][i], nodes["end"][i]
+        nodes["child"][i] = len(nodes["start"])
+        if end - start > leaf_size:
+            p = positions[order[start:end]]
+            pmin, pmax = p.min(axis=0), p.max(axis=0)
+            if (pmax - pmin).max() > 1e-8:
+                center = (pmin + pmax) / 2
+                octant = (p > center) @ np.array([1, 2, 4])
+                sort = np.argsort(octant, kind="stable")
+                order[start:end] = order[start:end][sort]
+                bounds = np.searchsorted(octant[sort], np.arange(9)) + start
+                for k in range(8):
+                    if bounds[k + 1] > bounds[k]:
+                        nodes["start"].append(bounds[k])
+                        nodes["end"].append(bounds[k + 1])
+                        nodes["child"].append(0)
+                        nodes["nchild"].append(0)
+                        nodes["nchild"][i] += 1
+        i += 1
+    tree = {key: np.array(value) for key, value in nodes.items()}
+    tree["order"] = order
+    # multipoles of the nodes
+    nnode = len(tree["start"])
+    p = positions[order]
+    q = charges[order]
+    counts = tree["end"] - tree["start"]
+    node_index = np.repeat(np.arange(nnode), counts)
+    atom_index = np.arange(counts.sum()) - np.repeat(
+        np.cumsum(counts) - counts - tree["start"], counts
+    )
+    center = np.zeros((nnode, 3))
+    for c in range(3):
+        center[:, c] = np.bincount(node_index, p[atom_index, c], nnode) / counts
+    vec = p[atom_index] - center[node_index]
+    radius = np.zeros(nnode)
+    np.maximum.at(radius, node_index, np.linalg.norm(vec, axis=1))
+    dipole = np.zeros((nnode, 3))
+    for c in range(3):
+        dipole[:, c] = np.bincount(node_index, q[atom_index] * vec[:, c], nnode)
+    tree["center"] = center
+    tree["radius"] = radius
+    tree["monopole"] = np.bincount(node_index, q[atom_index], nnode)
+    tree["dipole"] = dipole
+    return tree
+
+
+def potential_tree(
+    positions, charges, points, tolerance=0.3, leaf_size=16, chunk_size=4096
+):
+    """Barnes-Hut approximation of the potential.
+
+    A node is replaced by its monopole and dipole when
+    radius / distance < tolerance, the error decreases with tolerance**2,
+    and tolerance = 0 gives the exact sum. With the default tolerance of
+    0.3, the rms error is below 2% of the rms potential, and the maximum
+    error below 2% of the maximum potential.
+
+    Args:
+        positions (array): (n, 3) positions of the charges
+        charges (array): (n,) charges
+        points (array): (m, 3) points
+        tolerance (float): opening criterion of the nodes
+        leaf_size (int): maximum number of atoms in a leaf node
+        chunk_size (int): number of points traversing the tree together
+
+    Returns:
+        array: (m,) potentials at given points
+    """
+    positions = np.asarray(positions, dtype=float)
+    charges = np.asarray(charges, dtype=float)
+    points = np.asarray(points, dtype=float)
+    tree = build_octree(positions, charges, leaf_size=leaf_size)
+    p_sorted = positions[tree["order"]]
+    q_sorted = charges[tree["order"]]
+    potentials = np.zeros(len(points))
+    for offset in range(0, len(points), chunk_size):
+        chunk = points[offset : offset + chunk_size]
+        m = len(chunk)
+        # (point, node) pairs to visit, start from the root
+        ipoint = np.arange(m)
+        inode = np.zeros(m, dtype=int)
+        while len(ipoint) > 0:
+            vec = chunk[ipoint] - tree["center"][inode]
+            dis = np.linalg.norm(vec, axis=1)
+            far = tree["radius"][inode] < tolerance * dis
+            # far field, monopole and dipole
+            i, n, v, d = ipoint[far], inode[far], vec[far], dis[far]
+            phi = (
+                tree["monopole"][n] / d
+                + np.einsum("ij,ij->i", tree["dipole"][n], v) / d**3  # noqa: W503
+            )
+            potentials[offset : offset + m] += np.bincount(i, phi, m)
+            near = ~far
+            ipoint, inode = ipoint[near], inode[near]
+            leaf = tree["nchild"][inode] == 0
+            # near field leaf, direct sum over the atoms
+            i, n = ipoint[leaf], inode[leaf]
+            counts = tree["end"][n] - tree["start"][n]
+            i = np.repeat(i, counts)
+            atoms = np.arange(counts.sum()) - np.repeat(
+                np.cumsum(counts) - counts - tree["start"][n], counts
+            )
+            d = np.linalg.norm(chunk[i] - p_sorted[atoms], axis=1)
+            potentials[offset : offset + m] += np.bincount(i, q_sorted[atoms] / d, m)
+            # near field node, visit the children
+            ipoint, inode = ipoint[~leaf], inode[~leaf]
+            counts = tree["nchild"][inode]
+            ipoint = np.repeat(ipoint, counts)
+            inode = np.arange(counts.sum()) - np.repeat(
+                np.cumsum(counts) - counts - tree["child"][inode], counts
+            )
+    return potentials
+
+
+def potential_ewald(
+    positions, charges, points, cell, accuracy=1e-5, cutoff=None, max_size=1e7
+):
+    """Ewald summation of the potential of a periodic cell.
+
+    The potential is split into a short range part summed in real space
+    within cutoff, and a long range part summed in reciprocal space. A
+    uniform background charge neutralizes the cell.
+
+    Args:
+        positions (array): (n, 3) positions of the charges
+        charges (array): (n,) charges
+        points (array): (m, 3) points
+        cell (array): (3, 3) cell
+        accuracy (float): relative accuracy of the truncated sums
+        cutoff (float): real space cutoff, default is half of the
+            smallest cell width, and at most 10
+        max_size (int): maximum number of elements of the temporary arrays
+
+    Returns:
+        array: (m,) potentials at given points
+    """
+    from scipy.spatial import cKDTree
+    from scipy.special import erfc
+
+    positions = np.asarray(positions, dtype=float)
+    charges = np.asarray(charges, dtype=float)
+    points = np.asarray(points, dtype=float)
+    cell = np.asarray(cell, dtype=float)
+    volume = abs(np.linalg.det(cell))
+    reciprocal = 2 * np.pi * np.linalg.inv(cell).T
+    widths = 2 * np.pi / np.linalg.norm(reciprocal, axis=1)
+    if cutoff is None:
+        cutoff = min(widths.min() / 2, 10.0)
+    s = np.sqrt(-np.log(accuracy))
+    alpha = s / cutoff
+    kcut = 2 * alpha * s
+    potentials = np.zeros(len(points))
+    # the potential is periodic, wrap the charges and points into the cell
+    inv = np.linalg.inv(cell)
+    positions = (positions @ inv % 1) @ cell
+    points = (points @ inv % 1) @ cell
+    # real space, images of the charges within cutoff of the cell
+    nrep = np.ceil(cutoff / widths).astype(int) + 1
+    grid = np.mgrid[
+        -nrep[0] : nrep[0] + 1, -nrep[1] : nrep[1] + 1, -nrep[2] : nrep[2] + 1
+    ]
+    offsets = grid.reshape(3, -1).T @ cell
+    images = (positions[None, :, :] + offsets[:, None, :]).reshape(-1, 3)
+    image_charges = np.tile(charges, len(offsets))
+    tree = cKDTree(images)
+    chunk = get_chunk_size(len(positions), max_size)
+    for start in range(0, len(points), chunk):
+        p = points[start : start + chunk]
+        dis = cKDTree(p).sparse_distance_matrix(tree, cutoff, output_type="coo_matrix")
+        mask = dis.data > 0
+        row, col, d = dis.row[mask], dis.col[mask], dis.data[mask]
+        phi = image_charges[col] * erfc(alpha * d) / d
+        potentials[start : start + chunk] += np.bincount(row, phi, len(p))
+    # reciprocal space
+    kmax = np.ceil(kcut / np.linalg.norm(reciprocal, axis=1)).astype(int)
+    grid = np.mgrid[
+        -kmax[0] : kmax[0] + 1, -kmax[1] : kmax[1] + 1, -kmax[2] : kmax[2] + 1
+    ]
+    kvecs = grid.reshape(3, -1).T @ reciprocal
+    k2 = np.sum(kvecs**2, axis=1)
+    mask = (k2 > 0) & (k2 <= kcut**2)
+    kvecs, k2 = kvecs[mask], k2[mask]
+    weights = 4 * np.pi / volume * np.exp(-k2 / 4 / alpha**2) / k2
+    # structure factor
+    structure = np.exp(-1j * positions @ kvecs.T).T @ charges
+    chunk = get_chunk_size(len(kvecs), max_size)
+    for start in range(0, len(points), chunk):
+        p = points[start : start + chunk]
+        phase = np.exp(1j * p @ kvecs.T)
+        potentials[start : start + chunk] += np.real(phase @ (weights * structure))
+    # neutralizing background
+    potentials -= np.pi * charges.sum() / volume / alpha**2
+    return potentials
+
+
+def calc_electrostatic_potential(
+    positions,
+    charges,
+    points,
+    method="auto",
+    cell=None,
+    tolerance=0.3,
+    accuracy=1e-5,
+    max_size=1e7,
+    dtype=np.float64,
+):
+    """Calc electrostatic potential on given points based on partial charges.
+
+    Args:
+        positions (array): (n, 3) positions of the charges
+        charges (array): (n,) charges
+        points (array): (m, 3) points
+        method (str): "direct", "tree", "ewald" or "auto". "auto" uses
+            the direct sum for small systems and the tree otherwise.
+        cell (array): cell, only used by the ewald method
+        tolerance (float): opening criterion of the tree method, the
+            default keeps the rms error below 2%
+        accuracy (float): accuracy of the ewald method
+        max_size (int): maximum number of elements of the temporary arrays
+        dtype: float type of the direct method
+
+    Returns:
+        array: (m,) potentials at given points
+    """
+    tstart = time()
+    points = np.asarray(points).reshape(-1, 3)
+    method = method.lower()
+    if method == "auto":
+        if len(positions) > 1000 and len(positions) * len(points) > max_size:
+            method = "tree"
+        else:
+            method = "direct"
+    if method == "direct":
+        potentials = potential_direct(
+            positions, charges, points, max_size=max_size, dtype=dtype
+        )
+    elif method == "tree":
+        potentials = potential_tree(positions, charges, points, tolerance=tolerance)
+    elif method == "ewald":
+        potentials = potential_ewald(
+            positions, charges, points, cell, accuracy=accuracy, max_size=max_size
+        )
+    else:
+        raise ValueError("Method %s is not supported." % method)
+    logger.debug(
+        "Electrostatic potential ({}): {:1.3f}".format(method, time() - tstart)
+    )
+    return coulomb_constant * potentials
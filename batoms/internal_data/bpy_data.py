@@ -325,6 +325,11 @@ class Bselect(bpy.types.PropertyGroup):
         ),
         default="0",
     )
+    vertex_group: BoolProperty(
+        name="vertex_group",
+        description="Mirror the select to a vertex group",
+        default=False,
+    )
     bspecies: CollectionProperty(name="Bspecies", type=Bspecies)
 
     def __repr__(self) -> str:
@@ -416,6 +421,15 @@ class BatomsCollection(bpy.types.PropertyGroup):
     boundary: PointerProperty(name="Bboundary", type=Bboundary)
     cell: PointerProperty(name="Bcell", type=Bcell)
     crystal_view: BoolProperty(name="crystal_view", default=False)
+    trajectory_backend: EnumProperty(
+        name="trajectory_backend",
+        description="Storage of the trajectory",
+        items=(
+            ("shape_key", "Shape key", "One shape key for each frame"),
+            ("memmap", "Memmap", "Frames saved in a .npy file next to the .blend"),
+        ),
+        default="shape_key",
+    )
     ui_list_index_species: IntProperty(name="ui_list_index_species", default=0)
     ui_list_index_select: IntProperty(name="ui_list_index_select", default=0)
     ui_list_index_volumetric_data: IntProperty(
@@ -454,6 +468,11 @@ class BatomsObject(bpy.types.PropertyGroup):
     atom: PointerProperty(name="Batom", type=Batom)
     cell: PointerProperty(name="Bcell", type=Bcell)
     volume: PointerProperty(name="Bvolumetric_data", type=Bvolumetric_data)
+    # trajectory saved in a .npy file, see ObjectGN.set_trajectory_file
+    trajectory_file: StringProperty(name="trajectory_file", default="")
+    # unique id of the object in the name of the trajectory file
+    trajectory_uuid: StringProperty(name="trajectory_uuid", default="")
+    trajectory_frame_start: IntProperty(name="trajectory_frame_start", default=0)
 
     # collection
     settings_attribute: CollectionProperty(name="settings_attribute", type=Battribute)
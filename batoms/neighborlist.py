@@ -21,7 +21,16 @@ def RemovePbc(species0, positions0, cell, pbc, cutoffs):
 
 
 def bondlist_kdtree(
-    quantities, species0, positions0, cell, pbc, setting, self_interaction=False
+    quantities,
+    species0,
+    positions0,
+    cell,
+    pbc,
+    setting,
+    self_interaction=False,
+    engine="pair",
+    centers=None,
+    bothways=False,
 ):
     """
     return
@@ -29,60 +38,84 @@ def bondlist_kdtree(
     i: index1
     j: index2
     k: search bond style
+
+    centers: array
+        indices of the atoms to search the bonds from, default is all atoms.
+    bothways: bool
+        keep both (i, j) and (j, i) for the same species, e.g. ('C', 'C').
+
+    engine: str
+        "pair": build one KDTree for each species pair.
+        "vectorized": search all pairs at once, and filter them
+        by the cutoffs of the species pairs, see
+        primitive_neighbor_kdtree_vectorized.
+        "cell_list": periodic cell list, no boundary atoms are added,
+        see primitive_neighbor_cell_list.
+        All engines keep the bonds between an atom and its own periodic
+        images, and return the same bonds, except that "pair" and
+        "vectorized" only search the nearest images (offsets -1, 0, 1),
+        while "cell_list" also finds the farther images when the cutoff
+        is longer than the thickness of the cell.
     """
     cutoffs = {}
     for pair, b in setting.items():
         cutoffs[pair] = [b["min"], b["max"]]
+    if engine == "cell_list":
+        return bondlist_cell_list(
+            quantities,
+            species0,
+            positions0,
+            cell,
+            pbc,
+            setting,
+            self_interaction,
+            centers=centers,
+            bothways=bothways,
+        )
     natom = len(positions0)
-    # orignal atoms
-    array1 = {
-        "positions": positions0,
-        "species": species0,
-        "indices": np.arange(natom),
-        "offsets": np.zeros((natom, 3)),
-    }
+    if centers is None:
+        centers = np.arange(natom)
     # atoms added with boundary
     array2 = RemovePbc(species0, positions0, cell, pbc, cutoffs)
-    bonddatas = primitive_neighbor_kdtree(array1, array2, cutoffs)
-    # build bondlist
-    i = []
-    j = []
-    k = []
-    p = []
-    t = []
-    for pair, data in bonddatas.items():
-        if len(data) == 0:
-            continue
-        i1 = []
-        j1 = []
-        for i2, j2 in data.items():
-            n = len(j2)
-            i1.extend([i2] * n)
-            j1.extend(j2)
+    # orignal atoms, wrapped into the cell as the first natom atoms of array2
+    array1 = {
+        "positions": array2["positions"][centers],
+        "species": species0[centers],
+        "indices": np.asarray(centers),
+        "offsets": array2["offsets"][centers],
+    }
+    if engine == "pair":
+        i, j, k, p, t = bondlist_from_bonddatas(
+            array1,
+            array2,
+            primitive_neighbor_kdtree(array1, array2, cutoffs),
+            setting,
+            bothways=bothways,
+        )
+    elif engine == "vectorized":
+        pairs = list(cutoffs.keys())
+        i, j, pair_index = primitive_neighbor_kdtree_vectorized(array1, array2, cutoffs)
         # remove bothways for same species, e.g. ('C', 'C')
-        if pair[0] == pair[1]:
-            i1 = np.array(i1)
-            j1 = np.array(j1)
-            # wrong, offset1 could be non zero
-            mask = np.where(
-                (array1["indices"][i1] > array2["indices"][j1]), False, True
-            )
-            i1 = i1[mask]
-            j1 = j1[mask]
-            i1 = list(i1)
-            j1 = list(j1)
-        n = len(i1)
-        k1 = [setting[pair]["search"]] * n
-        p1 = [setting[pair]["polyhedra"]] * n
-        t1 = [setting[pair]["type"]] * n
-        i.extend(i1)
-        j.extend(j1)
-        k.extend(k1)
-        p.extend(p1)
-        t.extend(t1)
-    # offsets
-    offsets_i = array1["offsets"][i]
-    offsets_j = array2["offsets"][j]
+        mask = np.where(
+            (array1["species"][i] == array2["species"][j])
+            & (array1["indices"][i] > array2["indices"][j])  # noqa: W503
+            & (not bothways),  # noqa: W503
+            False,
+            True,
+        )
+        i = i[mask]
+        j = j[mask]
+        pair_index = pair_index[mask]
+        k = np.array([setting[pair]["search"] for pair in pairs], dtype=int)
+        p = np.array([setting[pair]["polyhedra"] for pair in pairs], dtype=int)
+        t = np.array([setting[pair]["type"] for pair in pairs], dtype=int)
+        k = k[pair_index]
+        p = p[pair_index]
+        t = t[pair_index]
+    else:
+        raise ValueError("Unsupported neighbor engine: {}.".format(engine))
+    # offsets of atoms j relative to atoms i
+    offsets_j = array2["offsets"][j] - array1["offsets"][i]
     distance_vector = array1["positions"][i] - array2["positions"][j]
     distances = np.sqrt(np.sum(distance_vector * distance_vector, axis=1))
     #
@@ -91,23 +124,29 @@ def bondlist_kdtree(
     k = np.array(k)
     p = np.array(p)
     t = np.array(t)
-    # Remove all self-interaction.
+    # Remove all self-interaction, the bonds to the periodic images
+    # of the atom itself are kept.
     if not self_interaction:
         mask = np.where(
-            (i == j) & ((array1["offsets"][i] == array2["offsets"][j]).all(axis=1)),
+            (i == j) & ((offsets_j == 0).all(axis=1)),
             False,
             True,
         )
-        # print(mask)
         i = i[mask]
         j = j[mask]
         k = k[mask]
         p = p[mask]
         t = t[mask]
         distances = distances[mask]
-        offsets_i = offsets_i[mask]
         offsets_j = offsets_j[mask]
     #
+    return get_quantities(quantities, i, j, k, p, t, distances, offsets_j)
+
+
+def get_quantities(quantities, i, j, k, p, t, distances, offsets_j):
+    """
+    return the quantities of the bondlist in the order of quantities
+    """
     retvals = []
     for q in quantities:
         if q == "i":
@@ -132,6 +171,305 @@ def bondlist_kdtree(
         return tuple(retvals)
 
 
+def bondlist_cell_list(
+    quantities,
+    species0,
+    positions0,
+    cell,
+    pbc,
+    setting,
+    self_interaction=False,
+    centers=None,
+    bothways=False,
+):
+    """
+    same as bondlist_kdtree, but use the periodic cell list
+    instead of adding boundary atoms.
+
+    return
+
+    i: index1
+    j: index2
+    k: search bond style
+    """
+    cutoffs = {}
+    for pair, b in setting.items():
+        cutoffs[pair] = [b["min"], b["max"]]
+    pairs = list(cutoffs.keys())
+    natom = len(positions0)
+    empty = np.zeros(0, dtype=int)
+    if len(pairs) == 0 or natom == 0:
+        return get_quantities(
+            quantities, empty, empty, empty, empty, empty, np.zeros(0), np.zeros((0, 3))
+        )
+    codes, pair_table, cutoff_min, cutoff_max = build_pair_table(species0, cutoffs)
+    i, j, offsets_j, distances = primitive_neighbor_cell_list(
+        positions0, cell, pbc, cutoff_max.max(), self_interaction=self_interaction
+    )
+    # filter by the cutoff of the species pair
+    pair_index = pair_table[codes[i], codes[j]]
+    cmin = cutoff_min[pair_index]
+    mask = (
+        (pair_index >= 0)
+        & (distances <= cutoff_max[pair_index])  # noqa: W503
+        & ((cmin <= 1e-6) | (distances > cmin))  # noqa: W503
+    )
+    if not bothways:
+        # remove bothways for same species, e.g. ('C', 'C')
+        mask &= ~((codes[i] == codes[j]) & (i > j))
+    if centers is not None:
+        is_center = np.zeros(natom, dtype=bool)
+        is_center[centers] = True
+        mask &= is_center[i]
+    i = i[mask]
+    j = j[mask]
+    offsets_j = offsets_j[mask]
+    distances = distances[mask]
+    pair_index = pair_index[mask]
+    k = np.array([setting[pair]["search"] for pair in pairs], dtype=int)[pair_index]
+    p = np.array([setting[pair]["polyhedra"] for pair in pairs], dtype=int)[pair_index]
+    t = np.array([setting[pair]["type"] for pair in pairs], dtype=int)[pair_index]
+    return get_quantities(quantities, i, j, k, p, t, distances, offsets_j)
+
+
+def build_scaled_lookup(positions, tol=1e-3):
+    """
+    build the lookup table of the scaled positions of the atoms,
+    see locate_scaled_positions.
+
+    The wrapped scaled positions are binned with the size of tol, and
+    encoded to int64 keys. A periodic cKDTree is used for the positions
+    close to the boundary of the bins.
+    """
+    from scipy.spatial import cKDTree
+
+    wrapped = positions - np.floor(positions)
+    wrapped[wrapped >= 1] = 0
+    keys = scaled_keys(wrapped, tol)
+    order = np.argsort(keys)
+    return {
+        "positions": positions,
+        "keys": keys[order],
+        "order": order,
+        "tree": cKDTree(wrapped, boxsize=1),
+        "tol": tol,
+    }
+
+
+def scaled_keys(wrapped, tol):
+    """int64 keys of the bins of the wrapped scaled positions."""
+    m = int(round(1 / tol))
+    q = np.round(wrapped / tol).astype(np.int64) % m
+    return (q[:, 0] * m + q[:, 1]) * m + q[:, 2]
+
+
+def locate_scaled_positions(lookup, scaled):
+    """Find the atoms at the scaled positions.
+
+    lookup: see build_scaled_lookup
+    scaled: scaled positions to find
+
+    return
+
+    indices: indices of the atoms, -1 if no atom is found
+    offsets: lattice offsets, scaled = scaled of the atom + offsets
+    """
+    tol = lookup["tol"]
+    wrapped = scaled - np.floor(scaled)
+    wrapped[wrapped >= 1] = 0
+    keys = scaled_keys(wrapped, tol)
+    index = np.searchsorted(lookup["keys"], keys)
+    index[index == len(lookup["keys"])] = 0
+    found = lookup["keys"][index] == keys
+    indices = np.full(len(scaled), -1, dtype=int)
+    indices[found] = lookup["order"][index[found]]
+    missing = np.where(~found)[0]
+    if len(missing) > 0:
+        distances, indices1 = lookup["tree"].query(wrapped[missing])
+        indices1[distances > tol] = -1
+        indices[missing] = indices1
+    offsets = np.round(scaled - lookup["positions"][indices]).astype(int)
+    return indices, offsets
+
+
+def get_symmetry_mapping(species, positions, cell, tol=1e-5):
+    """
+    Map the symmetry-unique atoms to all the atoms.
+
+    For each atom a, find the operation (R, t) of the space group which
+    maps its unique atom r: R s_r + t = s_a + offsets_a.
+
+    return
+
+    dict:
+        equivalent_atoms: index of the unique atom of each atom
+        rotations: (n, 3, 3) rotation of each atom, scaled positions
+        translations: (n, 3) translation of each atom
+        offsets: (n, 3) lattice offsets of each atom
+        scaled_positions: scaled positions of the atoms
+        lookup: lookup table of the scaled positions
+    None if the symmetry is not found.
+    """
+    from batoms.utils import get_symmetry_operations
+
+    cell = np.array(cell)
+    scaled = np.linalg.solve(cell.T, np.asarray(positions).T).T
+    numbers = np.unique(species, return_inverse=True)[1].ravel()
+    try:
+        symmetry = get_symmetry_operations(cell, scaled, numbers, tol=tol)
+    except ImportError:
+        logger.warning("spglib is not installed, symmetry is not used.")
+        return None
+    if symmetry is None:
+        return None
+    rotations = symmetry["rotations"]
+    translations = symmetry["translations"]
+    equivalent_atoms = symmetry["equivalent_atoms"]
+    # identity first, so the unique atoms map to themselves
+    identity = np.all(rotations == np.eye(3, dtype=int), axis=(1, 2)) & np.all(
+        np.isclose(translations, 0), axis=1
+    )
+    order = np.argsort(~identity, kind="stable")
+    rotations = rotations[order]
+    translations = translations[order]
+    lookup = build_scaled_lookup(scaled)
+    uniques = np.unique(equivalent_atoms)
+    images = (
+        np.einsum("kij,rj->kri", rotations, scaled[uniques]) + translations[:, None, :]
+    )
+    indices, offsets = locate_scaled_positions(lookup, images.reshape(-1, 3))
+    # the first operation which maps the unique atom to each atom
+    atoms, first = np.unique(indices, return_index=True)
+    first = first[atoms >= 0]
+    atoms = atoms[atoms >= 0]
+    if len(atoms) != len(scaled):
+        return None
+    ops = first // len(uniques)
+    return {
+        "equivalent_atoms": equivalent_atoms,
+        "rotations": rotations[ops],
+        "translations": translations[ops],
+        "offsets": offsets[first],
+        "scaled_positions": scaled,
+        "lookup": lookup,
+    }
+
+
+def bondlist_symmetry(
+    quantities,
+    species0,
+    positions0,
+    cell,
+    pbc,
+    setting,
+    symmetry,
+    engine="pair",
+):
+    """
+    same as bondlist_kdtree, but only search the bonds of the
+    symmetry-unique atoms, and copy them to the equivalent atoms
+    by the symmetry operations, see get_symmetry_mapping.
+    """
+    equivalent_atoms = symmetry["equivalent_atoms"]
+    uniques = np.unique(equivalent_atoms)
+    i, j, k, p, t, d, S = bondlist_kdtree(
+        "ijkptdS",
+        species0,
+        positions0,
+        cell,
+        pbc,
+        setting,
+        engine=engine,
+        centers=uniques,
+        bothways=True,
+    )
+    natom = len(positions0)
+    # bonds of the unique atoms in CSR layout
+    order = np.argsort(i, kind="stable")
+    i, j, k, p, t, d, S = (x[order] for x in (i, j, k, p, t, d, S))
+    counts = np.bincount(i, minlength=natom)
+    starts = np.cumsum(counts) - counts
+    # copy the bonds of the unique atom to each atom
+    nbond = counts[equivalent_atoms]
+    atoms = np.repeat(np.arange(natom), nbond)
+    bonds = np.repeat(starts[equivalent_atoms] - np.cumsum(nbond) + nbond, nbond)
+    bonds += np.arange(len(atoms))
+    scaled = symmetry["scaled_positions"][j[bonds]] + S[bonds]
+    scaled = (
+        np.einsum("bij,bj->bi", symmetry["rotations"][atoms], scaled)
+        + symmetry["translations"][atoms]  # noqa: W503
+    )
+    j1, offsets_j = locate_scaled_positions(symmetry["lookup"], scaled)
+    offsets_j -= symmetry["offsets"][atoms]
+    i1 = atoms
+    mask = j1 >= 0
+    # remove bothways for same species, e.g. ('C', 'C')
+    mask &= ~((species0[i1] == species0[np.maximum(j1, 0)]) & (i1 > j1))
+    bonds = bonds[mask]
+    return get_quantities(
+        quantities,
+        i1[mask],
+        j1[mask],
+        k[bonds],
+        p[bonds],
+        t[bonds],
+        d[bonds],
+        offsets_j[mask],
+    )
+
+
+def bondlist_from_bonddatas(array1, array2, bonddatas, setting, bothways=False):
+    """
+    flatten the bonddatas of primitive_neighbor_kdtree to bondlist
+
+    return
+
+    i: index of atoms in array1
+    j: index of atoms in array2
+    k: search bond style
+    p: polyhedra
+    t: bond type
+    """
+    i = []
+    j = []
+    k = []
+    p = []
+    t = []
+    for pair, data in bonddatas.items():
+        if len(data) == 0:
+            continue
+        i1 = []
+        j1 = []
+        for i2, j2 in data.items():
+            n = len(j2)
+            i1.extend([i2] * n)
+            j1.extend(j2)
+        # remove bothways for same species, e.g. ('C', 'C')
+        if pair[0] == pair[1] and not bothways:
+            i1 = np.array(i1)
+            j1 = np.array(j1)
+            # wrong, offset1 could be non zero
+            mask = np.where(
+                (array1["indices"][i1] > array2["indices"][j1]), False, True
+            )
+            i1 = i1[mask]
+            j1 = j1[mask]
+            i1 = list(i1)
+            j1 = list(j1)
+        n = len(i1)
+        k1 = [setting[pair]["search"]] * n
+        p1 = [setting[pair]["polyhedra"]] * n
+        t1 = [setting[pair]["type"]] * n
+        i.extend(i1)
+        j.extend(j1)
+        k.extend(k1)
+        p.extend(p1)
+        t.extend(t1)
+    i = np.array(i, dtype=int)
+    j = np.array(j, dtype=int)
+    return i, j, k, p, t
+
+
 def neighbor_kdtree(species0, positions0, cell, pbc, cutoffs):
     """
     wrap to pbc structure
@@ -199,6 +537,541 @@ def primitive_neighbor_kdtree(array1, array2, cutoffs, parallel=1):
     return bonddatas
 
 
+def build_pair_table(species, cutoffs):
+    """
+    encode species to int, and build the table of species pair
+
+    return
+
+    codes: int code of the species of each atom
+    pair_table: index of the species pair in cutoffs, -1 if not a pair
+    cutoff_min: min cutoff of each species pair
+    cutoff_max: max cutoff of each species pair
+    """
+    pairs = list(cutoffs.keys())
+    unique_species, codes = np.unique(species, return_inverse=True)
+    nsp = len(unique_species)
+    pair_table = np.full((nsp, nsp), -1, dtype=int)
+    cutoff_min = np.zeros(len(pairs))
+    cutoff_max = np.zeros(len(pairs))
+    for m, pair in enumerate(pairs):
+        cutoff_min[m], cutoff_max[m] = cutoffs[pair]
+        if pair[0] not in unique_species or pair[1] not in unique_species:
+            continue
+        pair_table[
+            np.searchsorted(unique_species, pair[0]),
+            np.searchsorted(unique_species, pair[1]),
+        ] = m
+    return codes.reshape(-1), pair_table, cutoff_min, cutoff_max
+
+
+def primitive_neighbor_cell_list(positions, cell, pbc, cutoff, self_interaction=False):
+    """pbc
+    build the neighbor list of atoms with a cell list (linked cell)
+    in fractional coordinates. Atoms are wrapped into the cell and
+    sorted into bins, then each bin is searched against its neighbour
+    bins, the periodic images are given by the integer offsets.
+    Works for triclinic cells and cutoff longer than the cell vectors.
+
+    For fully periodic orthorhombic cells with a cutoff smaller than
+    half of the cell, KDTree(boxsize=...) is used instead.
+
+    return
+
+    i: index1
+    j: index2
+    S: offsets of atoms j, positions[j] + S @ cell
+    d: distances
+    """
+    from ase.geometry import complete_cell
+
+    tstart = time()
+    positions = np.asarray(positions, dtype=float)
+    natom = len(positions)
+    pbc = np.array(pbc, dtype=bool).reshape(-1) * np.ones(3, dtype=bool)
+    cell = complete_cell(np.asarray(cell, dtype=float))
+    # wrap atoms into the cell along the periodic directions
+    scaled = np.linalg.solve(cell.T, positions.T).T
+    shift0 = np.zeros((natom, 3), dtype=int)
+    shift0[:, pbc] = np.floor(scaled[:, pbc]).astype(int)
+    scaled = scaled - shift0
+    if (
+        pbc.all()
+        and np.allclose(cell, np.diag(np.diag(cell)))  # noqa: W503
+        and cutoff < 0.5 * np.diag(cell).min()  # noqa: W503
+    ):
+        i, j, S = _neighbor_kdtree_boxsize(scaled, cell, cutoff)
+    else:
+        i, j, S = _neighbor_cell_list(scaled, cell, pbc, cutoff)
+    vectors = np.dot(scaled[j] + S - scaled[i], cell)
+    distances = np.sqrt(np.sum(vectors * vectors, axis=1))
+    mask = distances <= cutoff
+    if not self_interaction:
+        mask &= ~((i == j) & (S == 0).all(axis=1))
+    i = i[mask]
+    j = j[mask]
+    distances = distances[mask]
+    # offsets relative to the original (unwrapped) positions
+    S = S[mask] + shift0[i] - shift0[j]
+    argsort = np.lexsort((j, i))
+    logger.debug("Build bondlist (cell list): {:1.2f}".format(time() - tstart))
+    return i[argsort], j[argsort], S[argsort], distances[argsort]
+
+
+def _neighbor_kdtree_boxsize(scaled, cell, cutoff):
+    """Pairs within cutoff for fully periodic orthorhombic cell,
+    using the periodic KDTree. Only the minimum image is found,
+    thus cutoff should be smaller than half of the cell."""
+    from scipy.spatial import KDTree
+
+    boxsize = np.diag(cell)
+    positions = scaled * boxsize
+    # KDTree requires the data in [0, boxsize)
+    positions = np.mod(positions, boxsize)
+    positions[positions >= boxsize] = 0
+    tree = KDTree(positions, boxsize=boxsize)
+    sdm = tree.sparse_distance_matrix(tree, cutoff, output_type="ndarray")
+    i = sdm["i"]
+    j = sdm["j"]
+    # minimum image offsets
+    S = -np.round(scaled[j] - scaled[i]).astype(int)
+    return i, j, S
+
+
+def _neighbor_cell_list(scaled, cell, pbc, cutoff):
+    """Pairs within cutoff using the cell list.
+
+    The bins are not smaller than the cutoff along the normal of the
+    cell faces, and the neighbour bins are searched until the cutoff
+    is covered, so that long cutoffs give multiple images."""
+    natom = len(scaled)
+    # distance between the two opposite faces of the cell
+    face_distances = 1.0 / np.linalg.norm(np.linalg.inv(cell), axis=0)
+    # fractional range of the bins, non periodic direction use the box
+    lower = np.where(pbc, 0.0, scaled.min(axis=0))
+    upper = np.where(pbc, 1.0, scaled.max(axis=0))
+    lengths = np.maximum(upper - lower, 1e-8) * face_distances
+    nbins = np.maximum(np.floor(lengths / cutoff), 1).astype(int)
+    # limit the number of bins to the number of atoms
+    ratio = np.prod(nbins.astype(float)) / max(natom, 1)
+    if ratio > 1:
+        nbins = np.maximum(np.floor(nbins / ratio ** (1 / 3)), 1).astype(int)
+    widths = np.maximum(upper - lower, 1e-8) / nbins
+    # number of neighbour bins to cover the cutoff
+    nsearch = np.ceil(cutoff / (widths * face_distances)).astype(int)
+    nsearch[~pbc] = np.minimum(nsearch[~pbc], nbins[~pbc] - 1)
+    # sort atoms by bins
+    bins = np.floor((scaled - lower) / widths).astype(int)
+    bins = np.clip(bins, 0, nbins - 1)
+    bin_ids = np.ravel_multi_index(bins.T, nbins)
+    indptr, atoms_sorted = build_csr(bin_ids, np.prod(nbins))
+    # loop over the neighbour bins
+    indices_i = []
+    indices_j = []
+    offsets = []
+    for d in np.ndindex(*(2 * nsearch + 1)):
+        d = np.array(d) - nsearch
+        neighbors = bins + d
+        S = np.floor_divide(neighbors, nbins)
+        # no periodic images for non periodic directions
+        valid = ((S == 0) | pbc).all(axis=1)
+        S[:, ~pbc] = 0
+        neighbors = neighbors - S * nbins
+        i = np.where(valid)[0]
+        nb_ids = np.ravel_multi_index(neighbors[i].T, nbins)
+        # all atoms in the neighbour bins
+        _, j = gather_csr(indptr, atoms_sorted, nb_ids)
+        i_rep = i[np.repeat(np.arange(len(i)), np.diff(indptr)[nb_ids])]
+        S = S[i_rep]
+        vectors = np.dot(scaled[j] + S - scaled[i_rep], cell)
+        mask = np.sum(vectors * vectors, axis=1) <= cutoff * cutoff
+        i_rep = i_rep[mask]
+        j = j[mask]
+        indices_i.append(i_rep)
+        indices_j.append(j)
+        offsets.append(S[mask])
+    i = np.concatenate(indices_i)
+    j = np.concatenate(indices_j)
+    S = np.concatenate(offsets)
+    return i, j, S
+
+
+def primitive_neighbor_kdtree_vectorized(array1, array2, cutoffs):
+    """non pbc
+    build bond lists between atoms1 and atoms2, same as
+    primitive_neighbor_kdtree, but search all species pairs at once.
+
+    Only one KDTree is built for each array, and all pairs within the
+    largest cutoff are found by a single sparse_distance_matrix query.
+    Then the pairs are filtered by the [min, max] cutoff of their
+    species pair using numpy masks.
+
+    return
+
+    i: index of atoms in array1
+    j: index of atoms in array2
+    pair_index: index of the species pair in cutoffs
+    """
+    from scipy.spatial import KDTree
+
+    tstart = time()
+    empty = np.zeros(0, dtype=int)
+    pairs = list(cutoffs.keys())
+    n1 = len(array1["positions"])
+    n2 = len(array2["positions"])
+    if len(pairs) == 0 or n1 == 0 or n2 == 0:
+        return empty, empty.copy(), empty.copy()
+    codes, pair_table, cutoff_min, cutoff_max = build_pair_table(
+        np.append(array1["species"], array2["species"]), cutoffs
+    )
+    codes1 = codes[:n1]
+    codes2 = codes[n1:]
+    # only atoms of the species in the pairs are needed
+    indices_i = np.where((pair_table >= 0).any(axis=1)[codes1])[0]
+    indices_j = np.where((pair_table >= 0).any(axis=0)[codes2])[0]
+    if len(indices_i) == 0 or len(indices_j) == 0:
+        return empty, empty.copy(), empty.copy()
+    # find all pairs within the max cutoff
+    tree1 = KDTree(array1["positions"][indices_i])
+    tree2 = KDTree(array2["positions"][indices_j])
+    sdm = tree1.sparse_distance_matrix(tree2, cutoff_max.max(), output_type="ndarray")
+    i = indices_i[sdm["i"]]
+    j = indices_j[sdm["j"]]
+    distances = sdm["v"]
+    # filter by the cutoff of the species pair
+    pair_index = pair_table[codes1[i], codes2[j]]
+    mask = pair_index >= 0
+    i = i[mask]
+    j = j[mask]
+    distances = distances[mask]
+    pair_index = pair_index[mask]
+    cmin = cutoff_min[pair_index]
+    mask = (distances <= cutoff_max[pair_index]) & ((cmin <= 1e-6) | (distances > cmin))
+    i = i[mask]
+    j = j[mask]
+    pair_index = pair_index[mask]
+    # sort by pair, then i, j
+    argsort = np.lexsort((j, i, pair_index))
+    logger.debug("Build bondlist (vectorized): {:1.2f}".format(time() - tstart))
+    return i[argsort], j[argsort], pair_index[argsort]
+
+
+def gather_csr(indptr, data, indices):
+    """
+    gather the rows of a CSR (compressed sparse row) structure
+
+    indptr: row pointers, the data of row i is data[indptr[i]:indptr[i + 1]]
+    data: data sorted by rows
+    indices: rows to gather
+
+    return
+
+    rows: row index of each gathered data
+    data: gathered data
+    """
+    indices = np.asarray(indices, dtype=int)
+    starts = indptr[indices]
+    counts = indptr[indices + 1] - starts
+    rows = np.repeat(indices, counts)
+    first = np.repeat(starts - (np.cumsum(counts) - counts), counts)
+    return rows, data[first + np.arange(len(rows))]
+
+
+def build_csr(keys, nrow):
+    """
+    build the row pointers for data with row index keys
+
+    return
+
+    indptr: row pointers
+    order: argsort of keys, data[order] is sorted by rows
+    """
+    keys = np.asarray(keys, dtype=int)
+    order = np.argsort(keys, kind="stable")
+    indptr = np.zeros(nrow + 1, dtype=int)
+    indptr[1:] = np.cumsum(np.bincount(keys, minlength=nrow))
+    return indptr, order
+
+
+def build_bonddatas(bondlists, natom):
+    """
+    build the bonds connect to each atom in CSR layout
+
+    return
+
+    bonddatas: dict
+        bondlists: bondlists sorted by the first atom
+        indptr: row pointers, the bonds of atom i are
+            bondlists[indptr[i]:indptr[i + 1]]
+    """
+    indptr, order = build_csr(bondlists[:, 0], natom)
+    return {"bondlists": bondlists[order], "indptr": indptr}
+
+
+def dict_to_csr(datas, nrow):
+    """
+    convert a dict {row: array} to CSR layout
+
+    return
+
+    indptr: row pointers
+    data: concatenated arrays sorted by rows
+    """
+    keys = np.array(sorted(k for k, v in datas.items() if len(v) > 0), dtype=int)
+    indptr = np.zeros(nrow + 1, dtype=int)
+    if len(keys) == 0:
+        return indptr, np.zeros(0, dtype=int)
+    indptr[keys + 1] = [len(datas[k]) for k in keys]
+    indptr = np.cumsum(indptr)
+    data = np.concatenate([np.asarray(datas[k], dtype=int) for k in keys])
+    return indptr, data
+
+
+def gather_bonddatas(bonddatas, indices, offsets):
+    """
+    copy the bonds connect to atoms, and shift them by offsets
+
+    bonddatas: bonds in CSR layout, see build_bonddatas
+    indices: index of the atoms
+    offsets: offset of the atoms, array (n, 3)
+
+    return
+
+    bondlists: the copied bonds
+    """
+    indptr = bonddatas["indptr"]
+    indices = np.asarray(indices, dtype=int)
+    offsets = np.asarray(offsets, dtype=int).reshape(-1, 3)
+    # skip atoms not in the bonddatas
+    mask = (indices >= 0) & (indices < len(indptr) - 1)
+    indices = indices[mask]
+    offsets = offsets[mask]
+    counts = indptr[indices + 1] - indptr[indices]
+    _, bondlists = gather_csr(indptr, bonddatas["bondlists"], indices)
+    offsets = np.repeat(offsets, counts, axis=0)
+    bondlists[:, 2:5] += offsets
+    bondlists[:, 5:8] += offsets
+    return bondlists
+
+
+def gather_pecies_bonddatas(bonddatas, molPeciesDatas, pecies, offsets):
+    """
+    copy the bonds of the atoms in pecies (molecules), and shift them
+    by offsets
+
+    pecies: index of the pecies
+    offsets: offset of the pecies, array (n, 3)
+    """
+    indptr, atoms = dict_to_csr(molPeciesDatas, len(bonddatas["indptr"]) - 1)
+    pecies = np.asarray(pecies, dtype=int)
+    offsets = np.asarray(offsets, dtype=int).reshape(-1, 3)
+    mask = (pecies >= 0) & (pecies < len(indptr) - 1)
+    pecies = pecies[mask]
+    offsets = offsets[mask]
+    counts = indptr[pecies + 1] - indptr[pecies]
+    _, indices = gather_csr(indptr, atoms, pecies)
+    offsets = np.repeat(offsets, counts, axis=0)
+    return gather_bonddatas(bonddatas, indices, offsets)
+
+
+def build_neighbor_cache(species, positions, cell, pbc, setting, bondlists):
+    """
+    build the persistent neighbor structure for incremental update
+    of the bondlists, see update_neighbor_cache.
+
+    species: species of atoms
+    positions: positions of atoms
+    bondlists: bondlists of the atoms, (i, j, offset_i, offset_j, k, p, t)
+    """
+    from scipy.spatial import KDTree
+
+    cutoffs = {}
+    for pair, b in setting.items():
+        cutoffs[pair] = [b["min"], b["max"]]
+    natom = len(positions)
+    positions = np.array(positions, dtype=float)
+    pbc = np.array(pbc, dtype=bool).reshape(-1) * np.ones(3, dtype=bool)
+    codes, pair_table, cutoff_min, cutoff_max = build_pair_table(species, cutoffs)
+    # atoms added with boundary
+    array2 = RemovePbc(species, positions, cell, pbc, cutoffs)
+    cache = {
+        "species": np.array(species),
+        "positions": positions,
+        "cell": np.array(cell),
+        "pbc": np.array(pbc),
+        "setting": setting,
+        "codes": codes,
+        "pair_table": pair_table,
+        "cutoff_min": cutoff_min,
+        "cutoff_max": cutoff_max,
+        "array2": array2,
+        "tree": KDTree(array2["positions"]),
+        # atoms moved after the tree is built
+        "moved": np.zeros(natom, dtype=bool),
+        "images": get_neighbor_images(cell, pbc, cutoff_max.max()),
+    }
+    set_neighbor_cache_bondlists(cache, bondlists)
+    return cache
+
+
+def get_neighbor_images(cell, pbc, cutoff):
+    """
+    offsets of the periodic images which can be within the cutoff of an
+    atom, after the minimum image offset is applied. Small or skewed cells
+    need more than one image along a direction.
+    """
+    from ase.geometry import complete_cell
+
+    # distance between the two opposite faces of the cell
+    face_distances = 1.0 / np.linalg.norm(
+        np.linalg.inv(complete_cell(np.asarray(cell, dtype=float))), axis=0
+    )
+    nimage = np.where(pbc, np.ceil(0.5 + cutoff / face_distances), 0).astype(int)
+    images = np.array(list(np.ndindex(*(2 * nimage + 1)))) - nimage
+    return images
+
+
+def set_neighbor_cache_bondlists(cache, bondlists):
+    """
+    save the bondlists, and index the bonds connected to each atom.
+    """
+    natom = len(cache["positions"])
+    nb = len(bondlists)
+    indptr, order = build_csr(np.append(bondlists[:, 0], bondlists[:, 1]), natom)
+    cache["bondlists"] = bondlists
+    cache["indptr"] = indptr
+    cache["bond_indices"] = np.append(np.arange(nb), np.arange(nb))[order]
+
+
+def update_neighbor_cache(cache, positions, indices, max_moved=0.1):
+    """
+    re-calculate the bonds connected to the moved atoms.
+
+    The KDTree of the cache is kept, the moved atoms are searched against
+    the unmoved atoms in the tree, and against all moved atoms directly,
+    over the periodic images of the cache. When more than max_moved of the
+    atoms are moved, the tree is rebuilt with all atoms, and the moved
+    atoms are only searched against the tree. In a cell thinner than the
+    cutoff, the moved atoms are searched against all atoms directly.
+
+    positions: new positions of atoms
+    indices: indices of the moved atoms
+
+    return
+
+    bondlists: the updated bondlists
+    """
+    from scipy.spatial import KDTree
+    from ase.geometry import complete_cell
+
+    tstart = time()
+    positions = np.array(positions, dtype=float)
+    indices = np.unique(np.asarray(indices, dtype=int))
+    cell = cache["cell"]
+    pbc = np.array(cache["pbc"], dtype=bool).reshape(-1) * np.ones(3, dtype=bool)
+    moved = cache["moved"]
+    moved[indices] = True
+    cache["positions"][indices] = positions[indices]
+    natom = len(positions)
+    if moved.sum() > max(max_moved * natom, 1):
+        # rebuild the tree with the new positions of all atoms
+        cutoffs = {}
+        for pair, b in cache["setting"].items():
+            cutoffs[pair] = [b["min"], b["max"]]
+        array2 = RemovePbc(cache["species"], positions, cell, pbc, cutoffs)
+        cache["array2"] = array2
+        cache["tree"] = KDTree(array2["positions"])
+        moved[:] = False
+    # remove the bonds connected to the moved atoms
+    bondlists = cache["bondlists"]
+    _, rows = gather_csr(cache["indptr"], cache["bond_indices"], indices)
+    keep = np.ones(len(bondlists), dtype=bool)
+    keep[rows] = False
+    images = cache["images"]
+    if np.abs(images).max(initial=0) > 1:
+        # the boundary atoms of the tree only cover the nearest images,
+        # search the moved atoms against all atoms directly
+        i1 = j1 = np.zeros(0, dtype=int)
+        vectors1 = S1 = np.zeros((0, 3))
+        candidates = np.arange(natom)
+    else:
+        # moved atoms vs unmoved atoms in the tree, the tree is built from
+        # the wrapped positions, S is relative to the original positions
+        array2 = cache["array2"]
+        rmax = cache["cutoff_max"].max()
+        scaled = np.linalg.solve(complete_cell(cell).T, positions[indices].T).T
+        shift = np.where(pbc, np.floor(scaled), 0)
+        wrapped = positions[indices] - np.dot(shift, cell)
+        neighbors = cache["tree"].query_ball_point(wrapped, r=rmax)
+        counts = np.array([len(x) for x in neighbors], dtype=int)
+        k1 = np.repeat(np.arange(len(indices)), counts)
+        j1 = np.array([x for y in neighbors for x in y], dtype=int)
+        mask = ~moved[array2["indices"][j1]]
+        k1 = k1[mask]
+        j1 = j1[mask]
+        i1 = indices[k1]
+        vectors1 = array2["positions"][j1] - wrapped[k1]
+        S1 = array2["offsets"][j1] + shift[k1]
+        j1 = array2["indices"][j1]
+        candidates = np.where(moved)[0]
+    # moved atoms vs the other moved atoms, with the periodic images around
+    # the minimum image
+    i2 = np.repeat(indices, len(candidates))
+    j2 = np.tile(candidates, len(indices))
+    scaled = np.linalg.solve(complete_cell(cell).T, positions.T).T
+    S0 = np.where(pbc, -np.round(scaled[j2] - scaled[i2]), 0)
+    i2 = np.repeat(i2, len(images))
+    j2 = np.repeat(j2, len(images))
+    S2 = np.repeat(S0, len(images), axis=0) + np.tile(images, (len(S0), 1))
+    vectors2 = positions[j2] + np.dot(S2, cell) - positions[i2]
+    i = np.append(i1, i2)
+    j = np.append(j1, j2)
+    S = np.append(S1, S2, axis=0).astype(int)
+    vectors = np.append(vectors1, vectors2, axis=0)
+    distances = np.sqrt(np.sum(vectors * vectors, axis=1))
+    # both direction: (i, j, S) and (j, i, -S)
+    i, j = np.append(i, j), np.append(j, i)
+    S = np.append(S, -S, axis=0)
+    distances = np.append(distances, distances)
+    # filter by the cutoff of the species pair
+    codes = cache["codes"]
+    pair_index = cache["pair_table"][codes[i], codes[j]]
+    cmin = cache["cutoff_min"][pair_index]
+    mask = (
+        (pair_index >= 0)
+        & (distances <= cache["cutoff_max"][pair_index])  # noqa: W503
+        & ((cmin <= 1e-6) | (distances > cmin))  # noqa: W503
+        # remove bothways for same species, e.g. ('C', 'C')
+        & ~((codes[i] == codes[j]) & (i > j))  # noqa: W503
+        # remove self-interaction
+        & ~((i == j) & (S == 0).all(axis=1))  # noqa: W503
+    )
+    i = i[mask]
+    j = j[mask]
+    S = S[mask]
+    pair_index = pair_index[mask]
+    pairs = list(cache["setting"].keys())
+    k = np.array([cache["setting"][pair]["search"] for pair in pairs], dtype=int)
+    p = np.array([cache["setting"][pair]["polyhedra"] for pair in pairs], dtype=int)
+    t = np.array([cache["setting"][pair]["type"] for pair in pairs], dtype=int)
+    nb = len(i)
+    new_bondlists = np.concatenate(
+        (
+            np.array([i, j]).T,
+            np.zeros((nb, 3), dtype=int),
+            S,
+            k[pair_index].reshape(-1, 1),
+            p[pair_index].reshape(-1, 1),
+            t[pair_index].reshape(-1, 1),
+        ),
+        axis=1,
+    )
+    bondlists = np.append(bondlists[keep], new_bondlists, axis=0).astype(int)
+    bondlists = np.unique(bondlists, axis=0)
+    logger.debug("Update bondlist incrementally: {:1.2f}".format(time() - tstart))
+    return bondlists
+
+
 def cellPlanes(cell, origin=np.array([0, 0, 0])):
     """
     build six planes for the six faces of a cell
@@ -252,9 +1125,14 @@ def build_boundary(species, positions, cell, pbc, boundary, include_self=False):
     todo: boundary > 1
     """
     from functools import reduce
+    from ase.geometry import complete_cell
 
     # tstart = time()
     wraped_positions = wrap_positions(positions, cell, pbc=pbc)
+    # the offsets are relative to the original positions
+    shift = np.round(
+        np.linalg.solve(complete_cell(cell).T, (wraped_positions - positions).T).T
+    )
     distances = pointCellDistance(wraped_positions, cell)
     natom = len(positions)
     # find atoms close to cell face with distance of r
@@ -279,7 +1157,7 @@ def build_boundary(species, positions, cell, pbc, boundary, include_self=False):
     nb1 = 0
     nb2 = 0
     for c in range(3):
-        if not pbc[i]:
+        if not pbc[c]:
             continue
         for i in range(2):
             nb2 = nb1 + len(indices[c][i])
@@ -318,13 +1196,13 @@ def build_boundary(species, positions, cell, pbc, boundary, include_self=False):
     positions_b = positions_b[0:nb2]
     indices_b = indices_b[0:nb2]
     species_b = species[indices_b]
-    offsets_b = offsets_b[0:nb2]
+    offsets_b = offsets_b[0:nb2] + shift[indices_b]
     positions_b = positions_b + np.dot(offsets_b, cell)
     if include_self:
-        positions_b = np.append(positions, positions_b, axis=0)
+        positions_b = np.append(wraped_positions, positions_b, axis=0)
         indices_b = np.append(np.arange(natom), indices_b)
         species_b = np.append(species, species_b)
-        offsets_b = np.append(np.zeros((natom, 3)), offsets_b, axis=0)
+        offsets_b = np.append(shift, offsets_b, axis=0)
 
     # print('build boundary: {:1.2f}'.format(time() - tstart))
     boundary_data = {
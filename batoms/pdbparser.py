@@ -5,12 +5,14 @@ Module to read and write atoms in PDB file format.
 
 """
 
+import os
 import warnings
 
 import numpy as np
 
 from ase.atoms import Atoms
 from ase.cell import Cell
+from ase.data import atomic_numbers
 from ase.io.espresso import label_to_symbol
 
 
@@ -126,123 +128,192 @@ def read_line_helix(line):
 
 
 def read_pdb(fileobj, index=-1, read_arrays=True):
-    """Read PDB files."""
+    """Read PDB files.
+
+    The file is memory-mapped, the records are found by byte searches, and
+    the fixed-width columns of the ATOM/HETATM records are decoded in bulk
+    with NumPy. Each END/ENDMDL record closes a model, only the models
+    selected by index are decoded.
+    """
+    import mmap
+
     if isinstance(fileobj, str):
-        fileobj = open(fileobj)
-    images = []
+        with open(fileobj, "rb") as fd:
+            if os.fstat(fd.fileno()).st_size == 0:
+                buffer = b""
+            else:
+                buffer = mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ)
+    else:
+        buffer = fileobj.read()
+        if isinstance(buffer, str):
+            buffer = buffer.encode()
+    data = np.frombuffer(buffer, dtype=np.uint8)
+    # start and length of each line
+    newlines = np.flatnonzero(data == 10)
+    starts = np.append(0, newlines + 1)
+    ends = np.append(newlines, len(data))
+    if starts[-1] == len(data):
+        starts = starts[:-1]
+        ends = ends[:-1]
+    records = read_columns(data, starts, ends - starts, 0, 6)
+    # a 6-digit serial number spills into the 6th column of an ATOM record
+    is_atom = np.char.startswith(records, b"ATOM") | np.char.startswith(
+        records, b"HETATM"
+    )
+    is_end = np.char.startswith(records, b"END")
+    atom_lines = np.flatnonzero(is_atom)
+    end_lines = np.flatnonzero(is_end)
+    # split the atom records into models, drop empty models
+    if len(end_lines) == 0:
+        end_lines = np.array([len(starts)])
+    bounds = np.searchsorted(atom_lines, end_lines)
+    models = []
+    first = 0
+    for i, bound in enumerate(bounds):
+        if bound > first:
+            models.append((atom_lines[first:bound], end_lines[i]))
+        first = bound
+    if len(models) == 0:
+        models.append((atom_lines[:0], end_lines[-1]))
+    # header records, only a few lines
+    header_lines = np.flatnonzero(
+        np.char.startswith(records, b"CRYST1")
+        | np.char.startswith(records, b"ORIGX")  # noqa: W503
+        | np.char.startswith(records, b"SHEET")  # noqa: W503
+        | np.char.startswith(records, b"HELIX")  # noqa: W503
+    )
+    selected = models[index]
+    if isinstance(index, slice):
+        return [
+            read_pdb_model(
+                data, starts, ends, records, end_lines, header_lines, m, read_arrays
+            )
+            for m in selected
+        ]
+    return read_pdb_model(
+        data, starts, ends, records, end_lines, header_lines, selected, read_arrays
+    )
+
+
+def read_columns(data, starts, lengths, begin, end):
+    """Read the columns [begin:end] of the lines as a bytes array.
+
+    The columns beyond the end of the line are filled by spaces.
+    """
+    width = end - begin
+    if len(starts) == 0:
+        return np.zeros(0, dtype="S%s" % width)
+    columns = np.arange(begin, end)
+    indices = starts[:, None] + columns
+    mask = columns >= lengths[:, None]
+    chars = data[np.minimum(indices, len(data) - 1)]
+    chars = np.where(mask | (chars == 13), 32, chars).astype(np.uint8)
+    return np.ascontiguousarray(chars).view("S%s" % width).ravel()
+
+
+def read_float_columns(columns):
+    """Convert a bytes array to float, return None if any value is invalid."""
+    try:
+        return columns.astype(np.float64)
+    except ValueError:
+        return None
+
+
+def read_pdb_model(
+    data, starts, ends, records, end_lines, header_lines, model, read_arrays
+):
+    """Decode the atom records of one model."""
+    lines, end_line = model
+    # the records of the current model start after the previous END
+    i = np.searchsorted(end_lines, end_line)
+    begin_line = end_lines[i - 1] + 1 if i > 0 else 0
+    cell = None
+    pbc = None
     orig = np.identity(3)
     trans = np.zeros(3)
-    occ = []
-    bfactor = []
-    types = []
-    residuenames = []
-    residuenumbers = []
-    atomtypes = []
-    chainids = []
     sheet = []
     helix = []
-
-    symbols = []
-    positions = []
-    cell = None
-    pbc = None
-
-    def build_atoms():
-        atoms = Atoms(symbols=symbols, cell=cell, pbc=pbc, positions=positions)
-
-        if not read_arrays:
-            return atoms
-
-        info = {
-            "occupancy": occ,
-            "bfactor": bfactor,
-            "residuenames": residuenames,
-            "atomtypes": atomtypes,
-            "residuenumbers": residuenumbers,
-            "chainids": chainids,
-            "types": types,
-        }
-        for name, array in info.items():
-            if len(array) == 0:
-                pass
-            elif len(array) != len(atoms):
-                warnings.warn(
-                    "Length of {} array, {}, "
-                    "different from number of atoms {}".format(
-                        name, len(array), len(atoms)
-                    )
-                )
-            else:
-                atoms.set_array(name, np.array(array))
-        atoms.info["sheet"] = sheet
-        atoms.info["helix"] = helix
-        return atoms
-
-    for line in fileobj.readlines():
-        if line.startswith("CRYST1"):
+    for j in header_lines[header_lines < end_line]:
+        line = bytes(data[starts[j] : ends[j]]).decode()
+        if line.startswith("CRYST1") and j >= begin_line:
             cell, pbc = read_line_cyrstal(line)
         for c in range(3):
             if line.startswith("ORIGX" + "123"[c]):
                 orig[c] = [float(line[10:20]), float(line[20:30]), float(line[30:40])]
                 trans[c] = float(line[45:55])
-        if line.startswith("ATOM") or line.startswith("HETATM"):
-            # line_info = symbol, name, altloc, resname, coord, occupancy,
-            #             bfactor, resseq
-            line_info = read_atom_line(line)
-
-            try:
-                symbol = label_to_symbol(line_info[0])
-            except (KeyError, IndexError):
-                symbol = label_to_symbol(line_info[1])
-
-            position = np.dot(orig, line_info[4]) + trans
-            atomtypes.append(line_info[1])
-            residuenames.append(line_info[3])
-            if line_info[5] is not None:
-                occ.append(line_info[5])
-            bfactor.append(line_info[6])
-            residuenumbers.append(line_info[7])
-            chainids.append(line_info[8])
-            types.append(line_info[9])
-
-            symbols.append(symbol)
-            positions.append(position)
-
         if line.startswith("SHEET"):
             sheet.append(read_line_sheet(line))
         if line.startswith("HELIX"):
             helix.append(read_line_helix(line))
-        if line.startswith("CONECT"):
-            pass
-        if line.startswith("REMARK"):
-            pass
-        if line.startswith("HEADER"):
-            pass
-        if line.startswith("TITLE"):
-            pass
-        if line.startswith("COMPND"):
-            pass
-        if line.startswith("END"):
-            # End of configuration reached
-            # According to the latest PDB file format (v3.30),
-            # this line should start with 'ENDMDL' (not 'END'),
-            # but in this way PDB trajectories from e.g. CP2K
-            # are supported (also VMD supports this format).
-            atoms = build_atoms()
-            images.append(atoms)
-            occ = []
-            bfactor = []
-            residuenames = []
-            atomtypes = []
-            symbols = []
-            positions = []
-            cell = None
-            pbc = None
-
-    if len(images) == 0:
-        atoms = build_atoms()
-        images.append(atoms)
-    return images[index]
+    # atom records
+    starts = starts[lines]
+    lengths = ends[lines] - starts
+    coord = np.zeros((len(lines), 3))
+    for c in range(3):
+        columns = read_columns(data, starts, lengths, 30 + 8 * c, 38 + 8 * c)
+        values = read_float_columns(columns)
+        if values is None:
+            raise ValueError("Invalid or missing coordinate(s)")
+        coord[:, c] = values
+    positions = coord @ orig.T + trans
+    names = np.char.strip(read_columns(data, starts, lengths, 12, 16))
+    elements = np.char.upper(np.char.strip(read_columns(data, starts, lengths, 76, 78)))
+    numbers = get_numbers(elements.astype(str), names.astype(str))
+    atoms = Atoms(numbers=numbers, cell=cell, pbc=pbc, positions=positions)
+    if not read_arrays:
+        return atoms
+    info = {}
+    occupancy = read_float_columns(read_columns(data, starts, lengths, 54, 60))
+    if occupancy is None:
+        warnings.warn("Invalid occupancy in one or more atoms")
+    else:
+        if (occupancy < 0).any():
+            warnings.warn("Negative occupancy in one or more atoms")
+        info["occupancy"] = occupancy
+    # The PDB use a default of zero if the bfactor is missing
+    columns = read_columns(data, starts, lengths, 60, 66)
+    bfactor = read_float_columns(columns)
+    if bfactor is None:
+        bfactor = np.zeros(len(lines))
+        for k, value in enumerate(columns):
+            try:
+                bfactor[k] = float(value)
+            except ValueError:
+                pass
+    info["bfactor"] = bfactor
+    info["residuenames"] = read_columns(data, starts, lengths, 17, 21).astype(str)
+    info["atomtypes"] = names.astype(str)
+    # Residue sequence number, the first word of the column, or 1 if missing
+    seq = np.char.strip(read_columns(data, starts, lengths, 22, 26).astype(str))
+    seq = np.char.partition(seq, " ")[:, 0]
+    info["residuenumbers"] = np.where(seq == "", "1", seq).astype(int)
+    info["chainids"] = read_columns(data, starts, lengths, 21, 22).astype(str)
+    info["types"] = np.where(
+        np.char.startswith(records[lines], b"HETATM"), "HETATM", "ATOM"
+    )
+    for name, array in info.items():
+        if len(array) > 0:
+            atoms.set_array(name, array)
+    atoms.info["sheet"] = sheet
+    atoms.info["helix"] = helix
+    return atoms
+
+
+def get_numbers(elements, names):
+    """Get atomic numbers from the element columns, or the atom names
+    if the element is missing. Only the unique labels are converted."""
+    labels, inverse = np.unique(
+        np.char.add(np.char.add(elements, ","), names), return_inverse=True
+    )
+    numbers = np.zeros(len(labels), dtype=int)
+    for i, label in enumerate(labels):
+        element, name = label.split(",", 1)
+        try:
+            symbol = label_to_symbol(element)
+        except (KeyError, IndexError):
+            symbol = label_to_symbol(name)
+        numbers[i] = atomic_numbers[symbol]
+    return numbers[inverse.ravel()]
 
 
 if __name__ == "__main__":
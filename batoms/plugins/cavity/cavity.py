@@ -97,14 +97,38 @@ class Cavity(ObjectGN, PluginObject):
         cavity_datas = self.build_cavity()
         self.set_arrays(cavity_datas)
 
-    def build_kdtree(self, positions):
-        """ """
-        from scipy import spatial
+    def build_kdtree(self, positions, cell, pbc=[False, False, False], cutoff=5.0):
+        """Build the KDTree of the atoms and their periodic images within
+        cutoff of the cell.
 
-        # tstart = time()
-        self.kdtree = spatial.KDTree(positions)
-        self.kdtree_mesh = spatial.KDTree(self.meshgrids)
-        # print('KDTree positions: %s' % (time() - tstart))
+        Args:
+            positions (array): positions of the atoms
+            cell (array): 3x3 cell
+            pbc (list): periodic boundary conditions
+            cutoff (float): distance from the cell faces to include images
+        """
+        cell = np.array(cell)
+        scaled = np.linalg.solve(cell.T, np.array(positions).T).T
+        pbc = np.array(pbc, dtype=bool)
+        scaled[:, pbc] %= 1
+        # heights of the cell
+        volume = abs(np.linalg.det(cell))
+        heights = volume / np.linalg.norm(
+            np.cross(cell[[1, 2, 0]], cell[[2, 0, 1]]), axis=1
+        )
+        padding = np.where(pbc, cutoff / heights, 0)
+        nrep = np.ceil(padding).astype(int)
+        shifts = (
+            np.array(np.meshgrid(*[np.arange(-n, n + 1) for n in nrep], indexing="ij"))
+            .reshape(3, -1)
+            .T
+        )
+        images = (scaled[None, :, :] + shifts[:, None, :]).reshape(-1, 3)
+        indices = np.tile(np.arange(len(scaled)), len(shifts))
+        mask = np.all((images >= -padding) & (images <= 1 + padding), axis=1)
+        self.kdtree = spatial.cKDTree(np.dot(images[mask], cell))
+        self.kdtree_indices = indices[mask]
+        self.kdtree_cutoff = cutoff
 
     def query_distance(self, points, parallel=1):
         # tstart = time()
@@ -112,18 +136,24 @@ class Cavity(ObjectGN, PluginObject):
         # print('KDTree query: %s' % (time() - tstart))
         # here we consider the size of atoms using one value for all.
         distance = distance - self.atomRadius
-        return indices, distance
+        return self.kdtree_indices[indices], distance
 
-    def query_radius(self, meshgrids, points, radii, k=1):
-        """
-        Algorithm:
-        Use KDTree to query the tree for neighbors within a radius r.
+    def calc_grid_distances(self, positions, cell, pbc=[False, False, False]):
+        """Distances from the grid points to the nearest atom, including
+        the periodic images.
+
+        The images within a cutoff of the cell are used, the cutoff is
+        increased until it is larger than all the distances, so that the
+        result is exact.
         """
-        # tstart = time()
-        kdtree_mesh = spatial.KDTree(meshgrids)
-        indices = kdtree_mesh.query_ball_point(points, radii)
-        # print('KDTree query: %s' % (time() - tstart))
-        return indices[0]
+        cutoff = 5.0
+        while True:
+            self.build_kdtree(positions, cell, pbc, cutoff=cutoff)
+            indices, distances = self.query_distance(self.meshgrids)
+            dmax = distances.max() + self.atomRadius + self.resolution
+            if not any(pbc) or dmax <= cutoff:
+                return indices, distances
+            cutoff = dmax
 
     def base_meshgrids(self, grids):
         x, y, z = np.meshgrid(
@@ -167,14 +197,7 @@ class Cavity(ObjectGN, PluginObject):
         """
         from batoms.data import basic_colors
 
-        arrays = self.batoms.arrays
-        cell = self.batoms.cell
-        self.build_grid(cell, self.resolution)
-        self.build_kdtree(arrays["positions"])
-        indices, distances = self.query_distance(self.meshgrids)
-        spheres = self.find_cage_spheres(distances)
-        spheres = self.check_sphere_boundary(spheres, cell)
-        # spheres = self.refine_spheres(spheres)
+        spheres = self.find_spheres()
         ns = len(spheres["centers"])
         color_names = list(basic_colors.keys())
         ic = 0
@@ -231,67 +254,104 @@ class Cavity(ObjectGN, PluginObject):
         )
         return cavities
 
-    def find_cage_spheres(self, distances):
+    def find_cage_spheres(self, distances, pbc=[False, False, False]):
         """
-        Loop all sphere > min
+        Find the largest empty spheres one by one.
+
+        The grid points are kept in a max-heap of the distances. A popped
+        point is skipped if it is inside a sphere found before (lazy
+        invalidation), the grid points inside a new sphere are marked in
+        a boolean mask.
 
         Args:
-            distances (_type_): _description_
+            distances (array): distances from the grid points to the atoms
+            pbc (list): periodic boundary conditions
 
         Returns:
-            _type_: _description_
+            dict: centers and radii of the spheres
         """
-        meshgrids = self.meshgrids
-        imax = np.argmax(distances)
-        dmax = distances[imax]
-        center = meshgrids[imax]
-        # refine center
-        center, dmax = self.refine_spheres(center)
+        import heapq
+
+        excluded = np.zeros(self.shape, dtype=bool)
+        candidates = np.where(distances > self.minCave)[0]
+        heap = list(zip(-distances[candidates], candidates))
+        heapq.heapify(heap)
         centers = []
         radii = []
-        while dmax > self.minCave:
+        while heap:
+            _, imax = heapq.heappop(heap)
+            if excluded.flat[imax]:
+                continue
+            center, dmax = self.refine_spheres(self.meshgrids[imax])
+            if dmax <= self.minCave:
+                break
             centers.append(center)
             radii.append(dmax)
-            n = len(distances)
-            mask = np.ones(n, dtype=bool)
-            indices1 = self.query_radius(meshgrids, [center], [dmax])
-            mask[imax] = False
-            mask[indices1] = False
-            distances = distances[mask]
-            meshgrids = meshgrids[mask]
-            imax = np.argmax(distances)
-            dmax = distances[imax]
-            center = meshgrids[imax]
-            center, dmax = self.refine_spheres(center)
-            # print(center, dmax)
-        spheres = {"centers": np.array(centers), "radii": np.array(radii)}
-        # print('spheres: ', spheres)
+            excluded.flat[imax] = True
+            self.exclude_sphere(excluded, center, dmax, pbc)
+        spheres = {
+            "centers": np.array(centers).reshape(-1, 3),
+            "radii": np.array(radii),
+        }
         return spheres
 
-    def check_sphere_boundary(self, spheres0, cell):
+    def exclude_sphere(self, excluded, center, radius, pbc=[False, False, False]):
+        """Mark the grid points inside the sphere, the grid points are
+        wrapped along the periodic directions.
+
+        Args:
+            excluded (array): boolean mask with the shape of the grid
+            center (array): center of the sphere
+            radius (float): radius of the sphere
+            pbc (list): periodic boundary conditions
+        """
+        cell = np.array(self.batoms.cell.array)
+        npoint = np.array(self.shape)
+        volume = abs(np.linalg.det(cell))
+        heights = volume / np.linalg.norm(
+            np.cross(cell[[1, 2, 0]], cell[[2, 0, 1]]), axis=1
+        )
+        index = np.linalg.solve(cell.T, center) * npoint
+        half = np.ceil(radius / heights * npoint).astype(int) + 1
+        ranges = []
+        for i in range(3):
+            grid = np.arange(-half[i], half[i] + 1) + int(np.floor(index[i]))
+            if not pbc[i]:
+                grid = grid[(grid >= 0) & (grid < npoint[i])]
+            ranges.append(grid)
+        # cartesian positions of the grid points, relative to the center
+        vectors = [
+            (ranges[i] / npoint[i])[:, None] * cell[i] - center / 3 for i in range(3)
+        ]
+        vectors = (
+            vectors[0][:, None, None, :]
+            + vectors[1][None, :, None, :]  # noqa: W503
+            + vectors[2][None, None, :, :]  # noqa: W503
+        )
+        inside = np.sum(vectors**2, axis=-1) <= radius**2
+        i, j, k = np.nonzero(inside)
+        excluded[
+            ranges[0][i] % npoint[0], ranges[1][j] % npoint[1], ranges[2][k] % npoint[2]
+        ] = True
+
+    def check_sphere_boundary(self, spheres0, cell, pbc=[False, False, False]):
         """Remove sphere contact with boundary
         distance to cell < radius
+
+        Only the faces of the non-periodic directions are checked.
         """
         from batoms.neighborlist import pointCellDistance
 
-        centers = []
-        radii = []
-        if len(spheres0["centers"]) == 0:
-            spheres = {"centers": np.array(centers), "radii": np.array(radii)}
-            return spheres
-
+        if len(spheres0["centers"]) == 0 or all(pbc):
+            return spheres0
         dis = pointCellDistance(spheres0["centers"], cell)
-        # print('pointCellDistance: ', d)
-
-        ns = len(spheres0["centers"])
-        for i in range(ns):
-            dmin = np.min(dis[:, :, i])
-            # print(dmin, spheres0['radii'][i])
-            if dmin > spheres0["radii"][i]:
-                centers.append(spheres0["centers"][i])
-                radii.append(spheres0["radii"][i])
-        spheres = {"centers": np.array(centers), "radii": np.array(radii)}
-        # print('spheres after check boundary: ', spheres)
+        dis = dis[~np.array(pbc, dtype=bool)]
+        dmin = np.min(dis, axis=(0, 1))
+        mask = dmin > spheres0["radii"]
+        spheres = {
+            "centers": spheres0["centers"][mask],
+            "radii": spheres0["radii"][mask],
+        }
         return spheres
 
     def refine_spheres(self, center):
@@ -300,7 +360,11 @@ class Cavity(ObjectGN, PluginObject):
         Find center off meshgrids.
 
         Args:
-            spheres (_type_): _description_
+            center (array): center on the meshgrids
+
+        Returns:
+            center (array): refined center
+            radius (float): radius of the sphere
         """
         # make dense meshgrid ground centers of spheres
         npoint = [5, 5, 5]
@@ -315,7 +379,45 @@ class Cavity(ObjectGN, PluginObject):
         indices, distances = self.query_distance(meshgrids)
         imax = np.argmax(distances)
         radius = distances[imax]
-        return center, radius
+        return meshgrids[imax], radius
+
+    def find_spheres(self):
+        """Find the empty spheres of the structure.
+
+        Returns:
+            dict: centers and radii of the spheres
+        """
+        arrays = self.batoms.arrays
+        cell = self.batoms.cell
+        pbc = self.batoms.pbc
+        self.build_grid(cell, self.resolution)
+        indices, distances = self.calc_grid_distances(
+            arrays["positions"], cell.array, pbc
+        )
+        spheres = self.find_cage_spheres(distances, pbc)
+        spheres = self.check_sphere_boundary(spheres, cell, pbc)
+        return spheres
+
+    def calc_pore_size_distribution(self, bins=20, spheres=None):
+        """Pore size distribution, the volume of the spheres as a function
+        of their diameters.
+
+        Args:
+            bins (int or array): bins of the diameters, see np.histogram
+            spheres (dict): spheres, default is find_spheres()
+
+        Returns:
+            diameters (array): centers of the bins
+            volumes (array): volume of the spheres in each bin
+        """
+        if spheres is None:
+            spheres = self.find_spheres()
+        radii = spheres["radii"]
+        volumes, edges = np.histogram(
+            2 * radii, bins=bins, weights=4 / 3 * np.pi * radii**3
+        )
+        diameters = (edges[:-1] + edges[1:]) / 2
+        return diameters, volumes
 
     def build_object(self, cavity_datas, attributes={}):
         """Build the main Batoms object
@@ -438,13 +540,8 @@ class Cavity(ObjectGN, PluginObject):
         """ """
         # if len(arrays['positions']) == 0:
         #     return
-        attributes = self.attributes
         # same length
-        dnvert = len(arrays["species_index"]) - len(attributes["species_index"])
-        if dnvert > 0:
-            self.add_vertices_bmesh(dnvert)
-        elif dnvert < 0:
-            self.delete_vertices_bmesh(range(-dnvert))
+        self.resize_vertices(len(arrays["species_index"]))
         self.set_trajectory(arrays)
         self.set_attributes({"species_index": arrays["species_index"]})
         self.set_attributes({"scale": arrays["scale"]})
@@ -282,14 +282,8 @@ class Highlight(ObjectGN, PluginObject):
         """ """
         # if len(arrays['positions']) == 0:
         #     return
-        attributes = self.attributes
-        print(arrays)
         # same length
-        dnvert = len(arrays["select_index"]) - len(attributes["select_index"])
-        if dnvert > 0:
-            self.add_vertices_bmesh(dnvert)
-        elif dnvert < 0:
-            self.delete_vertices_bmesh(range(-dnvert))
+        self.resize_vertices(len(arrays["select_index"]))
         self.set_trajectory(arrays)
         self.set_attributes({"select_index": arrays["select_index"]})
         self.set_attributes({"scale": arrays["scale"]})
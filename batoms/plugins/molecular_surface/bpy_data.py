@@ -30,6 +30,11 @@ class MolecularSurfaceSetting(Base):
     probe: FloatProperty(name="probe", soft_min=0.4, soft_max=2, default=1.4)
     resolution: FloatProperty(name="resolution", soft_min=0.2, soft_max=2, default=0.5)
     select: StringProperty(name="select", default="all")
+    narrow_band: BoolProperty(
+        name="narrow_band",
+        description="Evaluate the grid only near the surface, in bricks",
+        default=False,
+    )
     color: FloatVectorProperty(
         name="color", size=4, subtype="COLOR", min=0, max=1, default=[0, 1, 1, 1.0]
     )
@@ -76,6 +81,7 @@ class MolecularSurfaceSetting(Base):
             "probe": self.probe,
             "resolution": self.resolution,
             "select": self.select,
+            "narrow_band": self.narrow_band,
             "material_style": self.material_style,
         }
         return setdict
@@ -109,7 +115,13 @@ class MolecularSurface(bpy.types.PropertyGroup):
     )
 
     ui_list_index: IntProperty(name="ui_list_index", default=0)
+    workers: IntProperty(
+        name="workers",
+        description="Number of threads, 0 uses the add-on preferences",
+        default=0,
+        min=0,
+    )
 
     def as_dict(self) -> dict:
-        setdict = {}
+        setdict = {"workers": self.workers}
         return setdict
@@ -71,9 +71,24 @@ class MolecularSurface(BaseObject):
             if ms_name.upper() != "ALL" and ms.name != ms_name:
                 continue
             if ms.type == "SAS":
-                self.draw_SAS(ms)
+                self.draw_SAS(ms, parallel=self.workers)
             elif ms.type == "SES":
-                self.draw_SES(ms)
+                self.draw_SES(ms, parallel=self.workers)
+
+    @property
+    def workers(self):
+        return self.get_workers()
+
+    @workers.setter
+    def workers(self, value):
+        self.settings.bpy_data.workers = value
+
+    def get_workers(self):
+        """Number of threads, 0 uses the add-on preferences,
+        and then all CPUs."""
+        from batoms.utils.butils import get_workers
+
+        return get_workers(self.settings.bpy_data.workers)
 
     @property
     def sas_objs(self):
@@ -150,6 +165,96 @@ class MolecularSurface(BaseObject):
         logger.debug("Marching_cube: %s" % (time() - tstart))
         return isosurface
 
+    def build_bricks(
+        self, positions, radii, resolution, inner_radii=None, brick_size=8
+    ):
+        """
+        Split the box into bricks of brick_size**3 cells, and find the
+        active bricks, see surface.find_bricks.
+
+        Returns:
+            array: grid indices of the origin of the active bricks
+        """
+        from .surface import find_bricks
+
+        return find_bricks(
+            positions,
+            radii,
+            self.box,
+            resolution,
+            inner_radii=inner_radii,
+            brick_size=brick_size,
+        )
+
+    def calc_isosurface_narrow_band(
+        self,
+        bricks,
+        func,
+        level,
+        resolution,
+        brick_size=8,
+        chunk_size=100000,
+        parallel=1,
+    ):
+        """
+        Computes an isosurface only on the active bricks of the box,
+        see surface.isosurface_narrow_band.
+
+        Parameters:
+        bricks: np.array
+            grid indices of the origin of the active bricks
+        func: function
+            volume value of the points
+        level: float
+        resolution: float
+            spacing of the grid
+        """
+        from .surface import isosurface_narrow_band
+
+        vertices, faces = isosurface_narrow_band(
+            bricks,
+            func,
+            level,
+            resolution,
+            self.box_origin,
+            brick_size=brick_size,
+            chunk_size=chunk_size,
+            workers=parallel,
+        )
+        return self.build_isosurface(vertices, faces)
+
+    def build_isosurface(self, vertices, faces):
+        """
+        isosurface data of the vertices and faces
+        """
+        isosurface = {
+            "vertices": vertices,
+            "edges": [],
+            "faces": list(faces),
+            "battr_inputs": {"Bmolecularsurface": {}},
+        }
+        return isosurface
+
+    def calc_SAS_narrow_band(
+        self, positions, radii, resolution, brick_size=8, parallel=1
+    ):
+        """
+        SAS isosurface = 5 of the power distance, evaluated on the active
+        bricks of the box, in a thread pool.
+        """
+        from .surface import calc_sas
+
+        vertices, faces = calc_sas(
+            positions,
+            radii,
+            resolution,
+            narrow_band=True,
+            box=self.box,
+            brick_size=brick_size,
+            workers=parallel,
+        )
+        return self.build_isosurface(vertices, faces)
+
     def draw_SAS(self, ms, parallel=1):
         """
         1) Generate meshgrids
@@ -157,6 +262,7 @@ class MolecularSurface(BaseObject):
         3) Marching cube find isosurface = 5
         """
         from batoms.draw import draw_surface_from_vertices
+        from .surface import calc_sas
 
         resolution = ms.resolution
         probe = ms.probe
@@ -167,16 +273,14 @@ class MolecularSurface(BaseObject):
             return
         radii = np.array(self.batoms.radii_vdw[indices]) + probe
         positions = self.batoms.positions[indices]
-        self.get_box(positions, padding=max(radii) + resolution)
-        self.build_grid(resolution=resolution)
-        logger.debug("Grid Points: %s %s %s" % self.shape)
-        indices_sas, volume_sas = self.calc_power_distance(
-            self.meshgrids, positions, radii, parallel=parallel
-        )
-        volume = volume_sas.reshape(self.shape)
-        isosurface = self.calc_isosurface(
-            volume, 5, spacing=self.get_space(resolution), origin=self.box_origin
+        vertices, faces = calc_sas(
+            positions,
+            radii,
+            resolution,
+            narrow_band=ms.narrow_band,
+            workers=parallel,
         )
+        isosurface = self.build_isosurface(vertices, faces)
         isosurface["color"] = ms.color
         isosurface["material_style"] = ms.material_style
         logger.debug("Vertices: %s" % len(isosurface["vertices"]))
@@ -197,7 +301,9 @@ class MolecularSurface(BaseObject):
             if ms.color_by.upper() == "ELECTROSTATIC_POTENTIAL":
                 if "charges" not in self.batoms.obj.data.attributes:
                     self.batoms.auto_assign_charge()
-                data = self.batoms.calc_electrostatic_potential(isosurface["vertices"])
+                data = self.batoms.calc_electrostatic_potential(
+                    isosurface["vertices"], dtype=np.float32
+                )
             else:
                 # using volumetric_data
                 # scaled positions
@@ -236,27 +342,11 @@ class MolecularSurface(BaseObject):
         obj.batoms.label = self.batoms.label
         logger.debug("Draw SAS: %s" % (time() - tstart))
 
-    def draw_SES(self, ms, parallel=1):
+    def calc_SES(self, positions, radii_vdw, probe, resolution, parallel=1):
         """
-        1) Get SAS
-        2) Point probe sphere on vertices of SAS mesh
-        3) Calculate power distance of grids
-        4) value outside SAS set a value smaller than 5
-        5) Marching cube find isosurface = 5
+        SES isosurface on the dense grid of the box.
         """
-        from batoms.draw import draw_surface_from_vertices
-
-        resolution = ms.resolution
-        probe = ms.probe
-        logger.debug("Resolution: {:1.3f}, Probe: {:1.3}".format(resolution, probe))
-        tstart = time()
-        indices = self.batoms.selects[ms.select].indices
-        if len(indices) == 0:
-            return
-        radii_vdw = np.array(self.batoms.radii_vdw[indices])
         radii = radii_vdw + probe
-        positions = self.batoms.positions[indices]
-        self.get_box(positions, padding=max(radii) + resolution + probe)
         self.build_grid(resolution=resolution)
         # draw_vertices('meshgrid', self.meshgrids)
         logger.debug("Grid Points: %s %s %s" % self.shape)
@@ -295,6 +385,92 @@ class MolecularSurface(BaseObject):
         isosurface = self.calc_isosurface(
             volume, 5, self.get_space(resolution), origin=self.box_origin
         )
+        return isosurface
+
+    def calc_SES_narrow_band(
+        self,
+        positions,
+        radii_vdw,
+        probe,
+        resolution,
+        brick_size=8,
+        parallel=1,
+    ):
+        """
+        SES isosurface evaluated on the active bricks, in a thread pool.
+        Same volume as calc_SES: 4 outside SAS, 6 inside the SAS with
+        probe = -resolution, and the power distance to the probe spheres
+        on the SAS vertices in between.
+        """
+        from scipy import spatial
+
+        radii = radii_vdw + probe
+        isosurface = self.calc_SAS_narrow_band(
+            positions, radii, resolution, brick_size, parallel
+        )
+        vertices = isosurface["vertices"]
+        if len(vertices) == 0:
+            return isosurface
+        tree_sas = self.build_power_tree(positions, radii)
+        tree_sas1 = self.build_power_tree(positions, radii_vdw - resolution)
+        tree_ses = self.build_power_tree(vertices, np.ones(len(vertices)) * probe)
+
+        def func(points):
+            volume_sas = self.query_power_distance(tree_sas, points)[1]
+            volume = np.where(volume_sas > 5, 4, volume_sas)
+            indices = np.where(volume_sas < 5)[0]
+            volume_sas1 = self.query_power_distance(tree_sas1, points[indices])[1]
+            volume[indices[volume_sas1 < 5]] = 6
+            indices = indices[volume_sas1 > 5]
+            volume[indices] = self.query_power_distance(tree_ses, points[indices])[1]
+            return volume
+
+        bricks = self.build_bricks(
+            positions,
+            radii,
+            resolution,
+            inner_radii=radii_vdw - resolution,
+            brick_size=brick_size,
+        )
+        # the SES is within probe of the SAS vertices, the bricks far from
+        # them are inside the SES.
+        length = resolution * brick_size
+        centers = self.box_origin + (bricks + brick_size / 2) * resolution
+        distance, _ = spatial.KDTree(vertices).query(centers, workers=parallel)
+        bricks = bricks[distance < probe + np.sqrt(3) * length / 2 + resolution]
+        return self.calc_isosurface_narrow_band(
+            bricks, func, 5, resolution, brick_size=brick_size, parallel=parallel
+        )
+
+    def draw_SES(self, ms, parallel=1):
+        """
+        1) Get SAS
+        2) Point probe sphere on vertices of SAS mesh
+        3) Calculate power distance of grids
+        4) value outside SAS set a value smaller than 5
+        5) Marching cube find isosurface = 5
+        """
+        from batoms.draw import draw_surface_from_vertices
+
+        resolution = ms.resolution
+        probe = ms.probe
+        logger.debug("Resolution: {:1.3f}, Probe: {:1.3}".format(resolution, probe))
+        tstart = time()
+        indices = self.batoms.selects[ms.select].indices
+        if len(indices) == 0:
+            return
+        radii_vdw = np.array(self.batoms.radii_vdw[indices])
+        radii = radii_vdw + probe
+        positions = self.batoms.positions[indices]
+        self.get_box(positions, padding=max(radii) + resolution + probe)
+        if ms.narrow_band:
+            isosurface = self.calc_SES_narrow_band(
+                positions, radii_vdw, probe, resolution, parallel=parallel
+            )
+        else:
+            isosurface = self.calc_SES(
+                positions, radii_vdw, probe, resolution, parallel=parallel
+            )
         isosurface["color"] = ms.color
         isosurface["material_style"] = ms.material_style
         logger.debug("Vertices: %s" % len(isosurface["vertices"]))
@@ -328,26 +504,134 @@ class MolecularSurface(BaseObject):
         print("Area: {:5.3f},    Volume: {:5.3f}".format(area, volume))
         return area, volume
 
-    def get_psasa(self):
-        """ """
-        me = self.sas_objs.data
-        npoly = len(me.polygons)
-        areas = np.zeros(npoly)
-        me.polygons.foreach_get("area", areas)
-        pareas = {}
+    def get_psasa(self, select="all", probe=1.4):
+        """Per-atom SASA of the current positions, calculated by the
+        Shrake-Rupley algorithm, without meshing the surface."""
+        from .sasa import shrake_rupley
+
+        indices = self.batoms.selects[select].indices
         arrays = self.batoms.arrays
-        positions = arrays["positions"]
         symbols = arrays["species"]
-        natom = len(positions)
-        radii = np.array(self.batoms.radii_vdw) + self.probe
-        atom_indices, distance = self.map_face_to_atom(me, positions, radii)
-        for j in range(natom):
-            parea = np.sum(areas[atom_indices == j])
+        radii = np.array(self.batoms.radii_vdw[indices])
+        areas = shrake_rupley(arrays["positions"][indices], radii, probe=probe)
+        pareas = {}
+        for j, parea in zip(indices, areas):
             pareas[j] = [symbols[j], parea]
             print("species: {}, area: {:1.3f}".format(symbols[j], parea))
-        # print(pareas_list)
         return pareas
 
+    def get_trajectory(self, frames=None):
+        """Positions of the frames, read from the trajectory store of
+        the batoms, without changing the frame of the scene."""
+        trajectory = self.batoms.get_trajectory()["positions"]
+        if len(trajectory) == 0:
+            trajectory = self.batoms.positions[None]
+        if frames is not None:
+            trajectory = trajectory[np.atleast_1d(frames)]
+        return trajectory
+
+    def calc_psasa(
+        self,
+        select="all",
+        probe=1.4,
+        npoint=100,
+        frames=None,
+        by_residue=False,
+        attribute=None,
+    ):
+        """Per-atom SASA of every frame of the trajectory, calculated by
+        the Shrake-Rupley algorithm, without meshing the surface.
+
+        Args:
+            select (str): name of the select
+            probe (float): radius of the probe
+            npoint (int): number of points on the sphere of each atom
+            frames (list): indices of the frames, default is all frames
+            by_residue (bool): sum the SASA of the atoms of each residue
+            attribute (str): name of the attribute of the atoms to save
+                the SASA of the current frame, the other atoms are 0.
+
+        Returns:
+            array: (nframe, n) SASA of the selected atoms. If by_residue,
+                the residues and the (nframe, nres) SASA of the residues.
+        """
+        from .sasa import shrake_rupley_trajectory, residue_areas
+
+        indices = self.batoms.selects[select].indices
+        radii = np.array(self.batoms.radii_vdw[indices])
+        trajectory = self.get_trajectory(frames)
+        areas = shrake_rupley_trajectory(
+            trajectory[:, indices], radii, probe, npoint, workers=self.workers
+        )
+        if attribute is not None:
+            self.set_frame_attribute(attribute, areas, indices, frames)
+        if not by_residue:
+            return areas
+        arrays = self.batoms.arrays
+        if "residuenumbers" not in arrays:
+            raise KeyError("residuenumbers is not exist.")
+        chainids = arrays["chainids"][indices] if "chainids" in arrays else None
+        return residue_areas(areas, arrays["residuenumbers"][indices], chainids)
+
+    def set_frame_attribute(self, name, values, indices, frames=None):
+        """Save the values of the current frame of the scene to an
+        attribute of the atoms.
+
+        The frame of the scene is mapped to the index of the trajectory
+        by the start frame of the trajectory. If the values of this index
+        are not calculated, the attribute is not changed.
+
+        Args:
+            name (str): name of the attribute
+            values (array): (nframe, n) values of the selected atoms
+            indices (array): indices of the selected atoms
+            frames (list): indices of the frames of the values
+        """
+        frame = bpy.context.scene.frame_current
+        frame -= self.batoms.obj.batoms.trajectory_frame_start
+        if frames is None:
+            frames = np.arange(len(values))
+        i = np.flatnonzero(np.atleast_1d(frames) == frame)
+        if len(i) == 0:
+            logger.warning(
+                "Frame %s is not in the calculated frames, %s is not set."
+                % (frame, name)
+            )
+            return
+        data = np.zeros(len(self.batoms), dtype=np.float32)
+        data[indices] = values[i[0]]
+        self.batoms.set_attributes({name: data})
+
+    def calc_sas_trajectory(self, name="1", frames=None, processes=False):
+        """Area and volume of the SAS of every frame of the trajectory.
+
+        The frames are read from the trajectory store and evaluated in a
+        pool of workers, the scene and the depsgraph are not used.
+
+        Args:
+            name (str): name of the molecular surface setting
+            frames (list): indices of the frames, default is all frames
+            processes (bool): use a process pool instead of a thread pool
+
+        Returns:
+            array: (nframe,) area of the SAS
+            array: (nframe,) volume of the SAS
+        """
+        from .surface import sas_trajectory
+
+        ms = self.settings[name]
+        indices = self.batoms.selects[ms.select].indices
+        radii = np.array(self.batoms.radii_vdw[indices]) + ms.probe
+        trajectory = self.get_trajectory(frames)
+        return sas_trajectory(
+            trajectory[:, indices],
+            radii,
+            ms.resolution,
+            narrow_band=ms.narrow_band,
+            workers=self.workers,
+            processes=processes,
+        )
+
     def get_sesa(self, name):
         """ """
         from batoms.utils.butils import get_area, get_volume
@@ -369,64 +653,38 @@ class MolecularSurface(BaseObject):
         # print('SAS to mesh evaluated: %s' % (time() - tstart))
         return me
 
-    def get_sasa_mb(self, frame_indices=[]):
-        """ """
-        from batoms.utils.butils import get_area, get_volume
-
+    def get_sasa_mb(self, frame_indices=[], name="1"):
+        """Area and volume of the SAS of the frames, calculated from the
+        trajectory without changing the frame of the scene."""
         if isinstance(frame_indices, int):
             frame_indices = [frame_indices]
         if frame_indices == []:
-            frame_indices = range(self.nframe)
-        areas_list = []
-        pareas_list = []
-        tstart = time()
+            frame_indices = None
+        areas, volumes = self.calc_sas_trajectory(name, frames=frame_indices)
+        if frame_indices is None:
+            frame_indices = range(len(areas))
         print("Frame    SAS Area    SAS Volume")
-        for i in frame_indices:
-            bpy.context.scene.frame_set(i)
-            me = self.to_mesh()
-            area = get_area(me)
-            volume = get_volume(me)
+        for i, area, volume in zip(frame_indices, areas, volumes):
             print("{:4d}  {:11.3f}  {:11.3f}".format(i, area, volume))
-            areas_list.append(area)
-        logger.debug("Time for SAS area: %s" % (time() - tstart))
-        return areas_list, pareas_list
+        return list(areas), list(volumes)
 
-    def get_psasa_mb(self, frame_indices=[]):
-        """ """
+    def get_psasa_mb(self, frame_indices=[], probe=1.4):
+        """Per-atom SASA of the frames, calculated by the Shrake-Rupley
+        algorithm, without meshing the surface."""
         if isinstance(frame_indices, int):
             frame_indices = [frame_indices]
         if frame_indices == []:
-            frame_indices = range(self.nframe)
+            frame_indices = None
+        areas = self.calc_psasa(probe=probe, frames=frame_indices)
+        symbols = self.batoms.arrays["species"]
         pareas_list = []
-        radii = np.array(self.batoms.radii_vdw) + self.probe
-        for i in frame_indices:
-            bpy.context.scene.frame_set(i)
-            me = self.to_mesh()
-            npoly = len(me.polygons)
-            areas = np.zeros(npoly)
-            me.polygons.foreach_get("area", areas)
+        for frame_areas in areas:
             pareas = {}
-            atoms = self.batoms.atoms
-            positions = atoms.positions
-            symbols = atoms.get_chemical_symbols()
-            natom = len(positions)
-            atom_indices, distance = self.map_face_to_atom(me, positions, radii)
-            for j in range(natom):
-                parea = np.sum(areas[atom_indices == j])
+            for j, parea in enumerate(frame_areas):
                 pareas[j] = [symbols[j], parea]
             pareas_list.append(pareas)
-        # print(pareas_list)
         return pareas_list
 
-    def map_face_to_atom(self, me, positions, radii, k=1):
-        """ """
-        npoly = len(me.polygons)
-        centers = np.zeros(npoly * 3)
-        me.polygons.foreach_get("center", centers)
-        centers = centers.reshape(-1, 3)
-        indices, distance = self.calc_power_distance(centers, positions, radii, k=k)
-        return indices, distance
-
     def map_vertice_to_atom(self, me, positions, radii, k=1):
         """ """
         nvertice = len(me.vertice)
@@ -462,22 +720,29 @@ class MolecularSurface(BaseObject):
         Use KDTree to find the nearest atom for all vertices with
         the power distance as metric.
         """
-        from scipy import spatial
+        tree = self.build_power_tree(positions, radii)
+        return self.query_power_distance(tree, points, k=k, parallel=parallel)
+
+    def build_power_tree(self, positions, radii):
+        """
+        Change to 4-dimension to set power distance, and build the
+        KDTree of the atoms.
+        """
+        from .surface import build_power_tree
 
         tstart = time()
-        npoint = len(points)
-        # ----------------------------------------------------
-        # change to 4-dimension to set power distance
-        points = np.append(points, np.zeros((npoint, 1)), axis=1)
-        # maxr = max(max(radii), 5)
-        maxr = 5
-        radii = np.sqrt(maxr * maxr - np.square(radii)).reshape(-1, 1)
-        positions = np.append(positions, radii, axis=1)
-        tstart = time()
-        tree = spatial.KDTree(positions)
+        tree = build_power_tree(positions, radii)
         logger.debug("KDTree positions: %s" % (time() - tstart))
+        return tree
+
+    def query_power_distance(self, tree, points, k=1, parallel=1):
+        """
+        Query the nearest atoms of the points with the power distance.
+        """
+        from .surface import query_power_distance
+
         tstart = time()
-        distance, indices = tree.query(points, k=k, workers=parallel)
+        indices, distance = query_power_distance(tree, points, k=k, workers=parallel)
         logger.debug("KDTree query: %s" % (time() - tstart))
         return indices, distance
 
@@ -787,74 +1052,6 @@ class MolecularSurface(BaseObject):
         print("SES: area: {:1.3f}, volume: {:1.3f}".format(area, volume))
         return area, volume
 
-    def build_SAS_Shrake_Rupley(self, probe=1.4, subdivisions=2):
-        """
-        Algorithm: ShrakeRupley
-        """
-        default_colors = [(0.2, 0.1, 0.9, 1.0), (0.0, 0.0, 1.0, 1.0)]
-        #
-        tstart = time()
-        self.probe = probe
-        atoms = self.batoms
-        positions = atoms.positions
-        radii = np.array(self.batoms.radii_vdw) + self.probe
-        na = len(positions)
-        #
-        tstart = time()
-        bpy.ops.mesh.primitive_ico_sphere_add(subdivisions=subdivisions)
-        # bpy.ops.mesh.primitive_cylinder_add()
-        source = bpy.context.view_layer.objects.active
-        me = source.data
-        n = len(me.vertices)
-        sphere0 = np.empty(n * 3, dtype=np.float64)
-        me.vertices.foreach_get("co", sphere0)
-        sphere0 = sphere0.reshape((n, 3))
-        spheres = np.tile(sphere0, (na, 1, 1))
-        #
-        radii = np.array(radii).reshape(-1, 1)
-        scales = radii
-        scales = np.concatenate((scales, scales, scales), axis=1)
-        spheres = spheres * scales[:, None]
-        #
-        origini = positions
-        spheres += origini[:, None]
-        logger.debug("build_spheres: {0:10.2f} s".format(time() - tstart))
-        #
-        spheres = spheres.reshape(-1, 3)
-        indices, distances = self.calc_power_distance(spheres, positions, radii)
-        mask = np.where(distances > 4.98)
-        spheres = spheres[mask]
-        #
-        # tstart1 = time()
-        faces = []
-        """
-        # tri = spatial.Delaunay(spheres)
-        # faces = tri.simplices
-        tree = spatial.KDTree(spheres)
-        logger.debug('KDTree positions: %s'%(time() - tstart))
-        distance, indices = tree.query(spheres, k = 3)
-        indices0 = np.arange(len(spheres))
-        indices0 = indices0.reshape(-1, 1)
-        faces = np.concatenate((indices0, indices[:, 1:]), axis = 1)
-        faces = faces.tolist()
-        logger.debug('build_faces: %s'%(time() - tstart1))
-        """
-        #
-        SAS_Shrake_Rupley = {
-            "vertices": spheres.reshape(-1, 3),
-            "edges": [],
-            # 'faces': [],
-            "faces": faces,
-            # 'faces': list(tri.simplices),
-            "color": default_colors[0],
-            "battr_inputs": {},
-        }
-        logger.debug("vertices: ", len(SAS_Shrake_Rupley["vertices"]))
-        logger.debug("build_SAS: %s" % (time() - tstart))
-        self.SAS_Shrake_Rupley = SAS_Shrake_Rupley
-        bpy.data.objects.remove(source, do_unlink=True)
-        # return 0
-
     @property
     def setting(self):
         from batoms.utils import deprecated
@@ -0,0 +1,162 @@
+"""
+Solvent accessible surface area (SASA) with the Shrake-Rupley algorithm.
+
+The functions only use NumPy and SciPy, they do not need a mesh of the
+surface.
+
+1) Each atom is covered by the points of a Fibonacci sphere with radius
+   r_vdw + probe.
+2) The neighbors of each atom are found by a KDTree.
+3) A point of atom i is buried by neighbor j if it is inside the sphere of
+   j. For all points and a batch of neighbor pairs, this is one matrix
+   product: |p_i + R_i s - p_j| < R_j  <=>  s.(p_i - p_j) < t_ij
+4) The area of atom i is 4 pi R_i^2 times the fraction of exposed points.
+"""
+
+import numpy as np
+from time import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def fibonacci_sphere(npoint=100):
+    """Points evenly distributed on the unit sphere."""
+    golden_angle = np.pi * (3 - np.sqrt(5))
+    i = np.arange(npoint)
+    z = 1 - (2 * i + 1) / npoint
+    r = np.sqrt(1 - z * z)
+    theta = golden_angle * i
+    return np.column_stack((r * np.cos(theta), r * np.sin(theta), z))
+
+
+def shrake_rupley(
+    positions, radii, probe=1.4, npoint=100, max_size=1e7, dtype=np.float32
+):
+    """Calculate the SASA of each atom.
+
+    Args:
+        positions (array): (n, 3) positions of the atoms
+        radii (array): (n,) van der Waals radii of the atoms
+        probe (float): radius of the probe
+        npoint (int): number of points on the sphere of each atom
+        max_size (int): maximum number of (pair, point) tests in a batch
+        dtype: float type of the occlusion tests
+
+    Returns:
+        array: (n,) SASA of each atom
+    """
+    from scipy.spatial import cKDTree
+
+    positions = np.asarray(positions, dtype=float)
+    radii = np.asarray(radii, dtype=float) + probe
+    natom = len(positions)
+    sphere = fibonacci_sphere(npoint).astype(dtype)
+    if natom == 0:
+        return np.zeros(0)
+    # neighbor pairs (i, j), sorted by i
+    tree = cKDTree(positions)
+    pairs = tree.query_pairs(2 * radii.max(), output_type="ndarray")
+    pairs = np.concatenate((pairs, pairs[:, ::-1]))
+    vectors = positions[pairs[:, 0]] - positions[pairs[:, 1]]
+    d2 = np.sum(vectors**2, axis=1)
+    ri = radii[pairs[:, 0]]
+    rj = radii[pairs[:, 1]]
+    mask = d2 < (ri + rj) ** 2
+    pairs, vectors, d2, ri, rj = (
+        pairs[mask],
+        vectors[mask],
+        d2[mask],
+        ri[mask],
+        rj[mask],
+    )
+    order = np.argsort(pairs[:, 0], kind="stable")
+    pairs, vectors, d2, ri, rj = (
+        pairs[order],
+        vectors[order],
+        d2[order],
+        ri[order],
+        rj[order],
+    )
+    thresholds = ((rj**2 - ri**2 - d2) / (2 * ri)).astype(dtype)
+    vectors = vectors.astype(dtype)
+    # batches of atoms, the pairs of an atom are in one batch
+    counts = np.bincount(pairs[:, 0], minlength=natom)
+    offsets = np.concatenate(([0], np.cumsum(counts)))
+    exposed = np.full(natom, npoint)
+    batch = max(1, int(max_size // npoint))
+    start = 0
+    while start < natom:
+        end = np.searchsorted(offsets, offsets[start] + batch, side="right") - 1
+        end = min(max(end, start + 1), natom)
+        a, b = offsets[start], offsets[end]
+        if b > a:
+            buried = vectors[a:b] @ sphere.T < thresholds[a:b, None]
+            # combine the neighbors of each atom
+            atoms = np.nonzero(counts[start:end])[0] + start
+            buried = np.packbits(buried, axis=1)
+            buried = np.bitwise_or.reduceat(buried, offsets[atoms] - a, axis=0)
+            buried = np.unpackbits(buried, axis=1, count=npoint)
+            exposed[atoms] = npoint - buried.sum(axis=1)
+        start = end
+    return 4 * np.pi * radii**2 * exposed / npoint
+
+
+def shrake_rupley_trajectory(
+    trajectory, radii, probe=1.4, npoint=100, max_size=1e7, workers=1
+):
+    """Calculate the SASA of each atom for every frame.
+
+    Args:
+        trajectory (array): (nframe, n, 3) positions of the atoms
+        radii (array): (n,) van der Waals radii of the atoms
+        probe (float): radius of the probe
+        npoint (int): number of points on the sphere of each atom
+        workers (int): number of threads, the frames are distributed
+            over the threads.
+
+    Returns:
+        array: (nframe, n) SASA of each atom
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    tstart = time()
+
+    def calc(positions):
+        return shrake_rupley(positions, radii, probe, npoint, max_size)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        areas = np.array(list(executor.map(calc, trajectory)))
+    logger.debug("SASA of %s frames: %s" % (len(trajectory), time() - tstart))
+    return areas.reshape(len(trajectory), len(radii))
+
+
+def residue_areas(areas, residuenumbers, chainids=None):
+    """Sum the SASA of the atoms of each residue.
+
+    Args:
+        areas (array): (n,) or (nframe, n) SASA of each atom
+        residuenumbers (array): (n,) residue numbers of the atoms
+        chainids (array): (n,) chain ids of the atoms
+
+    Returns:
+        residues (array): (nres,) residues, "chain-number"
+        areas (array): (nres,) or (nframe, nres) SASA of each residue
+    """
+    residues = np.char.mod("%d", residuenumbers)
+    if chainids is not None:
+        residues = np.char.add(
+            np.char.add(np.asarray(chainids, dtype=str), "-"), residues
+        )
+    residues, first, inverse = np.unique(
+        residues, return_index=True, return_inverse=True
+    )
+    # keep the order of the residues in the structure
+    order = np.argsort(first)
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    inverse = rank[inverse.ravel()]
+    sort = np.argsort(inverse, kind="stable")
+    starts = np.searchsorted(inverse[sort], np.arange(len(residues)))
+    areas = np.add.reduceat(np.asarray(areas)[..., sort], starts, axis=-1)
+    return residues[order], areas
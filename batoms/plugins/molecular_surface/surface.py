@@ -0,0 +1,289 @@
+"""
+Solvent accessible surface (SAS) of the atoms, and of the frames of a trajectory.
+
+The functions only use NumPy, SciPy and scikit-image, they do not touch
+the Blender scene. So the frames can be evaluated in threads or processes
+directly from the trajectory array, instead of setting the frame of the
+scene and evaluating the depsgraph.
+"""
+
+import numpy as np
+from time import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def mesh_area_volume(vertices, faces):
+    """Area and volume of a closed triangle mesh.
+
+    Args:
+        vertices (array): (nvert, 3) vertices
+        faces (array): (nface, 3) indices of the vertices of the triangles
+
+    Returns:
+        float: area
+        float: volume
+    """
+    faces = np.asarray(faces)
+    if len(faces) == 0:
+        return 0.0, 0.0
+    v0, v1, v2 = (vertices[faces[:, i]] for i in range(3))
+    normals = np.cross(v1 - v0, v2 - v0)
+    area = 0.5 * np.linalg.norm(normals, axis=1).sum()
+    volume = abs(np.einsum("ij,ij->", v0, normals)) / 6
+    return area, volume
+
+
+def build_power_tree(positions, radii, maxr=5):
+    """KDTree of the atoms in 4 dimensions, the distance of a point
+    (x, y, z, 0) to an atom is the power distance shifted by maxr**2.
+
+    The SAS is the isosurface = maxr of the distance.
+    """
+    from scipy.spatial import cKDTree
+
+    radii = np.sqrt(maxr * maxr - np.square(radii)).reshape(-1, 1)
+    return cKDTree(np.append(positions, radii, axis=1))
+
+
+def query_power_distance(tree, points, k=1, workers=1):
+    """Query the nearest atoms of the points with the power distance.
+
+    Returns:
+        indices (array): indices of the nearest atoms
+        distance (array): power distance of the points
+    """
+    points = np.append(points, np.zeros((len(points), 1)), axis=1)
+    distance, indices = tree.query(points, k=k, workers=workers)
+    return indices, distance
+
+
+def find_bricks(positions, radii, box, resolution, inner_radii=None, brick_size=8):
+    """Split the box into bricks of brick_size**3 cells, and find the
+    active bricks, which may cross the surface.
+
+    A brick is inactive if it is outside all spheres of radii, or inside
+    one sphere of inner_radii. The test is conservative, an active brick
+    may still be empty.
+
+    Returns:
+        array: grid indices of the origin of the active bricks
+    """
+    from scipy.spatial import cKDTree
+
+    tstart = time()
+    if inner_radii is None:
+        inner_radii = radii
+    length = resolution * brick_size
+    nbrick = np.ceil((box[:, 1] - box[:, 0]) / length).astype(int)
+    bricks = np.indices(nbrick).reshape(3, -1).T
+    # half diagonal of the (brick_size + 1)**3 samples of a brick
+    centers = box[:, 0] + (bricks + 0.5) * length
+    half = np.sqrt(3) * length / 2
+    distance, indices = cKDTree(positions).query(centers)
+    outside = distance >= max(radii) + half
+    inside = distance + half < inner_radii[indices]
+    # the nearest sphere in power distance
+    tree = build_power_tree(positions, inner_radii)
+    indices = query_power_distance(tree, centers)[0]
+    distance = np.linalg.norm(centers - positions[indices], axis=1)
+    inside |= distance + half < inner_radii[indices]
+    bricks = bricks[~(outside | inside)] * brick_size
+    logger.debug(
+        "Active bricks: %s / %s, %s" % (len(bricks), len(centers), time() - tstart)
+    )
+    return bricks
+
+
+def merge_meshes(meshes, resolution, origin):
+    """Merge the meshes of the bricks, the vertices are in grid
+    index units, and the vertices on the shared faces are merged.
+
+    Returns:
+        vertices (array): (nvert, 3) vertices of the surface
+        faces (array): (nface, 3) faces of the surface
+    """
+    if len(meshes) == 0:
+        return np.zeros((0, 3)), np.zeros((0, 3), dtype=int)
+    offsets = np.cumsum([0] + [len(verts) for verts, faces in meshes])
+    verts, inverse = np.unique(
+        np.round(np.concatenate([verts for verts, faces in meshes]), 6),
+        axis=0,
+        return_inverse=True,
+    )
+    faces = np.concatenate(
+        [faces + offset for (verts, faces), offset in zip(meshes, offsets)]
+    )
+    faces = inverse.ravel()[faces]
+    return verts * resolution + origin, faces
+
+
+def isosurface_narrow_band(
+    bricks,
+    func,
+    level,
+    resolution,
+    origin,
+    brick_size=8,
+    chunk_size=100000,
+    workers=1,
+):
+    """Isosurface of func, only on the active bricks.
+
+    The samples shared by the bricks are evaluated once by func, in
+    chunks, the marching cubes runs on each brick, and the vertices on the
+    shared faces of the bricks are merged. The chunks and the bricks are
+    processed in a thread pool.
+
+    Args:
+        bricks (array): grid indices of the origin of the active bricks
+        func (function): volume value of the points
+        level (float): value of the isosurface
+        resolution (float): spacing of the grid
+        origin (array): origin of the grid
+
+    Returns:
+        vertices (array): (nvert, 3) vertices of the surface
+        faces (array): (nface, 3) faces of the surface
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    from skimage import measure
+
+    tstart = time()
+    n = brick_size + 1
+    samples = np.indices((n, n, n)).reshape(3, -1).T
+    if len(bricks) == 0:
+        return merge_meshes([], resolution, origin)
+    shape = bricks.max(axis=0) + n
+    keys = np.ravel_multi_index(
+        (bricks[:, None, :] + samples[None, :, :]).reshape(-1, 3).T, shape
+    )
+    keys, inverse = np.unique(keys, return_inverse=True)
+
+    def evaluate(start):
+        indices = np.array(np.unravel_index(keys[start : start + chunk_size], shape))
+        return func(origin + indices.T * resolution)
+
+    def march(start):
+        meshes = []
+        for brick, volume in zip(
+            bricks[start : start + 64], volumes[start : start + 64]
+        ):
+            if not volume.min() < level < volume.max():
+                continue
+            verts, faces, normals, values = measure.marching_cubes(volume, level=level)
+            meshes.append((verts + brick, faces))
+        return meshes
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        values = executor.map(evaluate, range(0, len(keys), chunk_size))
+        volumes = np.concatenate(list(values))[inverse].reshape(-1, n, n, n)
+        logger.debug("Narrow band points: %s, %s" % (len(keys), time() - tstart))
+        meshes = sum(executor.map(march, range(0, len(bricks), 64)), [])
+    vertices, faces = merge_meshes(meshes, resolution, origin)
+    logger.debug("Marching_cube narrow band: %s" % (time() - tstart))
+    return vertices, faces
+
+
+def calc_sas(
+    positions,
+    radii,
+    resolution=0.5,
+    narrow_band=False,
+    box=None,
+    brick_size=8,
+    workers=1,
+):
+    """SAS of the atoms, isosurface = 5 of the power distance.
+
+    Args:
+        positions (array): (n, 3) positions of the atoms
+        radii (array): (n,) radii of the atoms, van der Waals radii + probe
+        resolution (float): spacing of the grid
+        narrow_band (bool): only evaluate the bricks of the grid which
+            may cross the surface
+        box (array): (3, 2) box of the grid, default is the box of the
+            atoms padded by the largest radius
+        brick_size (int): number of cells of a brick along each axis
+        workers (int): number of threads
+
+    Returns:
+        vertices (array): (nvert, 3) vertices of the surface
+        faces (array): (nface, 3) faces of the surface
+    """
+    from skimage import measure
+    from batoms.utils import get_box, build_grid
+
+    tstart = time()
+    if box is None:
+        box = get_box(positions, padding=max(radii) + resolution)
+    tree = build_power_tree(positions, radii)
+    if narrow_band:
+
+        def func(points):
+            return query_power_distance(tree, points)[1]
+
+        bricks = find_bricks(positions, radii, box, resolution, brick_size=brick_size)
+        return isosurface_narrow_band(
+            bricks,
+            func,
+            5,
+            resolution,
+            box[:, 0],
+            brick_size=brick_size,
+            workers=workers,
+        )
+    meshgrids, shape = build_grid(box, resolution)
+    logger.debug("Grid Points: %s %s %s" % shape)
+    distance = query_power_distance(tree, meshgrids, workers=workers)[1]
+    vertices, faces = measure.marching_cubes(
+        distance.reshape(shape), level=5, spacing=[resolution] * 3
+    )[:2]
+    vertices += box[:, 0]
+    logger.debug("SAS: %s" % (time() - tstart))
+    return vertices, faces
+
+
+def sas_area_volume(positions, radii, resolution=0.5, narrow_band=False):
+    """Area and volume of the SAS of one frame."""
+    return mesh_area_volume(*calc_sas(positions, radii, resolution, narrow_band))
+
+
+def sas_trajectory(
+    trajectory, radii, resolution=0.5, narrow_band=False, workers=1, processes=False
+):
+    """Area and volume of the SAS for every frame.
+
+    Args:
+        trajectory (array): (nframe, n, 3) positions of the atoms
+        radii (array): (n,) radii of the atoms, van der Waals radii + probe
+        resolution (float): spacing of the grid
+        narrow_band (bool): only evaluate the bricks of the grid which
+            may cross the surface
+        workers (int): number of workers, the frames are distributed
+            over the workers.
+        processes (bool): use a process pool instead of a thread pool.
+
+    Returns:
+        array: (nframe,) area of the SAS
+        array: (nframe,) volume of the SAS
+    """
+    from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+    tstart = time()
+    nframe = len(trajectory)
+    Executor = ProcessPoolExecutor if processes else ThreadPoolExecutor
+    with Executor(max_workers=workers) as executor:
+        results = list(
+            executor.map(
+                sas_area_volume,
+                trajectory,
+                [radii] * nframe,
+                [resolution] * nframe,
+                [narrow_band] * nframe,
+            )
+        )
+    results = np.array(results).reshape(nframe, 2)
+    logger.debug("SAS of %s frames: %s" % (nframe, time() - tstart))
+    return results[:, 0], results[:, 1]
@@ -119,6 +119,7 @@ class BATOMS_PT_molecular_surface(Panel):
             sub.prop(kb, "probe", text="Probe")
             sub.prop(kb, "resolution", text="Resolution")
             sub.prop(kb, "select", text="Select")
+            sub.prop(kb, "narrow_band", text="Narrow band")
             col.prop(kb, "material_style", text="material_style")
             col.prop(kb, "color_by", text="Color by")
             if kb.color_by == "None":
@@ -126,6 +127,7 @@ class BATOMS_PT_molecular_surface(Panel):
             else:
                 col.prop(kb, "color1", text="color1")
                 col.prop(kb, "color2", text="color2")
+            col.prop(ba, "workers", text="Workers")
             col.separator()
             op = layout.operator(
                 "surface.molecular_surface_draw", icon="GREASEPENCIL", text="Draw"
@@ -52,6 +52,7 @@ def translate(selected_vertices, displacement, fmax=0.05, steps=5, frame_start=0
     batoms = Batoms(label)
     # Move selected atom with mouse
     atoms = batoms.atoms
+    positions0 = atoms.positions.copy()
     fixed = []
     for label, species, name, index in selected_vertices:
         # batom = Batom(name)
@@ -66,6 +67,9 @@ def translate(selected_vertices, displacement, fmax=0.05, steps=5, frame_start=0
     batoms.set_frames([atoms], frame_start=frame_start)
     # set new positions of atoms
     batoms.positions = atoms
+    # only search the bonds of the moved atoms again
+    moved = np.where(np.any(np.abs(atoms.positions - positions0) > 1e-6, axis=1))[0]
+    batoms.bond.update(indices=moved)
     # batoms.model_style = 1
     # batoms.bondsetting.add(['Al', 'Al'])
     # batoms.draw_bonds()
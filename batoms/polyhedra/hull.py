@@ -0,0 +1,233 @@
+"""Convex hulls of the polyhedra.
+
+The centres with the same coordination number are handled as one batch.
+For the common coordination numbers (4, 6 and 8), the faces are found
+with a table of all the triangles of the vertices: a triangle is a face
+of the hull if all the other vertices are strictly on one side of it.
+A hull whose vertices are all on the surface and whose faces are all
+triangles has 2n - 4 faces, the centres which do not satisfy it, e.g.
+with coplanar faces or an inner vertex, fall back to Qhull.
+"""
+
+import numpy as np
+from itertools import combinations
+import logging
+
+logger = logging.getLogger(__name__)
+
+table_coordinations = [4, 6, 8]
+
+
+def get_face_table(n):
+    """All the triangles of n vertices, and the other vertices of each
+    triangle.
+
+    Returns:
+        triangles (array): (ntri, 3) indices of the vertices
+        others (array): (ntri, n - 3) indices of the other vertices
+    """
+    triangles = np.array(list(combinations(range(n), 3)))
+    others = np.array([sorted(set(range(n)) - set(t)) for t in triangles])
+    return triangles, others
+
+
+def calc_faces_table(vertices, tol=1e-6):
+    """Faces of the convex hulls of a batch of polyhedra with the same
+    number of vertices.
+
+    Args:
+        vertices (array): (m, n, 3) vertices of the polyhedra
+        tol (float): tolerance of the distance to the plane of a face,
+            relative to the size of the polyhedra
+
+    Returns:
+        faces (array): (m, 2n - 4, 3) faces, the normals point outward
+        valid (array): (m,) the faces of the polyhedra are found
+    """
+    m, n = vertices.shape[:2]
+    nface = 2 * n - 4
+    triangles, others = get_face_table(n)
+    centers = vertices.mean(axis=1, keepdims=True)
+    scale = np.abs(vertices - centers).max(axis=(1, 2))
+    v0, v1, v2 = (vertices[:, triangles[:, i]] for i in range(3))
+    normals = np.cross(v1 - v0, v2 - v0)
+    # signed distances of the other vertices to the planes, (m, ntri, n - 3)
+    distances = np.einsum(
+        "mtkj,mtj->mtk", vertices[:, others] - v0[:, :, None], normals
+    )
+    eps = tol * scale[:, None, None] * np.linalg.norm(normals, axis=2)[:, :, None]
+    below = np.all(distances < -eps, axis=2)
+    above = np.all(distances > eps, axis=2)
+    is_face = below | above
+    valid = is_face.sum(axis=1) == nface
+    faces = np.zeros((m, nface, 3), dtype=int)
+    if not valid.any():
+        return faces, valid
+    # flip the triangles with the other vertices above, to point outward
+    oriented = np.where(above[..., None], triangles[:, [0, 2, 1]], triangles)
+    index, itri = np.nonzero(is_face & valid[:, None])
+    faces[valid] = oriented[index, itri].reshape(-1, nface, 3)
+    return faces, valid
+
+
+def calc_faces_qhull(vertices):
+    """Faces of the convex hull by Qhull, None if the hull fails.
+    The normals of the faces point outward."""
+    from scipy.spatial import ConvexHull
+
+    try:
+        hull = ConvexHull(vertices)
+    except Exception as e:
+        logger.error(e)
+        return None
+    faces = hull.simplices
+    # equations are the outward normals of the facets
+    v0, v1, v2 = (vertices[faces[:, i]] for i in range(3))
+    inward = (
+        np.einsum("ij,ij->i", np.cross(v1 - v0, v2 - v0), hull.equations[:, :3]) < 0
+    )
+    faces[inward] = faces[inward][:, [0, 2, 1]]
+    return faces
+
+
+def calc_hulls(vertices, counts, workers=1, batch=10000):
+    """Faces of the convex hulls of the polyhedra.
+
+    Args:
+        vertices (array): (nv, 3) vertices of all polyhedra, the vertices
+            of a polyhedra are contiguous
+        counts (array): number of vertices of each polyhedra
+        workers (int): number of threads for the Qhull fallback
+        batch (int): number of polyhedra in a batch of the face table
+
+    Returns:
+        faces (array): (nf, 3) faces, indices of the vertices
+        owners (array): (nf,) index of the polyhedra of each face
+        valid (array): (npoly,) the hull of the polyhedra is found
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    counts = np.asarray(counts, dtype=int)
+    npoly = len(counts)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1])).astype(int)
+    valid = np.zeros(npoly, dtype=bool)
+    faces = []
+    owners = []
+    fallback = []
+    for n in np.unique(counts):
+        ipoly = np.where(counts == n)[0]
+        if n not in table_coordinations:
+            fallback.append(ipoly)
+            continue
+        for i in range(0, len(ipoly), batch):
+            ipoly1 = ipoly[i : i + batch]
+            indices = starts[ipoly1][:, None] + np.arange(n)
+            faces_n, valid_n = calc_faces_table(vertices[indices])
+            faces.append(
+                (faces_n[valid_n] + starts[ipoly1[valid_n], None, None]).reshape(-1, 3)
+            )
+            owners.append(np.repeat(ipoly1[valid_n], 2 * n - 4))
+            valid[ipoly1[valid_n]] = True
+            fallback.append(ipoly1[~valid_n])
+    fallback = np.concatenate(fallback) if fallback else np.zeros(0, dtype=int)
+    if len(fallback) > 0:
+        logger.debug("Qhull for {} polyhedra".format(len(fallback)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            hulls = executor.map(
+                calc_faces_qhull,
+                [vertices[starts[i] : starts[i] + counts[i]] for i in fallback],
+            )
+            for i, face in zip(fallback, hulls):
+                if face is None:
+                    continue
+                faces.append(face + starts[i])
+                owners.append(np.full(len(face), i))
+                valid[i] = True
+    if len(faces) == 0:
+        return np.zeros((0, 3), dtype=int), np.zeros(0, dtype=int), valid
+    return np.concatenate(faces), np.concatenate(owners), valid
+
+
+def faces_to_edges(faces):
+    """Unique edges of the triangles."""
+    edges = np.asarray(faces)[:, [[0, 1], [0, 2], [1, 2]]].reshape(-1, 2)
+    return np.unique(np.sort(edges, axis=1), axis=0)
+
+
+def calc_hulls_symmetry(
+    vertices, counts, centers, rotations, sources, workers=1, tol=1e-2
+):
+    """Faces of the convex hulls of the polyhedra, using the symmetry.
+
+    Only the hulls of the source polyhedra are calculated. The vertices
+    of the other polyhedra are matched to the rotated vertices of their
+    source, and the faces of the source are copied.
+
+    Args:
+        vertices (array): (nv, 3) vertices of all polyhedra, the vertices
+            of a polyhedra are contiguous
+        counts (array): number of vertices of each polyhedra
+        centers (array): (npoly, 3) centers of the polyhedra
+        rotations (array): (npoly, 3, 3) rotations which map the vertices
+            of the source to the polyhedra, v = v_source @ rotation
+        sources (array): (npoly,) index of the source of each polyhedra
+        workers (int): number of threads for the Qhull fallback
+        tol (float): tolerance of the distance of the matched vertices
+
+    Returns:
+        faces (array): (nf, 3) faces, indices of the vertices
+        owners (array): (nf,) index of the polyhedra of each face
+        valid (array): (npoly,) the hull of the polyhedra is found
+    """
+    counts = np.asarray(counts, dtype=int)
+    npoly = len(counts)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1])).astype(int)
+    relative = vertices - np.repeat(centers, counts, axis=0)
+    valid = np.zeros(npoly, dtype=bool)
+    faces = []
+    owners = []
+    direct = []
+    for s in np.unique(sources):
+        targets = np.where(sources == s)[0]
+        n = counts[s]
+        indices = starts[s] + np.arange(n)
+        faces_s, owners_s, valid_s = calc_hulls(vertices[indices], [n], workers=workers)
+        same = counts[targets] == n
+        direct.append(targets[~same])
+        targets = targets[same]
+        if not valid_s[0]:
+            continue
+        # match the rotated vertices of the source to the polyhedra
+        x = np.einsum("kj,mji->mki", relative[indices], rotations[targets])
+        y = relative[starts[targets][:, None] + np.arange(n)]
+        distances = np.linalg.norm(x[:, :, None, :] - y[:, None, :, :], axis=3)
+        perm = np.argmin(distances, axis=2)
+        matched = np.all(np.min(distances, axis=2) < tol, axis=1) & np.all(
+            np.sort(perm, axis=1) == np.arange(n), axis=1
+        )
+        direct.append(targets[~matched])
+        targets = targets[matched]
+        perm = perm[matched]
+        faces_t = perm[:, faces_s]
+        # improper rotations reverse the orientation of the faces
+        flip = np.linalg.det(rotations[targets]) < 0
+        faces_t[flip] = faces_t[flip][:, :, [0, 2, 1]]
+        faces.append((faces_t + starts[targets][:, None, None]).reshape(-1, 3))
+        owners.append(np.repeat(targets, len(faces_s)))
+        valid[targets] = True
+    direct = np.concatenate(direct) if direct else np.zeros(0, dtype=int)
+    if len(direct) > 0:
+        logger.debug("Hulls without symmetry for {} polyhedra".format(len(direct)))
+        indices = np.concatenate([starts[i] + np.arange(counts[i]) for i in direct])
+        faces_d, owners_d, valid_d = calc_hulls(
+            vertices[indices], counts[direct], workers=workers
+        )
+        starts_d = np.concatenate(([0], np.cumsum(counts[direct])[:-1]))
+        # indices of the vertices back to all polyhedra
+        faces_d = faces_d - np.repeat(starts_d[owners_d], 3).reshape(-1, 3)
+        faces.append(faces_d + starts[direct][owners_d][:, None])
+        owners.append(direct[owners_d])
+        valid[direct] = valid_d
+    if len(faces) == 0:
+        return np.zeros((0, 3), dtype=int), np.zeros(0, dtype=int), valid
+    return np.concatenate(faces), np.concatenate(owners), valid
@@ -332,6 +332,8 @@ class Polyhedra(ObjectGN):
         the extra polyhedras use the find bond data.
         """
         # if not self.bondlist:
+        if self.batoms.defer_update("polyhedra"):
+            return
         object_mode()
         # clean_coll_objects(self.coll, 'bond')
         positions = self.batoms.positions
@@ -346,6 +348,11 @@ class Polyhedra(ObjectGN):
         nframe = len(trajectory)
         polyhedra_datas = {}
         tstart = time()
+        symmetry = None
+        if self.batoms.bond.use_symmetry and nframe == 1:
+            symmetry = self.batoms.bond.get_symmetry(
+                species[show], trajectory[0, show, :]
+            )
         for f in range(nframe):
             logger.debug("update polyhedra: {}".format(f))
             positions = trajectory[f, show, :]
@@ -354,7 +361,11 @@ class Polyhedra(ObjectGN):
                 self.batoms.bond.update()
                 bondlists = self.batoms.bond.bondlists
             polyhedra_kinds = self.calc_polyhedra_data(
-                bondlists, species, positions, arrays["model_style"][show]
+                bondlists,
+                species,
+                positions,
+                arrays["model_style"][show],
+                symmetry=symmetry,
             )
             if f == 0:
                 polyhedra_datas = polyhedra_kinds
@@ -512,112 +523,141 @@ class Polyhedra(ObjectGN):
         """
         pass
 
-    def calc_polyhedra_data(self, bondlists, species, positions, model_styles):
-        """ """
-        from ase.data import chemical_symbols
-        from scipy.spatial import ConvexHull
+    def calc_polyhedra_data(
+        self, bondlists, species, positions, model_styles, symmetry=None
+    ):
+        """Vertices and faces of the polyhedra.
+
+        The vertices of a polyhedra are the bonded atoms of the center
+        atom. The hulls of the centers are calculated in batches, see
+        batoms.polyhedra.hull.
+
+        symmetry: dict
+            symmetry mapping of the atoms, see
+            batoms.neighborlist.get_symmetry_mapping. If given, only the
+            hulls of the symmetry-unique atoms are calculated.
+        """
+        from batoms.polyhedra.hull import (
+            calc_hulls,
+            calc_hulls_symmetry,
+            faces_to_edges,
+        )
+        from batoms.utils.butils import get_workers
 
         tstart = time()
-        chemical_symbols = np.array(chemical_symbols)
         # find bonds contribute to polyhedra
         indices = bondlists[:, 8].astype(bool)
         bondlists = bondlists[indices]
-        # maxinum number of poly
-        npoly = len(bondlists)
-        if npoly == 0:
+        if len(bondlists) == 0:
             return default_polyhedra_datas
-        # properties
-        npoly = npoly * 12
-        atoms_index1 = np.zeros(npoly, dtype=int)  # 0, 1, 2
-        atoms_index2 = np.zeros(npoly, dtype=int)  # 0, 1, 2
-        face_species_index = np.zeros(npoly, dtype=int)  # 0, 1, 2
-        widths = np.ones(npoly, dtype=float)
-        species_index = np.zeros(npoly, dtype=int)
-        # ------------------------------------
-        # offsets10 = bondlists[:, 2:5]
-        offsets20 = bondlists[:, 5:8]
-        indices10 = bondlists[:, 0].astype(int)
-        indices20 = bondlists[:, 1].astype(int)
-        positions20 = positions[indices20] + offsets20
-        # ---------------------------------------------
-        vertices = []
-        offsets = []
-        edges = []
-        faces = []
+        positions20 = positions[bondlists[:, 1].astype(int)] + bondlists[:, 5:8]
+        speciesarray = species[bondlists[:, 0].astype(int)]
+        workers = get_workers()
+        datas = {
+            "atoms_index1": [],
+            "atoms_index2": [],
+            "species_index": [],
+            "face_species_index": [],
+            "vertices": [],
+            "offsets": [],
+            "widths": [],
+            "faces": [],
+        }
         nv = 0
-        nf = 0
-        speciesarray = species[indices10]
         for poly in self.settings:
             # find center atoms == species
             spis = np.where(speciesarray == poly.species)[0]
-            indices1 = indices10[spis]
+            if len(spis) == 0:
+                continue
             bondlist1 = bondlists[spis]
             # center atoms is define by i and the offset
-            atom_centers = bondlist1[:, [0, 2, 3, 4]]
-            positions21 = positions20[spis]
-            # find indices of center atoms
-            u, indices = np.unique(atom_centers, axis=0, return_inverse=True)
-            indices = np.append(indices, len(indices1))
-            n = len(u)
-            # print(n)
-            for i in range(n):
-                if model_styles[int(u[i, 0])] != 2:
-                    continue
-                mask = np.where(indices == i)[0]
-                vertices1 = positions21[mask]
-                dnv = len(vertices1)
-                if dnv >= 4:
-                    try:
-                        # search face for polyhedra
-                        hull = ConvexHull(vertices1)
-                        face = hull.simplices
-                        # tri = Delaunay(vertices1)
-                        # face = tri.simplices
-                        dnf = len(face)
-                        face = face + nv
-                        edge = []
-                        for f in face:
-                            edge.append([f[0], f[1]])
-                            edge.append([f[0], f[2]])
-                            edge.append([f[1], f[2]])
-                        edges = edges + list(edge)
-                        faces = faces + list(face)
-                        vertices.extend(vertices1)
-                        offsets.extend(bondlist1[mask, 5:8])
-                        nv1 = nv + dnv
-                        nf1 = nf + dnf
-                        atoms_index1[nv:nv1] = bondlist1[mask, 0]
-                        atoms_index2[nv:nv1] = bondlist1[mask, 1]
-                        widths[nv:nv1] = poly.width
-                        species_index[nv:nv1] = string2Number(poly.species)
-                        face_species_index[nf:nf1] = string2Number(poly.species)
-                        nv = nv1
-                        nf = nf1
-                    except Exception as e:
-                        logger.error(e)
-        n = len(vertices)
-        if n == 0:
-            datas = default_polyhedra_datas
-        else:
-            nf = len(faces)
-            shows = np.ones(n, dtype=int)
-            datas = {
-                "atoms_index1": atoms_index1[0:n],
-                "atoms_index2": atoms_index2[0:n],
-                "species_index": species_index[0:n],
-                "face_species_index": face_species_index[0:nf],
-                "vertices": np.array(vertices),
-                "offsets": np.array(offsets),
-                "widths": widths[0:n],
-                "edges": edges,
-                "faces": faces,
-                "shows": shows,
+            u, inverse = np.unique(
+                bondlist1[:, [0, 2, 3, 4]], axis=0, return_inverse=True
+            )
+            inverse = inverse.ravel()
+            counts = np.bincount(inverse, minlength=len(u))
+            keep = (model_styles[u[:, 0].astype(int)] == 2) & (counts >= 4)
+            # the bonds of a center are contiguous
+            order = np.argsort(inverse, kind="stable")
+            order = order[keep[inverse[order]]]
+            if len(order) == 0:
+                continue
+            counts = counts[keep]
+            if symmetry is None:
+                faces, owners, valid = calc_hulls(
+                    positions20[spis][order], counts, workers=workers
+                )
+            else:
+                faces, owners, valid = calc_hulls_symmetry(
+                    positions20[spis][order],
+                    counts,
+                    *self.get_symmetry_sources(u[keep], positions, symmetry),
+                    workers=workers,
+                )
+            # remove the vertices of the centers without hull
+            mask = np.repeat(valid, counts)
+            order = order[mask]
+            dnv = len(order)
+            index = np.cumsum(mask) - 1
+            species_index = string2Number(poly.species)
+            datas["faces"].append(index[faces] + nv)
+            datas["face_species_index"].append(np.full(len(faces), species_index))
+            datas["vertices"].append(positions20[spis][order])
+            datas["offsets"].append(bondlist1[order, 5:8])
+            datas["atoms_index1"].append(bondlist1[order, 0].astype(int))
+            datas["atoms_index2"].append(bondlist1[order, 1].astype(int))
+            datas["widths"].append(np.full(dnv, poly.width))
+            datas["species_index"].append(np.full(dnv, species_index))
+            nv += dnv
+        if nv == 0:
+            return default_polyhedra_datas
+        datas = {key: np.concatenate(value) for key, value in datas.items()}
+        datas.update(
+            {
+                "edges": faces_to_edges(datas["faces"]).tolist(),
+                "faces": datas["faces"].tolist(),
+                "shows": np.ones(nv, dtype=int),
                 "model_styles": model_styles,
             }
-        # print('datas: ', datas)
+        )
         logger.debug("calc_polyhedra_data: {0:10.2f} s".format(time() - tstart))
         return datas
 
+    def get_symmetry_sources(self, centers, positions, symmetry):
+        """Source polyhedra of the centers, the first center of the
+        symmetry-unique atom, and the rotations from the source.
+
+        Args:
+            centers (array): (n, 4) index and offset of the center atoms
+            positions (array): positions of the atoms
+            symmetry (dict): see batoms.neighborlist.get_symmetry_mapping
+
+        Returns:
+            positions (array): (n, 3) positions of the centers
+            rotations (array): (n, 3, 3) rotations in cartesian
+            sources (array): (n,) index of the source of each center
+        """
+        cell = np.array(self.batoms.cell)
+        atoms = centers[:, 0].astype(int)
+        uniques = symmetry["equivalent_atoms"][atoms]
+        # the unique atoms map to themselves by the identity
+        first = np.full(len(positions), -1, dtype=int)
+        is_unique = atoms == uniques
+        first[atoms[is_unique][::-1]] = np.where(is_unique)[0][::-1]
+        sources = first[uniques]
+        # no center for the unique atom, the center is its own source
+        missing = np.where(sources < 0)[0]
+        sources[missing] = missing
+        # v = s @ cell, s' = R s + t => v' = v @ inv(cell) @ R.T @ cell
+        rotations = np.einsum(
+            "ij,njk,kl->nil",
+            np.linalg.inv(cell),
+            symmetry["rotations"][atoms].transpose(0, 2, 1),
+            cell,
+        )
+        rotations[missing] = np.eye(3)
+        return positions[atoms] + centers[:, 1:4], rotations, sources
+
     @property
     def setting(self):
         from batoms.utils import deprecated
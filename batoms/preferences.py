@@ -12,6 +12,7 @@ from bpy.props import (
     BoolProperty,
     StringProperty,
     EnumProperty,
+    IntProperty,
 )
 from batoms.install.pip_dependencies import has_module
 from batoms.install import update
@@ -244,6 +245,13 @@ class BatomsAddonPreferences(AddonPreferences):
         default=2,
     )
 
+    workers: IntProperty(
+        name="Workers",
+        description="Number of threads for molecular surfaces, 0 uses all CPUs",
+        default=0,
+        min=0,
+    )
+
     isosurface: BoolProperty(
         name="isosurface",
         description="Enable isosurface plugin",
@@ -375,6 +383,7 @@ class BatomsAddonPreferences(AddonPreferences):
         box.label(text="Custom Settings")
         box.prop(self, "logging_level")
         box.prop(self, "batoms_setting_path")
+        box.prop(self, "workers")
 
 
 classes = [
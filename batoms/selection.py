@@ -0,0 +1,446 @@
+"""
+Selection expressions, compiled to numpy masks over the arrays of a batoms.
+
+The module only uses NumPy and SciPy, thus an expression can be evaluated
+directly on the arrays and on every frame of a trajectory.
+
+Grammar::
+
+    expr       := and_expr ("or" and_expr)*
+    and_expr   := not_expr ("and" not_expr)*
+    not_expr   := "not" not_expr | primary
+    primary    := "(" expr ")"
+                | "all" | "none"
+                | "within" number "of" not_expr
+                | class
+                | key op value | value op key
+                | key value+ | key number "to" number
+
+Examples::
+
+    species O
+    element Fe Co and z > 10
+    chain A and resid 10 to 20
+    within 5 of (species Fe) and not hetatm
+    not water and bfactor >= 30.5
+    sheet A or helix B
+
+Keys:
+    x, y, z: positions
+    index: index of the atoms
+    element, species, chain, resname, resid, name, type: the arrays
+        elements, species, chainids, residuenames, residuenumbers,
+        atomtypes and types. Any other array can be used by its name,
+        e.g. scale, bfactor, occupancy.
+
+Classes:
+    hetatm, hydrogen, metal, water (solvent)
+
+Named selections, e.g. sheet, helix and select, are looked up by the
+functions passed to evaluate, see bselect.elect_expression.
+
+The compiled expressions are cached. The parts of an expression which do
+not depend on the positions are evaluated only once for a trajectory.
+"""
+
+import re
+from functools import lru_cache
+import numpy as np
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+keywords = ["and", "or", "not", "within", "of", "to", "all", "none"]
+
+aliases = {
+    "element": "elements",
+    "elem": "elements",
+    "species": "species",
+    "chain": "chainids",
+    "resname": "residuenames",
+    "resid": "residuenumbers",
+    "resi": "residuenumbers",
+    "name": "atomtypes",
+    "type": "types",
+}
+
+nonmetals = [
+    "H", "He", "B", "C", "N", "O", "F", "Ne", "Si", "P", "S", "Cl", "Ar",
+    "As", "Se", "Br", "Kr", "Te", "I", "Xe", "At", "Rn", "X",
+]  # fmt: skip
+
+solvents = ["HOH", "WAT", "H2O", "SOL", "TIP", "TIP3", "DOD"]
+
+classes = {
+    "hetatm": ("in", "types", ("HETATM",)),
+    "hydrogen": ("in", "elements", ("H",)),
+    "hydrogens": ("in", "elements", ("H",)),
+    "metal": ("not", ("in", "elements", tuple(nonmetals))),
+    "metals": ("not", ("in", "elements", tuple(nonmetals))),
+    "water": ("in", "residuenames", tuple(solvents)),
+    "solvent": ("in", "residuenames", tuple(solvents)),
+}
+
+token_pattern = re.compile(
+    r"""\s*(?:
+    (?P<number>[-+]?(?:\d+\.\d*|\.\d+|\d+)(?:[eE][-+]?\d+)?(?![\w.]))
+    |(?P<op><=|>=|==|!=|<|>|=)
+    |(?P<paren>[()])
+    |(?P<string>"[^"]*"|'[^']*')
+    |(?P<word>[^\s()<>=!"']+)
+    )""",
+    re.VERBOSE,
+)
+
+operators = {
+    "<": np.less,
+    "<=": np.less_equal,
+    ">": np.greater,
+    ">=": np.greater_equal,
+    "=": np.equal,
+    "==": np.equal,
+    "!=": np.not_equal,
+}
+
+flipped = {"<": ">", "<=": ">=", ">": "<", ">=": "<=", "=": "=", "==": "==", "!=": "!="}
+
+
+def tokenize(expression):
+    """Split the expression into (kind, value) tokens."""
+    tokens = []
+    pos = 0
+    expression = expression.strip()
+    while pos < len(expression):
+        match = token_pattern.match(expression, pos)
+        if match is None or match.end() == pos:
+            raise ValueError(
+                "Invalid selection: {} at {}".format(expression, expression[pos:])
+            )
+        kind = match.lastgroup
+        value = match.group(kind)
+        if kind == "string":
+            value = value[1:-1]
+        elif kind == "word" and value.lower() in keywords:
+            kind, value = "keyword", value.lower()
+        tokens.append((kind, value))
+        pos = match.end()
+    return tokens
+
+
+class Parser:
+    """Recursive descent parser of the selection expression.
+
+    The AST is made of tuples:
+        ("or", a, b), ("and", a, b), ("not", a), ("all",), ("none",),
+        ("within", distance, a), ("cmp", key, op, value),
+        ("in", key, values), ("range", key, start, end),
+        ("named", name, value)
+    """
+
+    def __init__(self, expression, named=()):
+        self.expression = expression
+        self.tokens = tokenize(expression)
+        self.pos = 0
+        self.named = named
+
+    def peek(self):
+        if self.pos < len(self.tokens):
+            return self.tokens[self.pos]
+        return (None, None)
+
+    def next(self):
+        token = self.peek()
+        if token[0] is None:
+            self.error("unexpected end")
+        self.pos += 1
+        return token
+
+    def accept(self, kind, value=None):
+        token = self.peek()
+        if token[0] == kind and (value is None or token[1] == value):
+            self.pos += 1
+            return True
+        return False
+
+    def expect(self, kind, value=None):
+        if not self.accept(kind, value):
+            self.error("expected {}".format(value or kind))
+
+    def error(self, message):
+        raise ValueError("Invalid selection: {}, {}".format(self.expression, message))
+
+    def parse(self):
+        if len(self.tokens) == 0:
+            return ("none",)
+        node = self.parse_or()
+        if self.peek()[0] is not None:
+            self.error("unexpected {}".format(self.peek()[1]))
+        return node
+
+    def parse_or(self):
+        node = self.parse_and()
+        while self.accept("keyword", "or"):
+            node = ("or", node, self.parse_and())
+        return node
+
+    def parse_and(self):
+        node = self.parse_not()
+        while self.accept("keyword", "and"):
+            node = ("and", node, self.parse_not())
+        return node
+
+    def parse_not(self):
+        if self.accept("keyword", "not"):
+            return ("not", self.parse_not())
+        return self.parse_primary()
+
+    def parse_primary(self):
+        kind, value = self.next()
+        if kind == "paren" and value == "(":
+            node = self.parse_or()
+            self.expect("paren", ")")
+            return node
+        if kind == "keyword":
+            if value == "all":
+                return ("all",)
+            if value == "none":
+                return ("none",)
+            if value == "within":
+                distance = self.parse_number()
+                self.expect("keyword", "of")
+                return ("within", distance, self.parse_not())
+            self.error("unexpected {}".format(value))
+        if kind == "number":
+            # value op key
+            op = self.next()
+            key = self.next()
+            if op[0] != "op" or key[0] != "word":
+                self.error("invalid comparison")
+            return ("cmp", self.get_key(key[1]), flipped[op[1]], float(value))
+        if kind != "word":
+            self.error("unexpected {}".format(value))
+        if value.lower() in classes:
+            return classes[value.lower()]
+        if self.peek()[0] == "op":
+            op = self.next()[1]
+            return ("cmp", self.get_key(value), op, self.parse_value())
+        if value in self.named:
+            return ("named", value, self.parse_value())
+        key = self.get_key(value)
+        values = []
+        while self.peek()[0] in ["word", "number", "string"]:
+            values.append(self.parse_value())
+        if len(values) == 0:
+            self.error("{} without values".format(value))
+        if len(values) == 1 and self.accept("keyword", "to"):
+            return ("range", key, float(values[0]), self.parse_number())
+        return ("in", key, tuple(values))
+
+    def parse_number(self):
+        kind, value = self.next()
+        if kind != "number":
+            self.error("expected a number, got {}".format(value))
+        return float(value)
+
+    def parse_value(self):
+        kind, value = self.next()
+        if kind not in ["word", "number", "string"]:
+            self.error("expected a value, got {}".format(value))
+        return value
+
+    def get_key(self, word):
+        return aliases.get(word.lower(), word)
+
+
+@lru_cache(maxsize=256)
+def parse_expression(expression, named=()):
+    """Parse the expression into an AST, see Parser.
+
+    Args:
+        expression (str): selection expression
+        named (tuple): names of the named selections, e.g. ("sheet", "helix")
+    """
+    return Parser(expression, named).parse()
+
+
+def depends_on_positions(node):
+    """The node uses the positions, thus it changes with the frames."""
+    if node[0] == "within":
+        return True
+    if node[0] in ["cmp", "range"]:
+        return node[1] in ["x", "y", "z"]
+    return any(isinstance(n, tuple) and depends_on_positions(n) for n in node[1:])
+
+
+def get_array(context, key):
+    """Array of the key, the columns of the positions, or the index."""
+    n = context["natom"]
+    if key in ["x", "y", "z"]:
+        return context["positions"][:, "xyz".index(key)]
+    if key == "index":
+        return np.arange(n)
+    arrays = context["arrays"]
+    if key == "elements" and key not in arrays and "species" in arrays:
+        key = "species"
+    if key not in arrays:
+        raise KeyError("Selection: {} is not in the arrays.".format(key))
+    array = np.asarray(arrays[key])
+    if array.dtype.kind in "OSU":
+        array = np.char.strip(array.astype(str))
+    return array
+
+
+def convert_values(array, values):
+    """Convert the values to the type of the array."""
+    if array.dtype.kind in "biuf":
+        return np.array(values, dtype=float)
+    return np.array([str(v) for v in values])
+
+
+@lru_cache(maxsize=256)
+def compile_node(node):
+    """Compile the AST node to a function of the context, which returns
+    a boolean mask. The nodes which do not depend on the positions are
+    memoized in the context, thus evaluated once for all frames."""
+    kind = node[0]
+    if kind == "all":
+
+        def func(context):
+            return np.ones(context["natom"], dtype=bool)
+
+    elif kind == "none":
+
+        def func(context):
+            return np.zeros(context["natom"], dtype=bool)
+
+    elif kind in ["and", "or"]:
+        a, b = compile_node(node[1]), compile_node(node[2])
+        op = np.logical_and if kind == "and" else np.logical_or
+
+        def func(context):
+            return op(a(context), b(context))
+
+    elif kind == "not":
+        a = compile_node(node[1])
+
+        def func(context):
+            return ~a(context)
+
+    elif kind == "cmp":
+        key, op, value = node[1:]
+
+        def func(context):
+            array = get_array(context, key)
+            return operators[op](array, convert_values(array, [value])[0])
+
+    elif kind == "in":
+        key, values = node[1:]
+
+        def func(context):
+            array = get_array(context, key)
+            return np.isin(array, convert_values(array, values))
+
+    elif kind == "range":
+        key, start, end = node[1:]
+
+        def func(context):
+            array = get_array(context, key)
+            return (array >= start) & (array <= end)
+
+    elif kind == "named":
+        name, value = node[1:]
+
+        def func(context):
+            mask = np.zeros(context["natom"], dtype=bool)
+            mask[context["named"][name](value)] = True
+            return mask
+
+    elif kind == "within":
+        distance = node[1]
+        a = compile_node(node[2])
+
+        def func(context):
+            return within(context["positions"], a(context), distance)
+
+    else:
+        raise ValueError("Unknown selection node: {}".format(kind))
+    if depends_on_positions(node):
+        return func
+
+    def memoized(context):
+        memo = context["memo"]
+        if node not in memo:
+            memo[node] = func(context)
+        return memo[node]
+
+    return memoized
+
+
+def within(positions, mask, distance):
+    """Atoms within the distance of the atoms in the mask."""
+    from scipy.spatial import cKDTree
+
+    result = np.zeros(len(positions), dtype=bool)
+    if not mask.any():
+        return result
+    centers = positions[mask]
+    # only the atoms in the box of the centers are queried
+    lower = centers.min(axis=0) - distance
+    upper = centers.max(axis=0) + distance
+    candidates = np.where(np.all((positions >= lower) & (positions <= upper), axis=1))[
+        0
+    ]
+    tree = cKDTree(centers)
+    d = tree.query(positions[candidates], distance_upper_bound=distance)[0]
+    result[candidates] = d <= distance
+    return result
+
+
+def evaluate(expression, arrays, positions=None, named={}, memo=None):
+    """Evaluate the selection expression.
+
+    Args:
+        expression (str): selection expression
+        arrays (dict): arrays of the atoms, e.g. batoms.arrays
+        positions (array): (n, 3) positions, default arrays["positions"]
+        named (dict): functions of the named selections, which return the
+            indices of the atoms, e.g. {"sheet": lambda name: indices}
+        memo (dict): results of the nodes which do not depend on the
+            positions, shared by the frames of a trajectory
+
+    Returns:
+        array: (n,) boolean mask
+    """
+    if positions is None:
+        positions = arrays["positions"]
+    node = parse_expression(expression, tuple(sorted(named)))
+    context = {
+        "arrays": arrays,
+        "positions": np.asarray(positions),
+        "natom": len(positions),
+        "named": named,
+        "memo": {} if memo is None else memo,
+    }
+    return compile_node(node)(context)
+
+
+def evaluate_trajectory(expression, arrays, trajectory, named={}):
+    """Evaluate the selection expression for every frame.
+
+    Args:
+        expression (str): selection expression
+        arrays (dict): arrays of the atoms
+        trajectory (array): (nframe, n, 3) positions
+        named (dict): functions of the named selections
+
+    Returns:
+        array: (nframe, n) boolean masks
+    """
+    memo = {}
+    return np.array(
+        [
+            evaluate(expression, arrays, positions, named, memo)
+            for positions in trajectory
+        ]
+    ).reshape(len(trajectory), -1)
@@ -165,6 +165,42 @@ def number2String(n):
     return n.to_bytes(math.ceil(n.bit_length() / 8), "little").decode()
 
 
+def strings2Numbers(strings):
+    """Encode an array of strings, only the unique strings are
+    converted by string2Number."""
+    strings = np.asarray(strings, dtype=str)
+    if strings.size == 0:
+        return np.zeros(strings.shape, dtype=int)
+    unique, inverse = np.unique(strings, return_inverse=True)
+    table = np.array([string2Number(s) for s in unique], dtype=int)
+    return table[inverse].reshape(strings.shape)
+
+
+def numbers2Strings(numbers, dtype="U20"):
+    """Decode an array of numbers, only the unique numbers are
+    converted by number2String."""
+    numbers = np.asarray(numbers, dtype=int)
+    if numbers.size == 0:
+        return np.zeros(numbers.shape, dtype=dtype)
+    unique, inverse = np.unique(numbers, return_inverse=True)
+    table = np.array([number2String(n) for n in unique], dtype=dtype)
+    return table[inverse].reshape(numbers.shape)
+
+
+def string_codes_exact(strings, decoded=False):
+    """Check if the codes of the strings fit in a 32-bit INT attribute.
+
+    The code of a string longer than 4 bytes is truncated to its first
+    4 bytes, thus a decoded string of 4 bytes may be a truncated one.
+
+    Args:
+        strings (array): strings, or the strings decoded from the codes
+        decoded (bool): the strings are decoded from the codes
+    """
+    nbyte = 3 if decoded else 4
+    return all(len(s.encode()) <= nbyte for s in np.unique(strings))
+
+
 def default_element_prop(element, radius_style="covalent", color_style="JMOL"):
     """
     Get color, radii for element.
@@ -390,6 +426,25 @@ def get_equivalent_atoms(atoms, tol=1e-5):
     return symmetry_data["equivalent_atoms"]
 
 
+def get_symmetry_operations(cell, scaled_positions, numbers, tol=1e-5):
+    """Get symmetry operations and equivalent atoms using spglib.
+
+    Returns:
+        dict: rotations and translations of the operations in scaled
+        positions, and the equivalent atoms. None if spglib fails.
+    """
+    import spglib
+
+    atoms = (np.array(cell), scaled_positions, numbers)
+    symmetry_data = spglib.get_symmetry_dataset(atoms, symprec=tol)
+    if symmetry_data is None:
+        return None
+    keys = ["rotations", "translations", "equivalent_atoms"]
+    if isinstance(symmetry_data, dict):
+        return {key: np.array(symmetry_data[key]) for key in keys}
+    return {key: np.array(getattr(symmetry_data, key)) for key in keys}
+
+
 def local2global(positions, matrix, reversed=False):
     """Transferm the positions using (4x4) matrix, so
     one need append one column to the positions.
@@ -135,7 +135,8 @@ def set_mesh_attribute_bmesh(obj, key, value, index=None):
         obj (bpy.type.object): obj
         key (str): name of the attribute
         value (np.array): value of the attribute
-        index (bool, int): index of the data, used to set singe attribute value
+        index (bool, int, array): index of the data, used to set singe
+            attribute value, or the values of several elements.
     """
     import bmesh
     from batoms.utils.butils import get_bmesh_domain, get_bmesh_layer
@@ -152,7 +153,10 @@ def set_mesh_attribute_bmesh(obj, key, value, index=None):
         domain = get_bmesh_domain(bm, att)
         domain.ensure_lookup_table()
         layer = get_bmesh_layer(domain, key, dtype)
-        if index is not None:
+        if index is not None and np.ndim(index) > 0:
+            for i, v in zip(index, value):
+                domain[i][layer] = v
+        elif index is not None:
             domain[index][layer] = value
         else:
             n = len(domain)
@@ -165,7 +169,10 @@ def set_mesh_attribute_bmesh(obj, key, value, index=None):
         domain = get_bmesh_domain(bm, att)
         domain.ensure_lookup_table()
         layer = get_bmesh_layer(domain, key, dtype)
-        if index is not None:
+        if index is not None and np.ndim(index) > 0:
+            for i, v in zip(index, value):
+                domain[i][layer] = v
+        elif index is not None:
             domain[index][layer] = value
         else:
             n = len(domain)
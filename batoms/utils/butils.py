@@ -56,6 +56,17 @@ def object_mode():
             bpy.ops.object.mode_set(mode="OBJECT")
 
 
+def get_workers(workers=0):
+    """Number of workers, 0 uses the add-on preferences, and then all CPUs."""
+    import os
+
+    if workers == 0 and "batoms" in bpy.context.preferences.addons:
+        workers = bpy.context.preferences.addons["batoms"].preferences.workers
+    if workers == 0:
+        workers = os.cpu_count() or 1
+    return workers
+
+
 def eidt_mode():
     try:
         bpy.ops.object.mode_set(mode="EDIT")
@@ -182,6 +193,10 @@ def remove_collection(name, keep_batom=True):
         bpy.data.collections.remove(coll)
     collection = bpy.data.collections.get(name)
     bpy.data.collections.remove(collection)
+    if not keep_batom:
+        from batoms.bond.bond import delete_neighbor_cache
+
+        delete_neighbor_cache(name)
 
 
 def clean_objects_by_name(name):
@@ -427,11 +442,42 @@ def get_volume(me):
 
 
 def update_object(obj):
-    mode = obj.mode
-    bpy.context.view_layer.objects.active = obj
-    bpy.ops.object.mode_set(mode="EDIT")
-    bpy.ops.object.mode_set(mode="OBJECT")
-    bpy.ops.object.mode_set(mode=mode)
+    """Refresh the object after its vertices or shape keys are written,
+    without switching to edit mode and back.
+
+    The mesh, its shape keys and the object are tagged, thus the depsgraph
+    evaluates the object again, also in background mode.
+    """
+    me = obj.data
+    me.update()
+    if me.shape_keys is not None:
+        me.shape_keys.update_tag()
+    obj.update_tag(refresh={"DATA"})
+
+
+def set_mesh_positions(obj, positions, index=None):
+    """Set the local positions of the vertices.
+
+    If the mesh has shape keys, the positions are also written to the
+    basis key, which is used by the evaluated mesh. Switching to edit mode
+    and back did this before.
+
+    Args:
+        obj (bpy.types.Object): object
+        positions (array): (n, 3) positions, or (3,) for one vertex
+        index (int): index of the vertex, default all vertices
+    """
+    me = obj.data
+    key = me.shape_keys
+    if index is not None:
+        me.vertices[index].co = positions
+        if key is not None:
+            key.reference_key.data[index].co = positions
+        return
+    positions = np.asarray(positions, dtype=np.float64).reshape(-1)
+    me.vertices.foreach_set("co", positions)
+    if key is not None:
+        key.reference_key.data.foreach_set("co", positions)
 
 
 def hideOneLevel():
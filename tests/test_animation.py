@@ -18,3 +18,98 @@ def test_animation_crystal():
     tio2.model_style = 2
     tio2.boundary = 0.01
     tio2.nframe == 10
+
+
+def test_animation_bond_workers():
+    """bonds of the frames searched in threads"""
+    bpy.ops.batoms.delete()
+    atoms = read("../tests/datas/tio2_10.xyz", index=":")
+    tio2 = Batoms("tio2", from_ase=atoms, load_trajectory=True)
+    tio2.boundary = 0.01
+    tio2.model_style = 1
+    bondlists = tio2.bond.bondlists
+    peciesBondLists = tio2.bond.peciesBondLists
+    progress = []
+    tio2.bond.update(workers=4, callback=lambda i, n: progress.append((i, n)))
+    assert progress[-1] == (10, 10)
+    assert len(tio2.bond.bondlists) == len(bondlists)
+    # the pecies of the first frame, not of the last finished thread
+    assert (tio2.bond.peciesBondLists == peciesBondLists).all()
+
+
+def test_animation_memmap():
+    """trajectory saved in a .npy file instead of shape keys"""
+    import numpy as np
+
+    bpy.ops.batoms.delete()
+    atoms = read("../tests/datas/tio2_10.xyz", index=":")
+    tio2 = Batoms(
+        "tio2", from_ase=atoms, load_trajectory=True, trajectory_backend="memmap"
+    )
+    assert tio2.obj.data.shape_keys is None
+    assert tio2.nframe == 10
+    trajectory = tio2.get_trajectory()["positions"]
+    assert isinstance(trajectory, np.memmap)
+    bpy.context.scene.frame_set(5)
+    assert np.allclose(tio2.positions, trajectory[5], atol=1e-5)
+    tio2.trajectory_backend = "shape_key"
+    assert tio2.obj.data.shape_keys is not None
+    assert tio2.nframe == 10
+
+
+def test_animation_memmap_path():
+    """the trajectory file is named with a UUID saved on the object"""
+    from batoms.base.object import get_trajectory_path
+
+    bpy.ops.batoms.delete()
+    atoms = read("../tests/datas/tio2_10.xyz", index=":")
+    tio2 = Batoms(
+        "tio2", from_ase=atoms, load_trajectory=True, trajectory_backend="memmap"
+    )
+    path = get_trajectory_path(tio2.obj)
+    assert tio2.obj.batoms.trajectory_uuid in path
+    assert get_trajectory_path(tio2.obj) == path
+
+
+def test_animation_stream():
+    """read the trajectory frame by frame"""
+    from batoms.bio.bio import read as read_batoms
+
+    bpy.ops.batoms.delete()
+    progress = []
+    tio2 = read_batoms(
+        "../tests/datas/tio2_10.xyz",
+        stream=True,
+        index="1:",
+        stride=2,
+        chunk_size=2,
+        threaded=False,
+        callback=progress.append,
+    )
+    assert tio2.nframe == 5
+    assert progress == [3, 5]
+    atoms = read("../tests/datas/tio2_10.xyz", index=7)
+    assert abs(tio2.get_trajectory()["positions"][3] - atoms.positions).max() < 1e-5
+
+
+def test_animation_shape_key_refresh():
+    """shape keys refresh in background mode without switching to edit mode"""
+    import numpy as np
+
+    bpy.ops.batoms.delete()
+    atoms = read("../tests/datas/tio2_10.xyz", index=":")
+    tio2 = Batoms("tio2", from_ase=atoms, load_trajectory=True)
+    trajectory = np.array(tio2.get_trajectory()["positions"])
+    assert np.allclose(tio2.positions, trajectory[0], atol=1e-5)
+    # the evaluated mesh without the geometry nodes
+    tio2.gn_modifier.show_viewport = False
+    positions = trajectory[0] + [0.1, 0, 0]
+    tio2.positions = positions
+    assert np.allclose(tio2.get_trajectory()["positions"][0], positions, atol=1e-5)
+    for frame, expected in [(0, positions), (5, trajectory[5])]:
+        bpy.context.scene.frame_set(frame)
+        depsgraph = bpy.context.evaluated_depsgraph_get()
+        mesh = tio2.obj.evaluated_get(depsgraph).data
+        co = np.empty(len(mesh.vertices) * 3)
+        mesh.vertices.foreach_get("co", co)
+        assert np.allclose(co.reshape(-1, 3), expected, atol=1e-5)
@@ -141,6 +141,49 @@ def test_replace(h2o):
     assert h2o[1].species == "C"
 
 
+def test_species_codes(h2o):
+    """species is decoded from species_index, and the pair is kept in sync"""
+    from batoms.utils import strings2Numbers
+    from batoms.utils.attribute import get_mesh_attribute_bmesh
+
+    assert list(h2o.get_attribute("species")) == ["O", "H", "H"]
+    h2o.set_attribute("species_index", strings2Numbers(["O", "H", "O"]))
+    assert list(h2o.get_attribute("species")) == ["O", "H", "O"]
+    bpy.context.view_layer.objects.active = h2o.obj
+    bpy.ops.object.mode_set(mode="EDIT")
+    assert list(get_mesh_attribute_bmesh(h2o.obj, "species")) == ["O", "H", "O"]
+    bpy.ops.object.mode_set(mode="OBJECT")
+
+
+def test_species_codes_long_name(h2o):
+    """species longer than 4 bytes, their codes are truncated"""
+    h2o.set_attribute("species", np.array(["O", "H_up1", "H_up1"]))
+    assert list(h2o.get_attribute("species")) == ["O", "H_up1", "H_up1"]
+    # same truncated code, the strings are still written
+    h2o.set_attribute("species", np.array(["O", "H_up1", "H_up2"]))
+    assert list(h2o.get_attribute("species")) == ["O", "H_up1", "H_up2"]
+
+
+def test_cache_attributes(h2o):
+    """read attributes from cache, and invalidate it by setters"""
+    from batoms.base.object import attribute_caches
+
+    with h2o.cache_attributes() as cache:
+        scale = h2o.get_attribute("scale")
+        assert "scale" in cache["datas"]
+        h2o.set_attribute("scale", scale * 2)
+        assert "scale" not in cache["datas"]
+        assert np.allclose(h2o.get_attribute("scale"), scale * 2)
+        positions = h2o.positions
+        h2o.positions = positions + 1
+        assert np.allclose(h2o.positions, positions + 1)
+        counter = cache["counter"]
+        h2o.add_vertices_bmesh(1)
+        assert cache["counter"] > counter
+        assert len(h2o.arrays["positions"]) == 4
+    assert len(attribute_caches) == 0
+
+
 def test_batoms_add(h2o):
     """Merge two Batoms objects"""
     from batoms import Batoms
@@ -179,6 +222,30 @@ def test_set_arrays(h2o):
     assert len(h2o.arrays["positions"]) == 2
 
 
+def test_resize_vertices():
+    """attributes and shape keys are kept when vertices are added or deleted"""
+    from ase.io import read
+
+    bpy.ops.batoms.delete()
+    atoms = read("../tests/datas/tio2_10.xyz", index=":")
+    tio2 = Batoms("tio2", from_ase=atoms, load_trajectory=True)
+    n = len(tio2)
+    species = tio2.arrays["species"]
+    trajectory = np.array(tio2.get_trajectory()["positions"])
+    action = tio2.obj.data.shape_keys.animation_data.action
+    tio2.delete([0, 2])
+    assert len(tio2) == n - 2
+    assert np.array_equal(tio2.arrays["species"], np.delete(species, [0, 2]))
+    assert np.allclose(
+        tio2.get_trajectory()["positions"], np.delete(trajectory, [0, 2], axis=1)
+    )
+    assert tio2.obj.data.shape_keys.animation_data.action == action
+    tio2.resize_vertices(n + 3)
+    assert len(tio2) == n + 3
+    assert np.allclose(tio2.get_trajectory()["positions"][:, -3:], 0)
+    assert len(tio2.get_trajectory()["positions"]) == 10
+
+
 def test_array_attribute():
     from ase.build import bulk
     import numpy as np
@@ -347,3 +414,79 @@ def test_calc_electrostatic_potential(c2h6so):
     t = time() - tstart
     print("calc_electrostatic_potential: {:1.2f}".format(t))
     assert t < 5
+
+
+def test_calc_electrostatic_potential_methods(c2h6so):
+    """chunked direct sum, tree approximation and ewald summation"""
+    charges = np.array([-0.5, 0.2, 0.1, 0.1, 0.1, -0.3, 0.2, 0.1, 0.1, 0.0])
+    c2h6so.set_attributes({"charges": charges - charges.mean()})
+    points = np.random.default_rng(0).random((200, 3)) * 8 - 4
+    direct = c2h6so.calc_electrostatic_potential(points, method="direct")
+    tree = c2h6so.calc_electrostatic_potential(points, method="tree", tolerance=0)
+    assert np.allclose(direct, tree)
+    c2h6so.cell = [10, 10, 10]
+    c2h6so.pbc = True
+    ewald = c2h6so.calc_electrostatic_potential(points, method="ewald")
+    shifted = c2h6so.calc_electrostatic_potential(points + 10, method="ewald")
+    assert np.allclose(ewald, shifted)
+
+
+def test_electrostatic_tree_accuracy():
+    """tree approximation with the default tolerance, compared to the direct sum"""
+    from batoms.electrostatic import potential_direct, potential_tree
+
+    rng = np.random.default_rng(0)
+    positions = rng.random((5000, 3)) * [40, 30, 20]
+    charges = rng.normal(scale=0.4, size=5000)
+    charges -= charges.mean()
+    points = rng.random((2000, 3)) * [44, 34, 24] - 2
+    direct = potential_direct(positions, charges, points)
+    tree = potential_tree(positions, charges, points)
+    error = tree - direct
+    assert np.sqrt(np.mean(error**2) / np.mean(direct**2)) < 0.02
+    assert np.abs(error).max() < 0.02 * np.abs(direct).max()
+
+
+def test_electrostatic_ewald_accuracy():
+    """ewald summation, compared to the direct sum over a sphere of images.
+    The charges have no dipole, so both sums differ only by a constant."""
+    from batoms.electrostatic import potential_direct, potential_ewald
+
+    cell = np.diag([8.0, 9.0, 10.0])
+    positions = np.array(
+        [[4, 4.5, 5], [3, 4.5, 5], [5, 4.5, 5], [4, 3.5, 5], [4, 5.5, 5]]
+    )
+    charges = np.array([-4.0, 1, 1, 1, 1])
+    points = np.random.default_rng(0).random((100, 3)) @ cell
+    ewald = potential_ewald(positions, charges, points, cell)
+    grid = np.mgrid[-4:5, -4:5, -4:5].reshape(3, -1).T
+    grid = grid[np.linalg.norm(grid @ cell, axis=1) <= 32]
+    images = (positions[None, :, :] + (grid @ cell)[:, None, :]).reshape(-1, 3)
+    direct = potential_direct(images, np.tile(charges, len(grid)), points)
+    diff = ewald - direct
+    assert np.allclose(diff, diff.mean(), atol=1e-4 * np.abs(ewald).max())
+
+
+def test_batch_update(monkeypatch, tio2):
+    """Redraw boundary, bonds and polyhedra once after a batch of changes"""
+    from batoms.boundary import Boundary
+    from batoms.bond.bond import Bond
+    from batoms.polyhedra.polyhedra import Polyhedra
+
+    counts = {}
+    for cls in [Boundary, Bond, Polyhedra]:
+        set_arrays = cls.set_arrays
+
+        def counted(self, arrays, name=cls.__name__, set_arrays=set_arrays):
+            counts[name] = counts.get(name, 0) + 1
+            return set_arrays(self, arrays)
+
+        monkeypatch.setattr(cls, "set_arrays", counted)
+    with tio2.batch_update():
+        tio2.model_style = 2
+        tio2.boundary = 0.01
+        tio2.bond.show_search = True
+        assert counts == {}
+    assert counts == {"Boundary": 1, "Bond": 1, "Polyhedra": 1}
+    assert len(tio2.boundary) > 0
+    assert len(tio2.polyhedra.obj.data.polygons) > 0
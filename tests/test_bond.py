@@ -102,6 +102,141 @@ def test_bond_performance(h2o):
     assert t < 5
 
 
+def test_bond_neighbor_engine(tio2):
+    tio2.boundary = 0.01
+    tio2.model_style = 1
+    bondlists = np.unique(tio2.bond.bondlists, axis=0)
+    for engine in ["vectorized", "cell_list"]:
+        tio2.bond.neighbor_engine = engine
+        assert np.allclose(np.unique(tio2.bond.bondlists, axis=0), bondlists)
+
+
+def test_neighbor_engine_self_image():
+    """The bonds to the periodic images of the atom itself, and of the atoms
+    outside the cell, are the same for all engines"""
+    from batoms.neighborlist import bondlist_kdtree
+
+    setting = {
+        ("Cu", "Cu"): {"min": 0, "max": 3.0, "search": 0, "polyhedra": 0, "type": 0}
+    }
+    cu = bulk("Cu")
+    cu27 = bulk("Cu", cubic=True) * 3
+    cu27.rattle(0.1, seed=1)
+    cu27.positions[::3] += cu27.cell[0] * 2 - cu27.cell[2]
+    for atoms, nbond in [(cu, 12), (cu27, None)]:
+        species = np.array(atoms.get_chemical_symbols())
+        bondlists = {}
+        for engine in ["pair", "vectorized", "cell_list"]:
+            i, j, S = bondlist_kdtree(
+                "ijS",
+                species,
+                atoms.positions,
+                atoms.cell.array,
+                atoms.pbc,
+                setting,
+                engine=engine,
+            )
+            bondlists[engine] = np.unique(
+                np.concatenate((np.array([i, j]).T, S), axis=1), axis=0
+            )
+        if nbond is not None:
+            assert len(bondlists["pair"]) == nbond
+        assert np.allclose(bondlists["pair"], bondlists["vectorized"])
+        assert np.allclose(bondlists["pair"], bondlists["cell_list"])
+
+
+def test_bond_symmetry(tio2):
+    """bonds and polyhedra of the unique atoms, copied by symmetry"""
+    tio2 = tio2 * [3, 3, 3]
+    tio2.model_style = 2
+    bondlists = np.unique(tio2.bond.bondlists, axis=0)
+    npolygon = len(tio2.polyhedra.obj.data.polygons)
+    tio2.bond.use_symmetry = True
+    tio2.model_style = 2
+    assert np.allclose(np.unique(tio2.bond.bondlists, axis=0), bondlists)
+    assert len(tio2.polyhedra.obj.data.polygons) == npolygon
+
+
+def test_bond_incremental(c2h6so):
+    c2h6so.model_style = 1
+    nbond = len(c2h6so.bond.bondlists)
+    # move one H atom away from its C atom
+    positions = c2h6so.positions
+    positions[4] += [0, 0, 5]
+    c2h6so.positions = positions
+    c2h6so.bond.update(indices=[4])
+    bondlists = np.unique(c2h6so.bond.bondlists, axis=0)
+    assert len(bondlists) == nbond - 1
+    c2h6so.bond.update()
+    assert np.allclose(np.unique(c2h6so.bond.bondlists, axis=0), bondlists)
+
+
+def test_bond_incremental_edit(c2h6so):
+    """The neighbor cache is shared by the Batoms objects of the same label,
+    and follows the deleted and appended atoms"""
+    c2h6so.model_style = 1
+    assert Batoms(label=c2h6so.label).bond.neighbor_cache is not None
+    positions = c2h6so.positions
+    c2h6so.delete([4])
+    c2h6so.add_atoms({"species": ["H"], "positions": [positions[4] + [0, 0, 0.1]]})
+    c2h6so.bond.update()
+    bondlists = np.unique(c2h6so.bond.bondlists, axis=0)
+    c2h6so.bond.neighbor_cache = None
+    c2h6so.bond.update()
+    assert np.allclose(np.unique(c2h6so.bond.bondlists, axis=0), bondlists)
+
+
+def test_neighbor_cache_delete(c2h6so):
+    """The neighbor cache is dropped with the batoms"""
+    from batoms.bond.bond import neighbor_caches
+
+    c2h6so.model_style = 1
+    assert c2h6so.label in neighbor_caches
+    bpy.ops.batoms.delete(label=c2h6so.label)
+    assert c2h6so.label not in neighbor_caches
+
+
+def test_neighbor_cache_small_cell():
+    """The moved atoms find the images beyond the nearest ones"""
+    from batoms.neighborlist import (
+        bondlist_kdtree,
+        build_neighbor_cache,
+        update_neighbor_cache,
+    )
+
+    setting = {
+        ("Na", "Cl"): {"min": 0, "max": 3.2, "search": 0, "polyhedra": 1, "type": 0},
+        ("Cl", "Cl"): {"min": 0, "max": 4.1, "search": 0, "polyhedra": 0, "type": 0},
+    }
+    atoms = bulk("NaCl", "rocksalt", a=5.6) * (2, 1, 1)
+    species = np.array(atoms.get_chemical_symbols())
+    cell = atoms.cell.array
+
+    def search(positions):
+        i, j, k, p, t, S = bondlist_kdtree(
+            "ijkptS", species, positions, cell, atoms.pbc, setting, engine="cell_list"
+        )
+        nb = len(i)
+        bondlists = np.concatenate(
+            (
+                np.array([i, j]).T,
+                np.zeros((nb, 3)),
+                S,
+                np.array([k, p, t]).T,
+            ),
+            axis=1,
+        ).astype(int)
+        return np.unique(bondlists, axis=0)
+
+    positions = atoms.positions.copy()
+    cache = build_neighbor_cache(
+        species, positions, cell, atoms.pbc, setting, search(positions)
+    )
+    positions[1] += [0.3, -0.2, 0.1]
+    bondlists = update_neighbor_cache(cache, positions, [1])
+    assert np.array_equal(bondlists, search(positions))
+
+
 def test_bond_add():
     bpy.ops.batoms.delete()
     au = bulk("Au")
@@ -198,3 +333,23 @@ def test_bond_reload(tio2):
     bpy.ops.wm.open_mainfile(filepath=filepath)
     tio2 = Batoms("tio2")
     assert len(tio2.bond.search_bond) == 43
+
+
+def test_bond_empty_setting():
+    """a metal has no bond pair in the setting"""
+    bpy.ops.batoms.delete()
+    au = Batoms("au", from_ase=bulk("Au", cubic=True))
+    assert len(au.bond.settings) == 0
+    au.model_style = 1
+    au.bond.update()
+    assert len(au.bond.peciesBondLists) == 0
+    # the frames are searched in threads
+    images = []
+    for i in range(3):
+        atoms = bulk("Au", cubic=True)
+        atoms.rattle(0.05, seed=i)
+        images.append(atoms)
+    au = Batoms("au_traj", from_ase=images, load_trajectory=True)
+    au.model_style = 1
+    au.bond.update(workers=2)
+    assert len(au.bond.peciesBondLists) == 0
@@ -59,3 +59,47 @@ def test_boundary_reload(au):
     au = Batoms("au")
     np.isclose(au.boundary[0, 0], -1)
     assert len(au.boundary) == 10
+
+
+def test_search_boundary():
+    """offsets from the scaled positions, same as tiling the cell"""
+    from ase.build import bulk
+    from batoms.boundary import search_boundary
+
+    atoms = bulk("Cu", cubic=True) * [2, 2, 2]
+    atoms.rattle(0.5)
+    boundary = np.array([[-1, 2], [-0.3, 1.2], [0, 1]])
+    offsets = search_boundary(atoms, boundary)
+    scaled = atoms.get_scaled_positions(wrap=False)[offsets[:, 0]] + offsets[:, 1:]
+    assert np.all((scaled > boundary[:, 0]) & (scaled < boundary[:, 1]))
+    assert not np.any(np.all(offsets[:, 1:] == 0, axis=1))
+    # all images in the boundary
+    ntotal = 0
+    for m in np.ndindex(4, 4, 2):
+        m = np.array(m) + [-1, -1, 0]
+        if np.all(m == 0):
+            continue
+        s = atoms.get_scaled_positions(wrap=False) + m
+        ntotal += np.sum(np.all((s > boundary[:, 0]) & (s < boundary[:, 1]), axis=1))
+    assert len(offsets) == ntotal
+
+
+def test_search_boundary_frames():
+    """all frames in one pass, same as merging the frames one by one"""
+    from ase.build import bulk
+    from batoms.boundary import search_boundary, search_boundary_frames
+
+    atoms = bulk("Cu", cubic=True) * [2, 2, 2]
+    rng = np.random.default_rng(0)
+    trajectory = atoms.positions + rng.normal(0, 0.5, (5, len(atoms), 3))
+    boundary = np.array([[-1, 2], [-0.3, 1.2], [0, 1]])
+    offsets = []
+    for positions in trajectory:
+        atoms.positions = positions
+        offsets.append(search_boundary(atoms, boundary))
+    offsets = np.unique(np.concatenate(offsets), axis=0)
+    for max_size in [1e6, 10]:
+        assert np.array_equal(
+            search_boundary_frames(trajectory, atoms.cell, boundary, max_size),
+            offsets,
+        )
@@ -77,3 +77,20 @@ def test_gui():
     assert mof.cavity.show is False
     bpy.context.scene.Bcavity.minCave = 3.0
     assert np.isclose(mof.cavity.minCave, 3.0)
+
+
+def test_cavity_periodic():
+    """the periodic images are used, one cavity at the body center"""
+    from ase import Atoms
+    from batoms import Batoms
+
+    bpy.ops.batoms.delete()
+    atoms = Atoms("Po", cell=[6, 6, 6], pbc=True)
+    sc = Batoms("sc", from_ase=atoms)
+    sc.cavity.resolution = 0.5
+    sc.cavity.minCave = 1.0
+    spheres = sc.cavity.find_spheres()
+    assert len(spheres["radii"]) == 1
+    assert np.allclose(spheres["centers"][0], [3, 3, 3])
+    diameters, volumes = sc.cavity.calc_pore_size_distribution(spheres=spheres)
+    assert np.isclose(volumes.sum(), 4 / 3 * np.pi * spheres["radii"][0] ** 3)
@@ -1,5 +1,6 @@
 import bpy
 import pytest
+import numpy as np
 from time import time
 from batoms.pdbparser import read_pdb
 from batoms import Batoms
@@ -153,3 +154,80 @@ def test_SES_protein():
     assert t < 10
     area = prot.molecular_surface.get_sesa("1")[0]
     assert abs(area - 8011) < 1000
+
+
+def test_narrow_band(c2h6so):
+    """narrow band gives the same surface as the dense grid"""
+    c2h6so.molecular_surface.settings["2"] = {"type": "SES"}
+    c2h6so.molecular_surface.draw()
+    sas = c2h6so.molecular_surface.get_sasa("1")[0]
+    ses = c2h6so.molecular_surface.get_sesa("2")[0]
+    for ms in c2h6so.molecular_surface.settings.bpy_setting:
+        ms.narrow_band = True
+    c2h6so.molecular_surface.draw()
+    assert abs(c2h6so.molecular_surface.get_sasa("1")[0] - sas) < 1e-3
+    assert abs(c2h6so.molecular_surface.get_sesa("2")[0] - ses) < 1e-3
+
+
+def test_workers(c2h6so):
+    """threads give the same surface as one thread"""
+    c2h6so.molecular_surface.workers = 1
+    c2h6so.molecular_surface.draw()
+    area = c2h6so.molecular_surface.get_sasa("1")[0]
+    c2h6so.molecular_surface.workers = 4
+    assert c2h6so.molecular_surface.workers == 4
+    c2h6so.molecular_surface.draw()
+    assert abs(c2h6so.molecular_surface.get_sasa("1")[0] - area) < 1e-3
+
+
+def test_psasa():
+    """per-atom and per-residue SASA of every frame, without mesh"""
+    from ase.io import read
+
+    bpy.ops.batoms.delete()
+    prot = read_pdb("../tests/datas/1ema.pdb")
+    prot = Batoms("1ema", from_ase=prot)
+    prot.molecular_surface.draw()
+    area = prot.molecular_surface.get_sasa("1")[0]
+    pareas = prot.molecular_surface.calc_psasa()
+    assert pareas.shape == (1, len(prot))
+    assert abs(pareas.sum() - area) / area < 0.1
+    residues, rareas = prot.molecular_surface.calc_psasa(by_residue=True)
+    assert rareas.shape == (1, len(residues))
+    assert abs(rareas.sum() - pareas.sum()) < 1e-6
+    # trajectory
+    images = read("../tests/datas/deca_ala_md.xyz", index=":")
+    deca = Batoms("deca", from_ase=images, load_trajectory=True)
+    pareas = deca.molecular_surface.calc_psasa()
+    assert pareas.shape == (len(images), len(deca))
+    pareas = deca.molecular_surface.calc_psasa(frames=[0, 2])
+    assert pareas.shape == (2, len(deca))
+
+
+def test_sas_trajectory():
+    """SAS of every frame from the trajectory, without frame_set"""
+    from ase.io import read
+
+    bpy.ops.batoms.delete()
+    images = read("../tests/datas/deca_ala_md.xyz", index=":")
+    deca = Batoms("deca", from_ase=images, load_trajectory=True)
+    deca.molecular_surface.draw()
+    area = deca.molecular_surface.get_sasa("1")[0]
+    frame = bpy.context.scene.frame_current
+    areas, volumes = deca.molecular_surface.calc_sas_trajectory()
+    assert areas.shape == (len(images),)
+    assert bpy.context.scene.frame_current == frame
+    assert abs(areas[0] - area) / area < 0.01
+    areas, volumes = deca.molecular_surface.calc_sas_trajectory(frames=[0, 2])
+    assert len(areas) == 2
+    deca.molecular_surface.settings["1"].narrow_band = True
+    areas1, volumes1 = deca.molecular_surface.calc_sas_trajectory(frames=[0, 2])
+    assert np.allclose(areas1, areas)
+    deca.molecular_surface.calc_psasa(attribute="sasa")
+    assert "sasa" in deca.obj.data.attributes
+    # the frame of the scene is mapped to the index of the frames
+    bpy.context.scene.frame_set(1)
+    pareas = deca.molecular_surface.calc_psasa(frames=[0, 1], attribute="sasa1")
+    assert np.allclose(deca.get_attribute("sasa1"), pareas[1])
+    deca.molecular_surface.calc_psasa(frames=[0, 2], attribute="sasa2")
+    assert "sasa2" not in deca.obj.data.attributes
@@ -51,3 +51,100 @@ def test_scatter_and_gather_attribute():
     t = time() - tstart
     print("Gatther data for data (2,): {:1.2f}".format(t))
     assert t < 2
+
+
+def test_neighbor_engine_performance():
+    """Compare the neighbor engines of bondlist_kdtree, from 1k to 200k atoms,
+    for an orthorhombic and a triclinic cell."""
+    from ase.build import bulk
+    import numpy as np
+    from batoms.neighborlist import bondlist_kdtree
+    from time import time
+
+    setting = {
+        ("Na", "Cl"): {"min": 0, "max": 3.2, "search": 0, "polyhedra": 1, "type": 0}
+    }
+    for cubic, repeat in [(True, 1), (False, 2)]:
+        for n in [5, 11, 24]:
+            atoms = bulk("NaCl", "rocksalt", a=5.6, cubic=cubic) * (repeat * n)
+            species = np.array(atoms.get_chemical_symbols())
+            bondlists = {}
+            for engine in ["pair", "vectorized", "cell_list"]:
+                tstart = time()
+                i, j, S = bondlist_kdtree(
+                    "ijS",
+                    species,
+                    atoms.positions,
+                    atoms.cell.array,
+                    atoms.pbc,
+                    setting,
+                    engine=engine,
+                )
+                t = time() - tstart
+                print("{} atoms, {}: {:1.2f}".format(len(atoms), engine, t))
+                bondlists[engine] = np.unique(
+                    np.concatenate((np.array([i, j]).T, S), axis=1), axis=0
+                )
+            assert len(bondlists["cell_list"]) == 6 * len(atoms) // 2
+            assert np.allclose(bondlists["pair"], bondlists["cell_list"])
+            assert np.allclose(bondlists["vectorized"], bondlists["cell_list"])
+
+
+def test_redraw_mode_switch(monkeypatch, tio2):
+    """Benchmark the mode switches of one redraw, the meshes are updated
+    without switching to edit mode and back.
+
+    The source meshes of the bond instancers (cylinder) are subdivided in
+    edit mode. They are only built for a new bond pair, and are counted
+    separately."""
+    import inspect
+    from time import time
+
+    class ModeSwitchCounter:
+        def __init__(self, ops):
+            self.ops = ops
+            self.count = 0
+            self.source = 0
+
+        def mode_set(self, *args, **kwargs):
+            if inspect.stack()[1].function in ["cylinder", "cylinder2"]:
+                self.source += 1
+            else:
+                self.count += 1
+            return self.ops.mode_set(*args, **kwargs)
+
+        def __getattr__(self, name):
+            return getattr(self.ops, name)
+
+    tio2.boundary = 0.01
+    tio2.model_style = 2
+    counter = ModeSwitchCounter(bpy.ops.object)
+    monkeypatch.setattr(bpy.ops, "object", counter)
+    tstart = time()
+    tio2.draw()
+    t = time() - tstart
+    print(
+        "Redraw time: {:1.2f}, mode switches: {}, source meshes: {}".format(
+            t, counter.count, counter.source
+        )
+    )
+    assert counter.count == 0
+
+
+def test_resize_vertices_performance():
+    """Resize the boundary object to 1M vertices and back without bmesh"""
+    from ase.build import bulk
+    from batoms import Batoms
+    from time import time
+
+    bpy.ops.batoms.delete()
+    au = Batoms("au", from_ase=bulk("Au", cubic=True))
+    au.boundary = 0.01
+    boundary = au.boundary
+    for count in [1000000, 500000]:
+        tstart = time()
+        boundary.resize_vertices(count)
+        t = time() - tstart
+        print("Resize to {} vertices: {:1.2f}".format(count, t))
+        assert len(boundary) == count
+        assert t < 2
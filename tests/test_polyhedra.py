@@ -67,3 +67,12 @@ def test_polyhedra_setting(ch4):
     if use_cycles:
         set_cycles_res(ch4)
     ch4.get_image([1, 1, 0], output="polyhedra.png", **extras)
+
+
+def test_polyhedra_faces(tio2):
+    """octahedra from the face table, 8 faces and 12 edges for each Ti"""
+    tio2.model_style = 2
+    me = tio2.polyhedra.obj.data
+    assert len(tio2.polyhedra) == 12
+    assert len(me.polygons) == 16
+    assert len(me.edges) == 24
@@ -12,3 +12,41 @@ def test_ribbon():
     sel1.show = True
     sel1.model_style = 1
     bpy.ops.batoms.delete()
+
+
+def test_read_pdb_models(tmp_path):
+    """Each END record closes a model, only the selected models are decoded."""
+    import numpy as np
+
+    lines = open("../tests/datas/1ema.pdb").read().splitlines()
+    atoms = [line for line in lines if line.startswith(("ATOM", "HETATM"))][:10]
+    text = ""
+    for m in range(3):
+        text += "MODEL     %4d\n" % (m + 1)
+        for line in atoms:
+            text += line[:30] + "%8.3f" % (float(line[30:38]) + m) + line[38:] + "\n"
+        text += "ENDMDL\n"
+    text += "END\n"
+    filename = tmp_path / "models.pdb"
+    filename.write_text(text)
+    images = read_pdb(str(filename), index=slice(None))
+    assert len(images) == 3
+    model = read_pdb(str(filename), index=1)
+    assert len(model) == 10
+    assert np.allclose(model.positions, images[0].positions + [1, 0, 0])
+    assert (model.arrays["types"] == images[2].arrays["types"]).all()
+
+
+def test_read_pdb_large_serial(tmp_path):
+    """A 6-digit serial number spills into the record name of ATOM lines."""
+    lines = open("../tests/datas/1ema.pdb").read().splitlines()
+    atoms = [line for line in lines if line.startswith("ATOM")][:3]
+    text = ""
+    for i, line in enumerate(atoms):
+        text += "ATOM%7d" % (100000 + i) + line[11:] + "\n"
+    text += "END\n"
+    filename = tmp_path / "serial.pdb"
+    filename.write_text(text)
+    atoms = read_pdb(str(filename))
+    assert len(atoms) == 3
+    assert (atoms.arrays["types"] == "ATOM").all()
@@ -1,6 +1,7 @@
 import bpy
 from batoms.batoms import Batoms
 import numpy as np
+import pytest
 
 
 def test_settings(ch4):
@@ -47,3 +48,63 @@ def test_select_protein():
     sel1.show = 1
     sel1.model_style = 1
     bpy.ops.batoms.delete()
+
+
+def test_select_membership(ch4):
+    """selects stored in attributes, set operations with numpy"""
+    s1 = ch4.selects.add("s1", [1, 2])
+    s2 = ch4.selects.add("s2", np.array([False, False, True, True, False]))
+    assert np.array_equal(s1.indices, [1, 2])
+    assert np.array_equal(s2.indices, [2, 3])
+    assert np.array_equal(ch4.selects["all"].indices, np.arange(5))
+    assert np.array_equal(np.where(s1 & s2)[0], [2])
+    assert np.array_equal(np.where(s1 | s2)[0], [1, 2, 3])
+    assert np.array_equal(np.where(s1 - s2)[0], [1])
+    assert np.array_equal(np.where(~s1)[0], [0, 3, 4])
+    assert "s1" not in ch4.obj.vertex_groups
+    # mirror to vertex group
+    s1.vertex_group = True
+    assert s1.get_vertex_group_membership().sum() == 2
+    ch4.selects.remove("s1")
+    assert "s1" not in ch4.obj.vertex_groups
+    assert ".bselect_s1" not in ch4.obj.data.attributes
+
+
+def test_select_expression():
+    """expressions compiled to numpy masks"""
+    from batoms.pdbparser import read_pdb
+    from batoms.selection import evaluate, evaluate_trajectory
+
+    atoms = read_pdb("../tests/datas/1ema.pdb")
+    arrays = dict(atoms.arrays)
+    arrays["elements"] = np.array(atoms.get_chemical_symbols())
+    positions = atoms.positions
+    hetatm = arrays["types"] == "HETATM"
+    distances = np.linalg.norm(
+        positions[:, None] - positions[hetatm][None], axis=2
+    ).min(axis=1)
+    expected = (distances <= 5) & ~hetatm & (positions[:, 2] > 10)
+    expre = "within 5 of (hetatm) and not hetatm and z > 10"
+    assert np.array_equal(evaluate(expre, arrays), expected)
+    masks = evaluate_trajectory(expre, arrays, [positions, positions + [0, 0, 10]])
+    assert np.array_equal(masks[0], expected)
+    assert masks[1].sum() >= masks[0].sum()
+    resid = arrays["residuenumbers"]
+    assert evaluate("resid 10 to 20", arrays).sum() == np.sum(
+        (resid >= 10) & (resid <= 20)
+    )
+    assert evaluate("10 < x and x <= 20", arrays).sum() == np.sum(
+        (positions[:, 0] > 10) & (positions[:, 0] <= 20)
+    )
+    mask = evaluate("sheet A or index 3", arrays, named={"sheet": lambda n: [0, 1]})
+    assert np.array_equal(np.where(mask)[0], [0, 1, 3])
+    with pytest.raises(ValueError):
+        evaluate("(species O", arrays)
+
+
+def test_select_expression_batoms(ch4):
+    sel = ch4.selects.add("sh", "element H and not index 1")
+    assert np.array_equal(sel.indices, [2, 3, 4])
+    masks = ch4.selects.evaluate("within 1.2 of select sh")
+    assert masks.shape == (1, 5)
+    assert masks[0, 0]